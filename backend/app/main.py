@@ -42,9 +42,10 @@ def predict(req: PredictRequest):
     """
     try:
         if req.records and len(req.records) > 0:
-            df, preds = service.predict_from_records(req.records)
+            df, preds = service.predict_from_records(req.records, top_k=req.top_k, cascade=req.cascade)
         elif req.gold_parquet_path:
-            df, preds = service.predict_from_parquet(req.gold_parquet_path, req.limit_rows)
+            df, preds = service.predict_from_parquet(req.gold_parquet_path, req.limit_rows, top_k=req.top_k,
+                                                     cascade=req.cascade)
         else:
             raise HTTPException(status_code=400, detail="Provide either 'records' or 'gold_parquet_path'.")
 
@@ -67,10 +68,12 @@ def features():
 
 # ========== ENDPOINT PARA LEER RESULTADOS DE TU ETL ==========
 @app.get("/maintenance/results")
-def get_maintenance_results():
+def get_maintenance_results(top_k: int = 0, cascade: bool = False):
     """
     Lee los últimos datos generados por tu ETL y ejecuta inferencia.
     No necesita input del frontend - solo lee y procesa.
+    top_k > 0 añade las k variables con mayor error de reconstrucción (misma pasada del AE).
+    cascade=true aplica el prefiltro de cascade.py: ventanas claramente normales no pasan por el AE.
     """
     try:
         import sys
@@ -112,7 +115,7 @@ def get_maintenance_results():
         df_last_24 = df.tail(24)
         
         # Ejecutar tu función original sin modificaciones
-        result = infer_from_last_24h(df_last_24)
+        result = infer_from_last_24h(df_last_24, top_k=max(int(top_k), 0), cascade=cascade)
         
         # Formatear respuesta según tu estructura especificada
         response = {
@@ -121,7 +124,8 @@ def get_maintenance_results():
             "results": [{
                 "index": len(df) - 1,  # Índice de la última fila
                 "score": float(result["score"]),
-                "label": "ANOMALY" if result["pred"] == 1 else "NORMAL"
+                "label": "ANOMALY" if result["pred"] == 1 else "NORMAL",
+                **({"top_features": result["top_features"]} if "top_features" in result else {}),
             }],
             "data_info": {
                 "total_rows": len(df),
@@ -3,6 +3,7 @@
 # Based on your ZIP: ae_lstm.keras, iforest.pkl, scaler_if.pkl, scaler_ae.pkl, label_encoder.pkl, feature_columns.csv
 
 import os
+import sys
 import json
 import pickle
 import pandas as pd
@@ -19,12 +20,21 @@ except ImportError as e:
     print(f"Warning: sklearn import failed: {e}")
     sklearn = None
 
-
+try:
+    from tensorflow.keras.models import load_model
+except ImportError:
     load_model = None
 
+# modelo/ holds the bundle reader (shared with training); same path trick as main.py
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modelo"))
+from bundle import BUNDLE_NAME, LoadedBundle, bundle_is_current
+
 class ModelBundle:
     def __init__(self, model_dir: str):
         self.model_dir = model_dir
+        if bundle_is_current(model_dir):
+            self._load_from_bundle()
+            return
         self.feature_columns = self._load_feature_columns()
         self.meta = self._try_load_json("meta.json")
 
@@ -37,6 +47,20 @@ class ModelBundle:
         # Optional label encoder (e.g., for status labels)
         self.label_encoder = self._try_load_pickle("label_encoder.pkl")
 
+    def _load_from_bundle(self):
+        # One mmap'd file: scalers, medians and the IForest node arrays are shared between worker
+        # processes instead of unpickled per worker; only the AE weights are copied (by Keras)
+        b = LoadedBundle(self._p(BUNDLE_NAME))
+        self.feature_columns = b.feature_columns
+        self.meta = b.meta
+        self.iforest = b.iforest
+        self.scaler_if = b.scaler_if
+        self.scaler_ae = b.scaler_ae
+        self.ae_model = b.build_ae() if load_model is not None else None
+        self.label_encoder = None
+        self.classes = b.classes
+        self.medians = b.medians
+
     def _p(self, fname: str) -> str:
         return os.path.join(self.model_dir, fname)
 
@@ -44,8 +68,9 @@ class ModelBundle:
         path = self._p("feature_columns.csv")
         if not os.path.exists(path):
             raise FileNotFoundError(f"feature_columns.csv not found at {path}")
-        s = pd.read_csv(path, header=None).iloc[:, 0].tolist()
-        return [str(x) for x in s]
+        s = [str(x) for x in pd.read_csv(path, header=None).iloc[:, 0].tolist()]
+        # Older artifacts were written with pandas' default "0" header row
+        return s[1:] if s and s[0] == "0" else s
 
     def _load_pickle(self, fname: str):
         path = self._p(fname)
@@ -17,11 +17,22 @@ class PredictRequest(BaseModel):
     # Option B: Server-side batch from a Gold parquet (useful for dashboards)
     gold_parquet_path: Optional[str] = Field(default=None)
     limit_rows: int = Field(default=200)
+    # Optional: return the k features with the largest AE reconstruction error per result
+    top_k: int = Field(default=0, ge=0)
+    # Optional: cascade prefilter (cheap IForest/|z| bounds over the LOOKBACK window ending at each
+    # row) skips the AE on clearly NORMAL rows
+    cascade: bool = Field(default=False)
+
+class FeatureContribution(BaseModel):
+    feature: str
+    error: float   # per-feature reconstruction MSE (scaled units)
+    share: float   # fraction of the row's total reconstruction error
 
 class PredictItem(BaseModel):
     index: int
     score: float
     label: str
+    top_features: Optional[List[FeatureContribution]] = None
     # Optional: attach original features if needed by the frontend
     # features: Dict[str, float] | None = None
 
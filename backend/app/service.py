@@ -7,6 +7,7 @@ import numpy as np
 import pandas as pd
 from app.model_loader import ModelBundle
 from app.utils import ensure_dataframe
+from explain import top_k_features  # modelo/ is put on sys.path by app.model_loader
 
 class AnomalyService:
     def __init__(self, model_dir: str):
@@ -28,21 +29,40 @@ class AnomalyService:
         # AE is optional – if not available, we can serve IForest-only
         return ok, details
 
-    def predict_from_records(self, records: List[Dict[str, float]]) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    def predict_from_records(self, records: List[Dict[str, float]], top_k: int = 0, cascade: bool = False) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
         df = ensure_dataframe(records, self.feature_columns)
-        return self._predict_df(df)
+        return self._predict_df(df, top_k=top_k, cascade=cascade)
 
-    def predict_from_parquet(self, parquet_path: str, limit_rows: int = 200) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    def predict_from_parquet(self, parquet_path: str, limit_rows: int = 200, top_k: int = 0, cascade: bool = False) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
         df = pd.read_parquet(parquet_path)
         if limit_rows > 0:
             df = df.tail(limit_rows)
         # Keep only model features if parquet includes extra columns
         cols = [c for c in self.feature_columns if c in df.columns]
         df = df[cols]
-        return self._predict_df(df)
+        return self._predict_df(df, top_k=top_k, cascade=cascade)
 
     # ---- Internal ----
-    def _predict_df(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    def _lookback(self) -> int:
+        # Sequence AEs (LSTM / student) take (N, LOOKBACK, F); a row-wise AE has no window
+        shape = getattr(self.bundle.ae_model, "input_shape", None)
+        if shape is None or len(shape) != 3:
+            return 1
+        return int(shape[1] or self.meta["lookback"])
+
+    def _cascade_cleared(self, df: pd.DataFrame, X_ae: np.ndarray) -> np.ndarray:
+        # Stage-1 prefilter of cascade.py on the window ending at each row, the statistic its
+        # bounds were calibrated on (meta lookback); rows without a full window are never cleared
+        from cascade import prefilter_frame, clear_mask
+        lookback = int(self.meta["lookback"])
+        cleared = np.zeros(len(X_ae), dtype=bool)
+        if len(X_ae) < lookback:
+            return cleared
+        if_win, z_win = prefilter_frame(df.values, X_ae, self.meta, self.bundle.iforest, self.bundle.scaler_if, lookback)
+        cleared[lookback - 1:] = clear_mask(if_win, z_win, self.meta)
+        return cleared
+
+    def _predict_df(self, df: pd.DataFrame, top_k: int = 0, cascade: bool = False) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
         results: List[Dict[str, Any]] = []
 
         # Isolation Forest
@@ -56,24 +76,53 @@ class AnomalyService:
 
         # Autoencoder (optional)
         ae_scores = None
+        per_feat = None
         if self.bundle.ae_model and self.bundle.scaler_ae:
             X_ae = self.bundle.scaler_ae.transform(df.values)
-            X_hat = self.bundle.ae_model.predict(X_ae, verbose=0)
-            # Reconstruction error as anomaly proxy
-            ae_scores = np.mean(np.square(X_ae - X_hat), axis=1)
+            lookback = self._lookback()
+            # Optional cascade: rows whose window the prefilter clears keep a zero AE error
+            cleared = self._cascade_cleared(df, X_ae) if cascade else np.zeros(len(X_ae), dtype=bool)
+            per_feat = np.zeros((len(X_ae), X_ae.shape[-1]))
+            scored = np.zeros(len(X_ae), dtype=bool)
+            if lookback > 1:
+                # Sequence AE: row i is scored on the LOOKBACK window ending at it (rows in time
+                # order, as infer.py / cascade.score_frame); per-feature MSE over that window drives
+                # the attribution. Rows without a full window of history get no AE error.
+                from ae import recon_errors
+                ends = np.arange(lookback - 1, len(X_ae))
+                todo = ends[~cleared[ends]]
+                if len(todo):
+                    Xseq = np.lib.stride_tricks.sliding_window_view(
+                        X_ae.astype(np.float32), lookback, axis=0).transpose(0, 2, 1)
+                    per_feat[todo] = recon_errors(self.bundle.ae_model,
+                                                  np.ascontiguousarray(Xseq[todo - (lookback - 1)]))[1]
+            else:
+                todo = np.where(~cleared)[0]
+                if len(todo):
+                    X_hat = self.bundle.ae_model.predict(X_ae[todo], verbose=0)
+                    # Reconstruction error as anomaly proxy; the per-feature errors of the same
+                    # forward pass drive the attribution
+                    per_feat[todo] = np.square(X_ae[todo] - X_hat)
+            scored[todo] = True
+            ae_scores = per_feat.mean(axis=1)
         else:
             ae_scores = np.zeros(len(df))
 
         # Simple ensemble: normalized average (you can change weights)
-        s_if = (if_scores - if_scores.min()) / (if_scores.ptp() + 1e-8)
-        s_ae = (ae_scores - ae_scores.min()) / (ae_scores.ptp() + 1e-8) if len(df) > 1 else ae_scores
+        s_if = (if_scores - if_scores.min()) / (np.ptp(if_scores) + 1e-8)
+        s_ae = (ae_scores - ae_scores.min()) / (np.ptp(ae_scores) + 1e-8) if len(df) > 1 else ae_scores
         final_score = 0.5 * s_if + 0.5 * s_ae
 
         # Label by threshold (adjust or make it part of meta.json)
         thr = float(self.meta.get("threshold", 0.6))
         labels = np.where(final_score >= thr, "ANOMALY", "NORMAL")
 
+        tops = top_k_features(per_feat, self.feature_columns, top_k) if (top_k > 0 and per_feat is not None) else None
+
         for i, (sc, lb) in enumerate(zip(final_score.tolist(), labels.tolist())):
-            results.append({"index": int(df.index[i]) if hasattr(df.index, "__iter__") else i, "score": float(sc), "label": lb})
+            item = {"index": int(df.index[i]) if hasattr(df.index, "__iter__") else i, "score": float(sc), "label": lb}
+            if tops is not None:
+                item["top_features"] = tops[i] if scored[i] else []
+            results.append(item)
 
         return df, results
@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 import tensorflow as tf
 from tensorflow.keras import layers, models, callbacks
+from config import EVAL_CHUNK, FINETUNE_EPOCHS, FINETUNE_LR
 
 def build_lstm_ae(steps: int, feats: int) -> tf.keras.Model:
     inp = layers.Input(shape=(steps, feats))
@@ -19,13 +20,73 @@ def build_lstm_ae(steps: int, feats: int) -> tf.keras.Model:
     return m
 
 def train_ae(Xtr_seq, Xva_seq, patience=6, verbose=1):
-    m = build_lstm_ae(Xtr_seq.shape[1], Xtr_seq.shape[2])
+    # Arrays (N, L, F) or tf.data sources of (x, x) batches (see stream.make_dataset)
+    streamed = isinstance(Xtr_seq, tf.data.Dataset)
+    steps, feats = (Xtr_seq.element_spec[0].shape[1:] if streamed else Xtr_seq.shape[1:])
+    m = build_lstm_ae(steps, feats)
     es  = callbacks.EarlyStopping(monitor="val_loss", patience=patience, restore_best_weights=True)
     rlr = callbacks.ReduceLROnPlateau(monitor="val_loss", factor=0.5, patience=3, min_lr=1e-5)
+    if streamed:
+        hist = m.fit(Xtr_seq, validation_data=Xva_seq,
+                     epochs=60, callbacks=[es, rlr], verbose=verbose)
+    else:
+        hist = m.fit(Xtr_seq, Xtr_seq, validation_data=(Xva_seq, Xva_seq),
+                     epochs=60, batch_size=128, callbacks=[es, rlr], verbose=verbose)
+    return m, hist.history
+
+def build_student_ae(steps: int, feats: int, kind: str = "gru", units: int = 32) -> tf.keras.Model:
+    """Compact distillation student with the same (steps, feats) -> (steps, feats) contract."""
+    inp = layers.Input(shape=(steps, feats))
+    if kind == "gru":
+        x = layers.GRU(units)(inp)
+        x = layers.RepeatVector(steps)(x)
+        x = layers.GRU(units, return_sequences=True)(x)
+        out = layers.TimeDistributed(layers.Dense(feats))(x)
+    elif kind == "conv":
+        x = layers.Conv1D(units, 3, padding="same", activation="relu")(inp)
+        x = layers.Conv1D(units // 2, 3, padding="same", activation="relu")(x)
+        x = layers.Conv1D(units, 3, padding="same", activation="relu")(x)
+        out = layers.Conv1D(feats, 1)(x)
+    else:
+        raise ValueError(f"Unknown student kind: {kind}")
+    m = models.Model(inp, out)
+    m.compile(optimizer=tf.keras.optimizers.Adam(1e-3), loss="mse")
+    return m
+
+def build_ae(arch: str, steps: int, feats: int) -> tf.keras.Model:
+    # meta["ae_arch"]: "lstm" (production) or "student_gru" / "student_conv" (distill.py)
+    if arch == "lstm":
+        return build_lstm_ae(steps, feats)
+    if arch.startswith("student_"):
+        return build_student_ae(steps, feats, kind=arch.split("_", 1)[1])
+    raise ValueError(f"Unknown AE arch: {arch}")
+
+def finetune_ae(m, Xtr_seq, Xva_seq, epochs=FINETUNE_EPOCHS, lr=FINETUNE_LR, verbose=1):
+    # Warm start: keep the trained weights, continue with a smaller learning rate
+    m.compile(optimizer=tf.keras.optimizers.Adam(lr), loss="mse")
+    es = callbacks.EarlyStopping(monitor="val_loss", patience=2, restore_best_weights=True)
     hist = m.fit(Xtr_seq, Xtr_seq, validation_data=(Xva_seq, Xva_seq),
-                 epochs=60, batch_size=128, callbacks=[es, rlr], verbose=verbose)
+                 epochs=epochs, batch_size=128, callbacks=[es], verbose=verbose)
     return m, hist.history
 
+def recon_errors(model, Xseq, chunk=EVAL_CHUNK, per_step=False):
+    """
+    Single streamed pass over Xseq (N, L, F): reconstructs `chunk` windows at a time
+    and keeps only the reduced errors, so memory is O(chunk*L*F) + O(N*F).
+    Returns (per_window (N,), per_feature (N, F), per_step (N, L) or None).
+    """
+    N, L, F = Xseq.shape
+    err_feat = np.empty((N, F), dtype=np.float32)
+    err_step = np.empty((N, L), dtype=np.float32) if per_step else None
+    for s in range(0, N, chunk):
+        xb = Xseq[s:s+chunk]
+        rec = model.predict(xb, batch_size=128, verbose=0)
+        sq = (xb - rec)**2
+        err_feat[s:s+len(xb)] = sq.mean(axis=1)   # time-avg per feature
+        if per_step:
+            err_step[s:s+len(xb)] = sq.mean(axis=2)
+    err_win = err_feat.mean(axis=1)  # == mean over (L, F)
+    return err_win, err_feat, err_step
+
 def recon_error(model, Xseq):
-    rec = model.predict(Xseq, verbose=0)
-    return np.mean((Xseq - rec)**2, axis=(1,2))
+    return recon_errors(model, Xseq)[0]
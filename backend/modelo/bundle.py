@@ -0,0 +1,260 @@
+# Single-file, memory-mappable model bundle (one .npy uint8 blob: JSON header + aligned arrays)
+#
+# Layout (inside the .npy payload, which numpy already aligns to 64 bytes):
+#   [0:8)        little-endian uint64 header length H
+#   [8:8+H)      UTF-8 JSON header {"format", "version", "meta", "feature_columns", "classes", "arrays": {...}}
+#   [...]        arrays, each starting on a 64-byte boundary; header["arrays"][name] = {offset, dtype, shape}
+#
+# np.load(path, mmap_mode="r") maps the file once; every array is a zero-copy view, so worker
+# processes serving the same bundle share its pages instead of unpickling private copies.
+# The IsolationForest is stored as flat node arrays (all trees concatenated) and scored by
+# ArrayIsolationForest straight from those views. The AE weights are the one exception: Keras
+# copies them into its own tensors, so each process holds a private copy of the (small) AE.
+# Only numpy/json/pickle are needed to read it (importable from the API without modelo's config).
+import json
+import pickle
+from pathlib import Path
+import numpy as np
+
+BUNDLE_FORMAT = "dashboard-maintenance-bundle"
+BUNDLE_VERSION = 2   # v2: IsolationForest as flat node arrays (v1 pickled it)
+BUNDLE_NAME = "model_bundle.npy"
+_ALIGN = 64
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+def write_bundle(path, header: dict, arrays: dict[str, np.ndarray]) -> Path:
+    path = Path(path)
+    arrays = {k: np.ascontiguousarray(v) for k, v in arrays.items()}
+    # Offsets depend on header length, which depends on offsets: fix the header size first
+    specs = {k: {"offset": 0, "dtype": v.dtype.str, "shape": list(v.shape)} for k, v in arrays.items()}
+    hdr = {"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION, **header, "arrays": specs}
+    probe = json.dumps(hdr).encode("utf-8")
+    reserve = len(probe) + 32 * len(arrays) + 64   # room for the real offset digits
+    pos = 8 + reserve
+    pos += _pad(pos)
+    for k, v in arrays.items():
+        specs[k]["offset"] = pos
+        pos += v.nbytes
+        pos += _pad(pos)
+    raw = json.dumps(hdr).encode("utf-8")
+    assert len(raw) <= reserve, "bundle header reservation too small"
+    raw = raw.ljust(reserve, b" ")
+
+    blob = np.zeros(pos, dtype=np.uint8)
+    blob[:8] = np.frombuffer(np.uint64(len(raw)).tobytes(), dtype=np.uint8)
+    blob[8:8+len(raw)] = np.frombuffer(raw, dtype=np.uint8)
+    for k, v in arrays.items():
+        off = specs[k]["offset"]
+        blob[off:off+v.nbytes] = v.reshape(-1).view(np.uint8)
+    tmp = path.with_name(path.name + ".tmp.npy")
+    np.save(tmp, blob, allow_pickle=False)
+    tmp.replace(path)  # atomic swap: readers never see a half-written bundle
+    return path
+
+def read_bundle(path, mmap: bool = True) -> tuple[dict, dict[str, np.ndarray]]:
+    blob = np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    hlen = int(np.frombuffer(bytes(blob[:8]), dtype=np.uint64)[0])
+    header = json.loads(bytes(blob[8:8+hlen]).decode("utf-8"))
+    if header.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"{path} is not a model bundle")
+    if int(header.get("version", 0)) > BUNDLE_VERSION:
+        raise ValueError(f"Bundle version {header['version']} is newer than supported ({BUNDLE_VERSION})")
+    arrays = {}
+    for k, s in header["arrays"].items():
+        dt = np.dtype(s["dtype"])
+        n = int(np.prod(s["shape"], dtype=np.int64)) * dt.itemsize
+        arrays[k] = blob[s["offset"]:s["offset"]+n].view(dt).reshape(s["shape"])
+    return header, arrays
+
+def bundle_is_current(artifacts_dir) -> bool:
+    """True if the bundle exists and is not older than meta.json (i.e. no run skipped the export)."""
+    b, m = Path(artifacts_dir) / BUNDLE_NAME, Path(artifacts_dir) / "meta.json"
+    return b.exists() and (not m.exists() or b.stat().st_mtime >= m.stat().st_mtime)
+
+class ArrayScaler:
+    """StandardScaler.transform backed by (possibly memory-mapped) mean/scale arrays."""
+    def __init__(self, mean, scale):
+        self.mean_, self.scale_ = mean, scale
+        self.n_features_in_ = len(mean)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+class ArrayIsolationForest:
+    """
+    IsolationForest.score_samples / decision_function over the flat node arrays of
+    iforest_arrays(). All trees are walked together, one level per step, on `chunk` rows at
+    a time; node arrays are only indexed, never copied, so they stay shared pages.
+    """
+    def __init__(self, arrays: dict, header: dict, chunk: int = 1024):
+        self.left, self.right = arrays["iforest.children_left"], arrays["iforest.children_right"]
+        self.feature, self.threshold = arrays["iforest.feature"], arrays["iforest.threshold"]
+        self.missing_left = arrays["iforest.missing_go_to_left"]
+        self.path_length = arrays["iforest.path_length"]
+        self.roots = arrays["iforest.roots"]
+        self.n_estimators = len(self.roots)
+        self.max_depth = int(header["max_depth"])
+        self.offset_ = float(header["offset"])
+        self.denominator = float(header["denominator"])
+        self.n_features_in_ = int(header["n_features"])
+        self.chunk = chunk
+
+    def _depths(self, X: np.ndarray) -> np.ndarray:
+        # sklearn casts inputs to float32 before walking the trees; same split decisions here
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X), dtype=np.float64)
+        for s in range(0, len(X), self.chunk):
+            xb = X[s:s+self.chunk]
+            rows = np.arange(len(xb))[:, None]
+            node = np.broadcast_to(self.roots, (len(xb), self.n_estimators)).copy()
+            for _ in range(self.max_depth):
+                left = self.left[node]
+                inner = left >= 0
+                if not inner.any():
+                    break
+                x = xb[rows, np.where(inner, self.feature[node], 0)]
+                go_left = np.where(np.isnan(x), self.missing_left[node] != 0, x <= self.threshold[node])
+                node = np.where(inner, np.where(go_left, left, self.right[node]), node)
+            out[s:s+len(xb)] = self.path_length[node].sum(axis=1)
+        return out
+
+    def score_samples(self, X) -> np.ndarray:
+        depths = self._depths(X)
+        if self.denominator == 0:   # single training sample: sklearn sets the score to 1
+            return -np.ones_like(depths)
+        return -(2.0 ** (-depths / self.denominator))
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X) -> np.ndarray:
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+def iforest_arrays(model) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Flatten a fitted IsolationForest: every tree's nodes concatenated, child indices made
+    global, features mapped through estimators_features_, and the per-node path length
+    (depth + c(n_node_samples) - 1, as in sklearn's score_samples) precomputed.
+    """
+    from sklearn.ensemble._iforest import _average_path_length
+
+    left, right, feat, thr, miss, n_samples, path, roots = [], [], [], [], [], [], [], []
+    base = 0
+    for est, cols in zip(model.estimators_, model.estimators_features_):
+        t = est.tree_
+        cl, cr = t.children_left.astype(np.int64), t.children_right.astype(np.int64)
+        leaf = cl < 0
+        roots.append(base)
+        left.append(np.where(leaf, -1, cl + base))
+        right.append(np.where(leaf, -1, cr + base))
+        feat.append(np.where(leaf, -1, np.asarray(cols)[np.maximum(t.feature, 0)]).astype(np.int64))
+        thr.append(t.threshold.astype(np.float64))
+        # NaN routing (sklearn >= 1.3); older trees send NaN right, as "NaN <= thr" is False
+        miss.append(np.asarray(getattr(t, "missing_go_to_left", np.zeros(t.node_count)), dtype=np.uint8))
+        n_samples.append(t.n_node_samples.astype(np.int64))
+        path.append(t.compute_node_depths() + _average_path_length(t.n_node_samples) - 1.0)
+        base += t.node_count
+    denominator = len(model.estimators_) * float(_average_path_length([model._max_samples])[0])
+    header = {"max_depth": int(max(e.tree_.max_depth for e in model.estimators_)),
+              "offset": float(model.offset_), "denominator": denominator,
+              "n_features": int(model.n_features_in_), "n_nodes": int(base)}
+    arrays = {
+        "iforest.children_left": np.concatenate(left),
+        "iforest.children_right": np.concatenate(right),
+        "iforest.feature": np.concatenate(feat),
+        "iforest.threshold": np.concatenate(thr),
+        "iforest.missing_go_to_left": np.concatenate(miss),
+        "iforest.n_node_samples": np.concatenate(n_samples),
+        "iforest.path_length": np.concatenate(path).astype(np.float64),
+        "iforest.roots": np.asarray(roots, dtype=np.int64),
+    }
+    return header, arrays
+
+class LoadedBundle:
+    """Read side of the bundle: arrays stay memory-mapped; pickled extras are decoded on first use."""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.header, self.arrays = read_bundle(self.path)
+        self.meta = self.header.get("meta", {})
+        self.feature_columns = list(self.header["feature_columns"])
+        self.classes = self.header.get("classes")
+        self.scaler_ae = ArrayScaler(self.arrays["scaler_ae.mean"], self.arrays["scaler_ae.scale"])
+        self.scaler_if = (ArrayScaler(self.arrays["scaler_if.mean"], self.arrays["scaler_if.scale"])
+                          if "scaler_if.mean" in self.arrays else None)
+        self.medians = self.arrays["medians"]
+        self._iforest = None
+
+    def medians_series(self):
+        import pandas as pd
+        return pd.Series(np.asarray(self.medians), index=self.feature_columns)
+
+    def ae_weights(self) -> list[np.ndarray]:
+        n = int(self.header["ae"]["n_weights"])
+        return [self.arrays[f"ae.w{i}"] for i in range(n)]
+
+    def build_ae(self):
+        """Rebuild the LSTM-AE graph and load weights (Keras copies them into its own tensors)."""
+        from ae import build_ae
+        h = self.header["ae"]
+        m = build_ae(h.get("arch", "lstm"), int(h["steps"]), int(h["feats"]))
+        m.set_weights(self.ae_weights())
+        return m
+
+    @property
+    def iforest(self):
+        if self._iforest is None:
+            if "iforest.roots" in self.arrays:
+                self._iforest = ArrayIsolationForest(self.arrays, self.header["iforest"])
+            elif "iforest.pickle" in self.arrays:   # v1 bundles
+                self._iforest = pickle.loads(self.arrays["iforest.pickle"].tobytes())
+        return self._iforest
+
+def export_bundle(artifacts_dir, out_path=None) -> Path:
+    """Pack the current artifacts (keras/joblib/csv/json) into one bundle file."""
+    import joblib
+    import tensorflow as tf
+    from data_load import read_feature_columns
+
+    artifacts_dir = Path(artifacts_dir)
+    out_path = Path(out_path) if out_path else artifacts_dir / BUNDLE_NAME
+    feature_cols = read_feature_columns(artifacts_dir / "feature_columns.csv")
+    with open(artifacts_dir / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    medians = joblib.load(artifacts_dir / "medians.pkl")
+    scaler_ae = joblib.load(artifacts_dir / "scaler_ae.pkl")
+    le = joblib.load(artifacts_dir / "label_encoder.pkl")
+    ae = tf.keras.models.load_model(artifacts_dir / "ae_lstm.keras")
+
+    arrays = {
+        "medians": medians.reindex(feature_cols).to_numpy(dtype=np.float64),
+        "scaler_ae.mean": scaler_ae.mean_.astype(np.float64),
+        "scaler_ae.scale": scaler_ae.scale_.astype(np.float64),
+    }
+    if (artifacts_dir / "scaler_if.pkl").exists():
+        scaler_if = joblib.load(artifacts_dir / "scaler_if.pkl")
+        arrays["scaler_if.mean"] = scaler_if.mean_.astype(np.float64)
+        arrays["scaler_if.scale"] = scaler_if.scale_.astype(np.float64)
+    weights = ae.get_weights()
+    for i, w in enumerate(weights):
+        arrays[f"ae.w{i}"] = w
+    if_header = None
+    if (artifacts_dir / "iforest.pkl").exists():
+        if_header, if_arrays = iforest_arrays(joblib.load(artifacts_dir / "iforest.pkl"))
+        arrays.update(if_arrays)
+
+    header = {
+        "meta": meta,
+        "feature_columns": feature_cols,
+        "classes": le.classes_.tolist(),
+        "ae": {"arch": meta.get("ae_arch", "lstm"), "steps": int(ae.input_shape[1]),
+               "feats": int(ae.input_shape[2]), "n_weights": len(weights)},
+    }
+    if if_header is not None:
+        header["iforest"] = if_header
+    return write_bundle(out_path, header, arrays)
+
+if __name__ == "__main__":
+    from paths import ARTIFACTS_DIR
+    print("Bundle written to:", export_bundle(ARTIFACTS_DIR))
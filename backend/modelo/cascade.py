@@ -0,0 +1,141 @@
+# Cascade scoring: cheap prefilter clears obvious NORMAL windows, the LSTM-AE scores the rest
+#
+# Stage 1 (per window, no model call): max over the window of
+#   - the IForest score normalized with meta if_score_min/max, and
+#   - |z| of the AE-scaled features (training statistics are the scaler's mean/scale).
+# A window is cleared when both maxima are below the thresholds calibrated on validation
+# (meta cascade_if_clear / cascade_z_clear). Everything else goes to the AE (stage 2).
+# The bounds belong to one model: every run mode that changes the AE, the IForest or
+# operate_thr (train, incremental, stream, distill promote) recalibrates them (cascade_from_valid).
+import numpy as np
+import pandas as pd
+import joblib
+
+from config import LOOKBACK, HORIZON_SHIFT, CASCADE_MAX_MISS, CASCADE_VERIFY_FRACTION, RANDOM_STATE
+from paths import ARTIFACTS_DIR
+from ensemble import minmax_transform
+from ae import recon_errors
+
+def window_max(rows: np.ndarray, lookback: int, horizon_shift: int = 0) -> np.ndarray:
+    """Max of a per-row value over each window, aligned with prep.make_sequences ends."""
+    v = np.lib.stride_tricks.sliding_window_view(np.asarray(rows, dtype=np.float64), lookback)
+    return v.max(axis=1)[:len(v) - horizon_shift]
+
+def prefilter_stats(X_sc: np.ndarray, if_norm_rows: np.ndarray | None, lookback: int, horizon_shift: int = 0):
+    """(if_win, z_win) stage-1 statistics per window; if_win is None without an IForest."""
+    z_win = window_max(np.abs(np.asarray(X_sc)).max(axis=1), lookback, horizon_shift)
+    if_win = window_max(if_norm_rows, lookback, horizon_shift) if if_norm_rows is not None else None
+    return if_win, z_win
+
+def calibrate_cascade(if_win, z_win, pred_pos: np.ndarray, max_miss: float = CASCADE_MAX_MISS) -> dict:
+    """
+    Clear thresholds such that at most `max_miss` of the windows the full model flags
+    (pred_pos) would be cleared by stage 1. With max_miss=0 the bound is the smallest
+    stage-1 statistic seen on any flagged validation window.
+    """
+    pos = np.asarray(pred_pos).astype(bool)
+    if pos.sum() == 0:
+        return {"cascade_if_clear": None, "cascade_z_clear": None, "cascade_max_miss": float(max_miss)}
+    q = float(max_miss)
+    out = {"cascade_z_clear": float(np.quantile(z_win[pos], q)), "cascade_max_miss": q}
+    out["cascade_if_clear"] = float(np.quantile(if_win[pos], q)) if if_win is not None else None
+    cleared = clear_mask(if_win, z_win, out)
+    out["cascade_valid_skip_rate"] = float(cleared.mean())
+    return out
+
+def cascade_from_valid(X_va_sc, scores_if, pred_pos: np.ndarray, meta: dict, z_win: np.ndarray | None = None,
+                       lookback: int = LOOKBACK, horizon_shift: int = HORIZON_SHIFT) -> dict:
+    """
+    cascade_* meta fields for the model described by `meta` (if_score_min/max) from its
+    validation split: AE-scaled rows X_va_sc, raw IForest scores (None without a forest) and
+    the windows the operating policy flags. Streamed runs pass z_win instead of X_va_sc.
+    """
+    if_norm_rows = None
+    if scores_if is not None and meta.get("if_score_min") is not None:
+        if_norm_rows = minmax_transform(np.asarray(scores_if), meta["if_score_min"], meta["if_score_max"])
+    if z_win is None:
+        if_win, z_win = prefilter_stats(np.asarray(X_va_sc), if_norm_rows, lookback, horizon_shift)
+    else:
+        if_win = window_max(if_norm_rows, lookback, horizon_shift) if if_norm_rows is not None else None
+    return calibrate_cascade(if_win, z_win, pred_pos)
+
+def load_prefilter_iforest():
+    """(iforest, scaler_if) for stage 1: from the bundle when current, else the pickles; (None, None) if absent."""
+    from bundle import BUNDLE_NAME, LoadedBundle, bundle_is_current
+    if bundle_is_current(ARTIFACTS_DIR):
+        b = LoadedBundle(ARTIFACTS_DIR / BUNDLE_NAME)
+        return b.iforest, b.scaler_if
+    if (ARTIFACTS_DIR / "iforest.pkl").exists():
+        return joblib.load(ARTIFACTS_DIR / "iforest.pkl"), joblib.load(ARTIFACTS_DIR / "scaler_if.pkl")
+    return None, None
+
+def prefilter_frame(X: pd.DataFrame, X_sc: np.ndarray, meta: dict, iforest=None, scaler_if=None,
+                    lookback: int = LOOKBACK):
+    """Stage-1 (if_win, z_win) for every `lookback` window of imputed rows X (X_sc: AE-scaled)."""
+    if_norm = None
+    if iforest is not None and meta.get("if_score_min") is not None:
+        if_raw = -iforest.score_samples(scaler_if.transform(X))
+        if_norm = minmax_transform(if_raw, meta["if_score_min"], meta["if_score_max"])
+    return prefilter_stats(X_sc, if_norm, lookback)
+
+def clear_mask(if_win, z_win, meta: dict) -> np.ndarray:
+    z_thr = meta.get("cascade_z_clear")
+    if z_thr is None:
+        return np.zeros(len(z_win), dtype=bool)
+    mask = z_win < z_thr
+    if_thr = meta.get("cascade_if_clear")
+    if if_win is not None and if_thr is not None:
+        mask &= if_win < if_thr
+    return mask
+
+def cascade_scores(ae, Xseq: np.ndarray, if_win, z_win, meta: dict,
+                   verify_fraction: float = CASCADE_VERIFY_FRACTION, seed: int = RANDOM_STATE):
+    """
+    Operating scores for Xseq with the AE run only on uncertain windows. Cleared windows get
+    score 0.0 / pred 0. A random `verify_fraction` of cleared windows is also scored with the
+    AE to measure agreement with full scoring. Returns (score, pred, stats).
+    """
+    N = len(Xseq)
+    cleared = clear_mask(if_win, z_win, meta)
+    score = np.zeros(N, dtype=np.float64)
+    todo = np.where(~cleared)[0]
+    if len(todo):
+        err, _, _ = recon_errors(ae, Xseq[todo])
+        score[todo] = minmax_transform(err, meta["ae_score_min"], meta["ae_score_max"])
+    pred = (score > meta["operate_thr"]).astype(int)
+
+    stats = {"n_windows": int(N), "n_ae": int(len(todo)), "skip_rate": float(cleared.mean()) if N else 0.0}
+    cl = np.where(cleared)[0]
+    n_ver = int(round(verify_fraction * len(cl)))
+    if n_ver > 0:
+        pick = np.random.default_rng(seed).choice(cl, size=n_ver, replace=False)
+        err, _, _ = recon_errors(ae, Xseq[pick])
+        full_pred = minmax_transform(err, meta["ae_score_min"], meta["ae_score_max"]) > meta["operate_thr"]
+        stats.update({"verified": n_ver, "agreement": float((~full_pred).mean()),
+                      "missed_positives": int(full_pred.sum())})
+    return score, pred, stats
+
+def score_frame(df: pd.DataFrame, cascade: bool = True, verify_fraction: float = CASCADE_VERIFY_FRACTION):
+    """
+    Backfill / fleet scoring: operating score for every LOOKBACK window of df (rows in time
+    order, Gold feature columns). cascade=False scores every window with the AE.
+    Returns (DataFrame[score, pred] indexed by window end, stats).
+    """
+    from infer import load_artifacts
+    ae, scaler_ae, feature_cols, meta, medians = load_artifacts()
+    X = df[feature_cols].astype(float).replace([np.inf, -np.inf], np.nan).fillna(medians)
+    X_sc = scaler_ae.transform(X)
+    Xseq = np.lib.stride_tricks.sliding_window_view(X_sc.astype(np.float32), LOOKBACK, axis=0).transpose(0, 2, 1)
+    ends = df.index[LOOKBACK-1:]
+
+    if not cascade:
+        err, _, _ = recon_errors(ae, np.ascontiguousarray(Xseq))
+        score = minmax_transform(err, meta["ae_score_min"], meta["ae_score_max"])
+        out = pd.DataFrame({"score": score, "pred": (score > meta["operate_thr"]).astype(int)}, index=ends)
+        return out, {"n_windows": len(out), "n_ae": len(out), "skip_rate": 0.0}
+
+    if_win, z_win = prefilter_frame(X, X_sc, meta, *load_prefilter_iforest())
+    score, pred, stats = cascade_scores(ae, Xseq, if_win, z_win, meta, verify_fraction=verify_fraction)
+    print(f"[cascade] skip_rate={stats['skip_rate']:.1%} AE windows={stats['n_ae']}/{stats['n_windows']}"
+          + (f" agreement={stats['agreement']:.2%}" if "agreement" in stats else ""))
+    return pd.DataFrame({"score": score, "pred": pred}, index=ends), stats
@@ -5,6 +5,42 @@ RANDOM_STATE   = 42
 LOOKBACK       = 24       # steps per sequence
 HORIZON_SHIFT  = 12       # prediction horizon in hours (0/6/12/24...)
 
+# Evaluation: sequences per forward-pass chunk (bounds memory of reconstructions)
+EVAL_CHUNK     = 4096
+
+# Streamed AE training (stream.py): windows in the per-epoch shuffle buffer (bounds memory)
+STREAM_SHUFFLE_BUFFER = 8192
+
+# Incremental (warm-start) retraining
+FINETUNE_EPOCHS = 5          # AE fine-tune epochs on new + replayed windows
+FINETUNE_LR     = 1e-4       # lower than the from-scratch 1e-3
+REPLAY_RATIO    = 1.0        # replayed historical windows per new window
+IF_EXTRA_TREES  = 100        # trees added to the IForest per incremental run
+
+# Training-run profiling: None | "cprofile" | "pyinstrument" (per-stage dumps under RUNS_DIR)
+PROFILE_DUMP = None
+
+# Also pack artifacts into the single-file, memory-mappable bundle (bundle.py) after each run
+WRITE_BUNDLE = True
+
+# Cascade scoring (cascade.py): share of validation alerts stage 1 may clear, and share of
+# cleared windows re-scored with the AE to measure agreement
+CASCADE_MAX_MISS        = 0.0
+CASCADE_VERIFY_FRACTION = 0.05
+
+# Distillation (distill.py): compact student AE matched to the production teacher
+DISTILL_KIND           = "gru"   # "gru" | "conv"
+DISTILL_UNITS          = 32
+DISTILL_EPOCHS         = 30
+DISTILL_AUC_TOLERANCE  = 0.01    # max ROC-AUC drop vs teacher to export the student
+DISTILL_LATENCY_MS     = None    # optional single-window CPU latency budget (ms)
+DISTILL_PROMOTE        = False   # also swap the student in as ae_lstm.keras (teacher kept as backup)
+
+# Redundant-feature pruning (prep.prune_redundant), fit on train rows; see feature_prune.py report
+PRUNE_FEATURES  = False
+PRUNE_CORR_THR  = 0.98
+PRUNE_REL_STD   = 1e-6
+
 # Operating policy (production-facing)
 OPERATE_WITH_AE_ONLY = True  # Recommended for H=12
 ALPHA          = 0.9         # AE weight if ensemble is used (ignored when AE-only)
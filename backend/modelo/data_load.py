@@ -1,6 +1,10 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 from deltalake import DeltaTable
-from paths import RUTA_GOLD_COMPLETE
+from config import LEAK_OR_TEXT_COLS, TARGET
+from paths import RUTA_GOLD_COMPLETE, ARTIFACTS_DIR
 
 def load_gold_complete() -> pd.DataFrame:
     dt = DeltaTable(str(RUTA_GOLD_COMPLETE))
@@ -8,3 +12,62 @@ def load_gold_complete() -> pd.DataFrame:
     df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
     df = df.sort_values("timestamp").set_index("timestamp")
     return df
+
+def to_utc(ts) -> pd.Timestamp | None:
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+def _scan_filter(start: pd.Timestamp | None, end: pd.Timestamp | None):
+    """year/month partition pruning + timestamp row filter for [start, end)."""
+    expr = None
+    if start is not None or end is not None:
+        lo = start or pd.Timestamp("1970-01-01", tz="UTC")
+        hi = end or pd.Timestamp.now(tz="UTC")
+        months = pd.period_range(lo.tz_localize(None), hi.tz_localize(None), freq="M")
+        for p in months:
+            e = (ds.field("year") == p.year) & (ds.field("month") == p.month)
+            expr = e if expr is None else (expr | e)
+    ts_type = pa.timestamp("us", tz="UTC")
+    if start is not None:
+        e = ds.field("timestamp") >= pa.scalar(start.to_pydatetime(), ts_type)
+        expr = e if expr is None else (expr & e)
+    if end is not None:
+        e = ds.field("timestamp") < pa.scalar(end.to_pydatetime(), ts_type)
+        expr = e if expr is None else (expr & e)
+    return expr
+
+def load_gold_matrix(start=None, end=None, columns: list[str] | None = None,
+                     target: str | None = TARGET, path=RUTA_GOLD_COMPLETE):
+    """
+    Projected, partition-pruned read of Gold for training/scoring.
+    - start/end: time range [start, end) (UTC); prunes year/month partitions before any file is opened.
+    - columns: feature order to return (e.g. read_feature_columns()); default = numeric non-leak columns
+      (the candidates prep.select_columns starts from).
+    Returns (X float32 (N, F), DatetimeIndex, y (N,) str array or None, columns).
+    Columns are cast one by one into a preallocated float32 matrix (no float64 pandas copy).
+    """
+    dataset = DeltaTable(str(path)).to_pyarrow_dataset()
+    if columns is None:
+        skip = set(LEAK_OR_TEXT_COLS) | {"timestamp"}
+        columns = [f.name for f in dataset.schema
+                   if f.name not in skip and (pa.types.is_floating(f.type) or pa.types.is_integer(f.type))]
+    proj = ["timestamp", *columns] + ([target] if target else [])
+    tbl = dataset.to_table(columns=proj, filter=_scan_filter(to_utc(start), to_utc(end)))
+    tbl = tbl.sort_by("timestamp")
+
+    X = np.empty((tbl.num_rows, len(columns)), dtype=np.float32)
+    for j, c in enumerate(columns):
+        X[:, j] = tbl.column(c).cast(pa.float32()).to_numpy()  # nulls -> NaN
+    X[~np.isfinite(X)] = np.nan  # inf -> NaN (same as the pandas path)
+
+    idx = pd.DatetimeIndex(tbl.column("timestamp").to_pandas(), name="timestamp")
+    idx = idx.tz_localize("UTC") if idx.tz is None else idx.tz_convert("UTC")
+    y = tbl.column(target).to_numpy().astype(str) if target else None
+    return X, idx, y, list(columns)
+
+def read_feature_columns(path=ARTIFACTS_DIR / "feature_columns.csv") -> list[str]:
+    cols = pd.read_csv(path, header=None)[0].astype(str).tolist()
+    # Older artifacts were written with pandas' default "0" header row
+    return cols[1:] if cols and cols[0] == "0" else cols
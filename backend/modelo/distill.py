@@ -0,0 +1,144 @@
+# Distills the production LSTM-AE (teacher) into a compact student AE and reports AUC vs latency
+import json
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from tensorflow.keras import callbacks
+
+from config import (
+    LOOKBACK, HORIZON_SHIFT, TARGET, OPERATE_WITH_AE_ONLY,
+    DISTILL_KIND, DISTILL_UNITS, DISTILL_EPOCHS, DISTILL_AUC_TOLERANCE,
+    DISTILL_LATENCY_MS, DISTILL_PROMOTE
+)
+from paths import ARTIFACTS_DIR, RESULTS_DIR
+from data_load import load_gold_matrix
+from prep import temporal_split, apply_impute, scale_transform, make_sequences
+from ae import build_student_ae, recon_errors
+from ensemble import metrics_auc, best_thr_fbeta, minmax_transform, operate_threshold
+from iforest import iforest_scores
+from cascade import cascade_from_valid
+from incremental import load_current_artifacts
+from train import lineage_entry, save_meta
+
+def measure_latency(model, Xseq: np.ndarray, n_single: int = 50, n_batch: int = 2048) -> dict:
+    """CPU latency: median single-window predict (ms) and batched throughput (windows/s)."""
+    x1 = Xseq[:1]
+    model(x1, training=False)  # warm-up / graph build
+    singles = []
+    for i in range(min(n_single, len(Xseq))):
+        t0 = time.perf_counter()
+        model(Xseq[i:i+1], training=False)
+        singles.append((time.perf_counter() - t0) * 1000)
+    xb = Xseq[:n_batch]
+    t0 = time.perf_counter()
+    model.predict(xb, batch_size=128, verbose=0)
+    dt = time.perf_counter() - t0
+    return {
+        "single_ms_p50": float(np.median(singles)),
+        "batch_windows_per_s": float(len(xb) / dt) if dt > 0 else None,
+        "params": int(model.count_params()),
+    }
+
+def run_distillation(kind: str = DISTILL_KIND, units: int = DISTILL_UNITS, epochs: int = DISTILL_EPOCHS,
+                     promote: bool = DISTILL_PROMOTE):
+    """
+    Train a student on the teacher's reconstructions (soft targets) over the same train/valid
+    split as train.py, then compare ROC/PR-AUC and latency. The student is exported as
+    ae_student.keras when its AUC drop is within DISTILL_AUC_TOLERANCE (and the latency budget,
+    if set); with promote=True it replaces ae_lstm.keras and meta is recalibrated for it.
+    Once a student is promoted (meta ae_arch != "lstm") the teacher is the LSTM backup
+    ae_lstm_teacher.keras, so repeated runs never distill a student of a student.
+    """
+    art = load_current_artifacts()
+    teacher, meta, X_cols = art["ae"], art["meta"], art["feature_cols"]
+    teacher_path = ARTIFACTS_DIR / "ae_lstm_teacher.keras"
+    lstm_current = meta.get("ae_arch", "lstm") == "lstm"
+    if not lstm_current:
+        if not teacher_path.exists():
+            raise FileNotFoundError(f"ae_lstm.keras holds a {meta['ae_arch']} and no teacher backup at {teacher_path}")
+        teacher = tf.keras.models.load_model(teacher_path)
+    normal_id = int(meta["normal_id"])
+
+    # Same data preparation as the production run (saved medians / scaler / feature order)
+    X, idx, y, _ = load_gold_matrix(columns=X_cols, target=TARGET)
+    X_full = pd.DataFrame(X.astype(np.float64), index=idx, columns=X_cols, copy=False)
+    X_tr, X_va, y_tr, y_va = temporal_split(X_full, pd.Series(y, index=idx), split_ratio=0.80)
+    X_tr = apply_impute(X_tr, art["medians"])
+    X_va = apply_impute(X_va, art["medians"])
+    le = art["label_encoder"]
+    mask_normal = (le.transform(y_tr) == normal_id)
+    y_valid_bin = (le.transform(y_va) != normal_id).astype(int)
+    Xtr_seq, _ = make_sequences(scale_transform(art["scaler_ae"], X_tr[mask_normal]), LOOKBACK, HORIZON_SHIFT)
+    X_va_sc = scale_transform(art["scaler_ae"], X_va)
+    Xva_seq, _ = make_sequences(X_va_sc, LOOKBACK, HORIZON_SHIFT)
+    yva = y_valid_bin[LOOKBACK-1:len(y_valid_bin)-HORIZON_SHIFT]
+
+    # Soft targets: the teacher's reconstructions
+    rec_tr = teacher.predict(Xtr_seq, batch_size=256, verbose=0)
+    rec_va = teacher.predict(Xva_seq, batch_size=256, verbose=0)
+    err_va_t, _, _ = recon_errors(teacher, Xva_seq)
+
+    student = build_student_ae(Xtr_seq.shape[1], Xtr_seq.shape[2], kind=kind, units=units)
+    es = callbacks.EarlyStopping(monitor="val_loss", patience=4, restore_best_weights=True)
+    student.fit(Xtr_seq, rec_tr, validation_data=(Xva_seq, rec_va),
+                epochs=epochs, batch_size=128, callbacks=[es], verbose=1)
+    del rec_tr, rec_va
+
+    err_tr_s, _, _ = recon_errors(student, Xtr_seq)
+    err_va_s, _, _ = recon_errors(student, Xva_seq)
+    t_roc, t_pr = metrics_auc(yva, err_va_t)
+    s_roc, s_pr = metrics_auc(yva, err_va_s)
+    lat_t = measure_latency(teacher, Xva_seq)
+    lat_s = measure_latency(student, Xva_seq)
+
+    ok_auc = (t_roc - s_roc) <= DISTILL_AUC_TOLERANCE
+    ok_lat = DISTILL_LATENCY_MS is None or lat_s["single_ms_p50"] <= DISTILL_LATENCY_MS
+    report = {
+        "arch": f"student_{kind}", "units": int(units),
+        "teacher": {"roc_auc": float(t_roc), "pr_auc": float(t_pr), **lat_t},
+        "student": {"roc_auc": float(s_roc), "pr_auc": float(s_pr), **lat_s},
+        "error_corr": float(np.corrcoef(err_va_t, err_va_s)[0, 1]),
+        "speedup_single": lat_t["single_ms_p50"] / max(lat_s["single_ms_p50"], 1e-9),
+        "auc_tolerance": float(DISTILL_AUC_TOLERANCE), "latency_budget_ms": DISTILL_LATENCY_MS,
+        "accepted": bool(ok_auc and ok_lat),
+    }
+    print(f"\n[Distill] teacher AUC={t_roc:.4f} {lat_t['single_ms_p50']:.2f} ms | "
+          f"student AUC={s_roc:.4f} {lat_s['single_ms_p50']:.2f} ms | accepted={report['accepted']}")
+    with open(RESULTS_DIR / "distill_report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if not report["accepted"]:
+        return report
+    student.save(ARTIFACTS_DIR / "ae_student.keras")
+
+    if promote:
+        # Back up the LSTM only while ae_lstm.keras still holds it; a promoted student never
+        # overwrites the backup (the only remaining copy of the teacher)
+        if lstm_current:
+            shutil.copy2(ARTIFACTS_DIR / "ae_lstm.keras", teacher_path)
+        student.save(ARTIFACTS_DIR / "ae_lstm.keras")
+        _, thr_f2, _ = best_thr_fbeta(err_va_s, yva, beta=2.0)
+        meta.update({
+            "ae_arch": report["arch"],
+            "ae_thr_p95": float(np.quantile(err_tr_s, 0.95)),
+            "ae_thr_f2": float(thr_f2),
+            "ae_roc_auc": float(s_roc), "ae_pr_auc": float(s_pr),
+            "ae_score_min": float(err_tr_s.min()), "ae_score_max": float(err_tr_s.max()),
+        })
+        if OPERATE_WITH_AE_ONLY:
+            ae_norm = minmax_transform(err_va_s, meta["ae_score_min"], meta["ae_score_max"])
+            meta["operate_thr"] = operate_threshold(ae_norm, yva)
+        # Cascade bounds follow the promoted student's score range and threshold
+        scores_if = (iforest_scores(art["iforest"], art["scaler_if"], X_va)
+                     if art["iforest"] is not None else None)
+        ae_pred = minmax_transform(err_va_s, meta["ae_score_min"], meta["ae_score_max"]) > meta["operate_thr"]
+        meta.update(cascade_from_valid(X_va_sc.values, scores_if, ae_pred, meta))
+        meta.setdefault("lineage", []).append(lineage_entry("distill", meta, arch=report["arch"]))
+        save_meta(meta)
+        print("✅ Student promoted to ae_lstm.keras (teacher kept as ae_lstm_teacher.keras)")
+    return report
+
+if __name__ == "__main__":
+    run_distillation()
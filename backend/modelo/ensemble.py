@@ -1,4 +1,5 @@
 import numpy as np
+from config import OPERATE_WITH_AE_ONLY, ALPHA, BETA_F, PRECISION_TARGET
 from sklearn.metrics import (
     roc_auc_score, average_precision_score, precision_recall_curve
 )
@@ -51,3 +52,64 @@ def ensemble_scores(ae_norm: np.ndarray, if_norm: np.ndarray, alpha: float) -> n
 
 def metrics_auc(y_true: np.ndarray, scores: np.ndarray):
     return roc_auc_score(y_true, scores), average_precision_score(y_true, scores)
+
+def operate_threshold(operate_score: np.ndarray, y_true: np.ndarray,
+                      beta: float = BETA_F, min_precision: float = PRECISION_TARGET) -> float:
+    # Threshold = max(F-beta, min-precision)
+    _, thr_fbeta, _ = best_thr_fbeta(operate_score, y_true, beta=beta)
+    thr_prec = threshold_for_min_precision(operate_score, y_true, min_precision=min_precision)
+    return float(max(thr_fbeta, thr_prec))
+
+def calibrate_scores(err_tr, err_va, scores_if_tr, scores_if, y_valid_bin, yva_bin_aligned,
+                     lookback: int, horizon_shift: int):
+    """
+    Metrics, normalization constants and operating threshold from raw AE errors and
+    IForest scores. Shared by full and incremental training; returns (meta fields, operate_score).
+    """
+    ae_roc, ae_pr = metrics_auc(yva_bin_aligned, err_va)
+    thr_ae_p95 = float(np.quantile(err_tr, 0.95))
+    _, thr_ae_f2, _ = best_thr_fbeta(err_va, yva_bin_aligned, beta=2.0)
+
+    if_roc, if_pr = metrics_auc(y_valid_bin, scores_if)
+    thr_if_p95 = float(np.quantile(scores_if_tr, 0.95))
+    _, thr_if_f2, _ = best_thr_fbeta(scores_if, y_valid_bin, beta=2.0)
+
+    ae_lo, ae_hi = err_tr.min(), err_tr.max()
+    ae_norm = minmax_transform(err_va, ae_lo, ae_hi)
+
+    scores_if_aligned = scores_if[lookback-1:len(scores_if)-horizon_shift]
+    assert len(scores_if_aligned) == len(ae_norm) == len(yva_bin_aligned)
+    if_lo, if_hi = scores_if_tr.min(), scores_if_tr.max()
+    if_norm = minmax_transform(scores_if_aligned, if_lo, if_hi)
+
+    ens_score = ensemble_scores(ae_norm, if_norm, ALPHA)
+    ens_roc, ens_pr = metrics_auc(yva_bin_aligned, ens_score)
+    _, thr_ens_f2, _ = best_thr_fbeta(ens_score, yva_bin_aligned, beta=2.0)
+
+    # --- Operating policy (normalized scores) ---
+    operate_score = ae_norm if OPERATE_WITH_AE_ONLY else ens_score
+    operate_thr = operate_threshold(operate_score, yva_bin_aligned)
+
+    fields = {
+        "ae_thr_p95": float(thr_ae_p95),
+        "ae_thr_f2": float(thr_ae_f2),
+        "ae_roc_auc": float(ae_roc), "ae_pr_auc": float(ae_pr),
+
+        "if_thr_p95": float(thr_if_p95),
+        "if_thr_f2": float(thr_if_f2),
+        "if_roc_auc": float(if_roc), "if_pr_auc": float(if_pr),
+
+        "alpha": float(ALPHA),
+        "ens_thr_f2": float(thr_ens_f2),
+        "ens_roc_auc": float(ens_roc), "ens_pr_auc": float(ens_pr),
+
+        "ae_score_min": float(ae_lo), "ae_score_max": float(ae_hi),
+        "if_score_min": float(if_lo), "if_score_max": float(if_hi),
+
+        # Operating policy actually used
+        "operate_with_ae_only": bool(OPERATE_WITH_AE_ONLY),
+        "operate_thr": float(operate_thr),           # normalized [0,1]
+        "operate_f_beta": float(BETA_F),
+        "operate_precision_target": float(PRECISION_TARGET),
+    }
+    return fields, operate_score
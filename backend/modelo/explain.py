@@ -2,11 +2,35 @@ import numpy as np
 import pandas as pd
 from sklearn.tree import DecisionTreeClassifier
 
-def ae_feature_contribs(model, Xseq: np.ndarray, feature_names):
-    rec = model.predict(Xseq, verbose=0)
-    per_feat_mse = ((Xseq - rec) ** 2).mean(axis=1)  # time-avg per feature
+def ae_feature_contribs(model, Xseq: np.ndarray, feature_names, per_feat_mse: np.ndarray = None):
+    # Reuse per-feature errors from ae.recon_errors when available (no extra forward pass)
+    if per_feat_mse is None:
+        from ae import recon_errors
+        _, per_feat_mse, _ = recon_errors(model, Xseq)
     return pd.DataFrame(per_feat_mse, columns=feature_names)
 
+def top_k_features(per_feat_err: np.ndarray, feature_names, k: int):
+    """
+    Top-k contributing features per row of a (N, F) per-feature error matrix, via argpartition
+    (O(N*F)) + a sort of the k survivors. Returns one list of
+    {"feature", "error", "share"} dicts per row, largest first; share = error / row total.
+    """
+    E = np.asarray(per_feat_err, dtype=np.float64)
+    if k <= 0 or E.size == 0:
+        return [[] for _ in range(len(E))]
+    k = min(k, E.shape[1])
+    part = np.argpartition(-E, k - 1, axis=1)[:, :k]
+    vals = np.take_along_axis(E, part, axis=1)
+    order = np.argsort(-vals, axis=1)
+    idx = np.take_along_axis(part, order, axis=1)
+    vals = np.take_along_axis(vals, order, axis=1)
+    share = vals / np.maximum(E.sum(axis=1, keepdims=True), 1e-12)
+    names = np.asarray(feature_names, dtype=object)[idx]
+    return [
+        [{"feature": str(n), "error": float(v), "share": float(s)} for n, v, s in zip(nr, vr, sr)]
+        for nr, vr, sr in zip(names, vals, share)
+    ]
+
 def surrogate_tree(X_valid_aligned: pd.DataFrame, y_binary: np.ndarray, max_depth=3, random_state=42):
     clf = DecisionTreeClassifier(max_depth=max_depth, random_state=random_state)
     clf.fit(X_valid_aligned, y_binary)
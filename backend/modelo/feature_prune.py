@@ -0,0 +1,92 @@
+# Feature-pruning report: feature count vs validation AUC vs inference latency per corr threshold
+import json
+import time
+import numpy as np
+import pandas as pd
+
+from config import (
+    RANDOM_STATE, LOOKBACK, HORIZON_SHIFT, TARGET, PRUNE_REL_STD
+)
+from paths import RESULTS_DIR
+from data_load import load_gold_complete
+from prep import (
+    select_columns, prune_redundant, temporal_split, fit_impute_train_medians,
+    apply_impute, build_label_encoder, normal_class_id, scale_fit_transform_normal, scale_transform,
+    make_sequences
+)
+from iforest import fit_iforest, iforest_scores
+from ensemble import metrics_auc
+
+THRESHOLDS = (1.01, 0.995, 0.98, 0.95, 0.90)   # 1.01 = variance screen only
+
+def _latency_ms(fn, n_rep: int = 20) -> float:
+    fn()  # warm-up
+    ts = []
+    for _ in range(n_rep):
+        t0 = time.perf_counter(); fn(); ts.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(ts))
+
+def run_prune_report(thresholds=THRESHOLDS, ae_epochs: int = 0):
+    """
+    For each threshold: pruned width F, IForest validation ROC/PR-AUC, IForest and LSTM-AE
+    single-window latency (AE latency depends only on F, so an untrained model is timed).
+    ae_epochs > 0 also trains a short AE per threshold and reports its validation AUC.
+    """
+    from ae import build_lstm_ae, recon_errors
+
+    df = load_gold_complete()
+    X_cols = select_columns(df)
+    X_full = df[X_cols].replace([np.inf, -np.inf], np.nan)
+    y_full = df[TARGET].astype(str)
+    X_tr, X_va, y_tr, y_va = temporal_split(X_full, y_full, split_ratio=0.80)
+    medians = fit_impute_train_medians(X_tr)
+    X_tr, X_va = apply_impute(X_tr, medians), apply_impute(X_va, medians)
+    le = build_label_encoder(y_full)
+    y_tr_enc = le.transform(y_tr)
+    normal_id = normal_class_id(le, y_tr_enc)  # same rule as train.py
+    y_valid_bin = (le.transform(y_va) != normal_id).astype(int)
+    yva_aligned = y_valid_bin[LOOKBACK-1:len(y_valid_bin)-HORIZON_SHIFT]
+
+    rows, reports = [], {}
+    for thr in thresholds:
+        cols, rep = prune_redundant(X_tr, corr_thr=thr, rel_std_min=PRUNE_REL_STD)
+        Xtr_c, Xva_c = X_tr[cols], X_va[cols]
+        mask_normal = (y_tr_enc == normal_id)
+        if_model, if_scaler = fit_iforest(Xtr_c[mask_normal], random_state=RANDOM_STATE)
+        s_if = iforest_scores(if_model, if_scaler, Xva_c)
+        if_roc, if_pr = metrics_auc(y_valid_bin, s_if)
+        row_1 = Xva_c.iloc[:1]
+        row = {
+            "corr_thr": thr, "n_features": len(cols),
+            "if_roc_auc": float(if_roc), "if_pr_auc": float(if_pr),
+            "if_latency_ms": _latency_ms(lambda: iforest_scores(if_model, if_scaler, row_1)),
+        }
+        ae = build_lstm_ae(LOOKBACK, len(cols))
+        win = np.zeros((1, LOOKBACK, len(cols)), dtype=np.float32)
+        row["ae_latency_ms"] = _latency_ms(lambda: ae(win, training=False))
+        if ae_epochs > 0:
+            scaler_ae, X_tr_sc, _ = scale_fit_transform_normal(Xtr_c, y_tr_enc, normal_id)
+            Xtr_seq, _ = make_sequences(X_tr_sc, LOOKBACK, HORIZON_SHIFT)
+            Xva_seq, _ = make_sequences(scale_transform(scaler_ae, Xva_c), LOOKBACK, HORIZON_SHIFT)
+            ae = _short_ae(Xtr_seq, Xva_seq, ae_epochs)
+            err_va, _, _ = recon_errors(ae, Xva_seq)
+            row["ae_roc_auc"], row["ae_pr_auc"] = map(float, metrics_auc(yva_aligned, err_va))
+        rows.append(row)
+        print(f"[prune] thr={thr}: F={len(cols)} IF-AUC={if_roc:.4f} AE={row['ae_latency_ms']:.2f} ms")
+        reports[str(thr)] = rep
+
+    out = pd.DataFrame(rows)
+    out.to_csv(RESULTS_DIR / "feature_pruning_report.csv", index=False)
+    with open(RESULTS_DIR / "feature_pruning_clusters.json", "w", encoding="utf-8") as f:
+        json.dump(reports, f, ensure_ascii=False, indent=2)
+    print(out.to_string(index=False))
+    return out
+
+def _short_ae(Xtr_seq, Xva_seq, epochs: int):
+    from ae import build_lstm_ae
+    m = build_lstm_ae(Xtr_seq.shape[1], Xtr_seq.shape[2])
+    m.fit(Xtr_seq, Xtr_seq, validation_data=(Xva_seq, Xva_seq), epochs=epochs, batch_size=128, verbose=0)
+    return m
+
+if __name__ == "__main__":
+    run_prune_report()
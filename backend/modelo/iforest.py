@@ -15,3 +15,9 @@ def fit_iforest(X_train_normal: pd.DataFrame, random_state=42):
 def iforest_scores(model: IsolationForest, scaler: StandardScaler, X: pd.DataFrame) -> np.ndarray:
     X_sc = scaler.transform(X)
     return -model.score_samples(X_sc)  # higher = more anomalous
+
+def extend_iforest(model: IsolationForest, scaler: StandardScaler, X_recent_normal: pd.DataFrame, n_new: int):
+    # warm_start: existing trees are kept, only n_new trees are fit on the recent data
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + n_new)
+    model.fit(scaler.transform(X_recent_normal))
+    return model
@@ -0,0 +1,138 @@
+# Warm-start retraining on newly arrived Gold partitions (reuses saved artifacts)
+import json
+import numpy as np
+import pandas as pd
+import joblib
+import tensorflow as tf
+
+from config import (
+    RANDOM_STATE, LOOKBACK, HORIZON_SHIFT, TARGET,
+    FINETUNE_EPOCHS, REPLAY_RATIO, IF_EXTRA_TREES
+)
+from paths import ARTIFACTS_DIR
+from data_load import load_gold_matrix, read_feature_columns
+from prep import temporal_split, apply_impute, scale_transform, make_sequences
+from ae import finetune_ae, recon_errors
+from iforest import fit_iforest, extend_iforest, iforest_scores
+from ensemble import calibrate_scores
+from cascade import cascade_from_valid
+from train import lineage_entry, save_meta
+
+def load_current_artifacts():
+    ae_model = tf.keras.models.load_model(ARTIFACTS_DIR / "ae_lstm.keras")
+    with open(ARTIFACTS_DIR / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if_path = ARTIFACTS_DIR / "iforest.pkl"
+    return {
+        "ae": ae_model,
+        "meta": meta,
+        "feature_cols": read_feature_columns(ARTIFACTS_DIR / "feature_columns.csv"),
+        "medians": joblib.load(ARTIFACTS_DIR / "medians.pkl"),
+        "scaler_ae": joblib.load(ARTIFACTS_DIR / "scaler_ae.pkl"),
+        "scaler_if": joblib.load(ARTIFACTS_DIR / "scaler_if.pkl"),
+        "iforest": joblib.load(if_path) if if_path.exists() else None,
+        "label_encoder": joblib.load(ARTIFACTS_DIR / "label_encoder.pkl"),
+    }
+
+def run_incremental(prev_train_end: str | None = None, epochs: int = FINETUNE_EPOCHS):
+    """
+    Fine-tune the saved AE on windows newer than the previous train cut-off (plus a replay
+    sample of older windows), grow the IForest with trees fit on the recent NORMAL rows,
+    and recalibrate score ranges / thresholds on the current validation split.
+    Feature set, medians and scalers are kept fixed so scores stay comparable.
+    """
+    art = load_current_artifacts()
+    meta, X_cols = art["meta"], art["feature_cols"]
+    le, normal_id = art["label_encoder"], int(art["meta"]["normal_id"])
+
+    prev_train_end = prev_train_end or meta.get("train_end")
+    if prev_train_end is None:
+        raise ValueError("meta.json has no 'train_end'; run train.py once or pass prev_train_end.")
+    prev_train_end = pd.Timestamp(prev_train_end)
+
+    # 1) Load Gold with the saved feature order (projected scan, inf -> NaN). Scaling runs in
+    # float64 as in train.py: some near-constant columns have scale ~1e-8.
+    X, idx, y, _ = load_gold_matrix(columns=X_cols, target=TARGET)
+    X_full = pd.DataFrame(X.astype(np.float64), index=idx, columns=X_cols, copy=False)
+    y_full = pd.Series(y, index=idx)
+
+    # 2) Same 80/20 temporal split as the full run; saved medians only
+    X_tr, X_va, y_tr, y_va = temporal_split(X_full, y_full, split_ratio=0.80)
+    X_tr = apply_impute(X_tr, art["medians"])
+    X_va = apply_impute(X_va, art["medians"])
+    if X_tr.index.max() <= prev_train_end:
+        print(f"No new training rows after {prev_train_end}; artifacts unchanged.")
+        return meta
+
+    y_tr_enc = le.transform(y_tr)
+    y_valid_bin = (le.transform(y_va) != normal_id).astype(int)
+    mask_normal = (y_tr_enc == normal_id)
+    mask_new = np.asarray(X_tr.index > prev_train_end)
+
+    # 3) Sequences: every new window + a random replay sample of older ones
+    X_tr_sc = scale_transform(art["scaler_ae"], X_tr[mask_normal])
+    X_va_sc = scale_transform(art["scaler_ae"], X_va)
+    Xtr_seq, tr_idx = make_sequences(X_tr_sc, LOOKBACK, HORIZON_SHIFT)
+    Xva_seq, va_idx = make_sequences(X_va_sc, LOOKBACK, HORIZON_SHIFT)
+    yva_bin_aligned = y_valid_bin[LOOKBACK-1:len(y_valid_bin)-HORIZON_SHIFT]
+
+    new_pos = np.where(tr_idx > prev_train_end)[0]
+    old_pos = np.where(tr_idx <= prev_train_end)[0]
+    rng = np.random.default_rng(RANDOM_STATE)
+    n_replay = min(len(old_pos), int(round(REPLAY_RATIO * len(new_pos))))
+    replay_pos = rng.choice(old_pos, size=n_replay, replace=False) if n_replay > 0 else old_pos[:0]
+    Xft_seq = Xtr_seq[np.sort(np.concatenate([new_pos, replay_pos]))]
+    print(f"Fine-tuning on {len(new_pos)} new + {n_replay} replayed windows")
+
+    # 4) AE fine-tune + single evaluation pass. AE score range / p95 come from every
+    # train-normal window (as in train.py), not only the new + replayed ones it was tuned on
+    ae_model, hist = finetune_ae(art["ae"], Xft_seq, Xva_seq, epochs=epochs, verbose=1)
+    del Xft_seq
+    err_tr, _, _ = recon_errors(ae_model, Xtr_seq)
+    err_va, _, _ = recon_errors(ae_model, Xva_seq)
+    del Xtr_seq
+
+    # 5) IForest: add trees fit on recent NORMAL rows (fresh fit if no forest was saved)
+    X_new_normal = X_tr[mask_normal & mask_new]
+    if_extended = art["iforest"] is not None and len(X_new_normal) > 0
+    if if_extended:
+        if_model = extend_iforest(art["iforest"], art["scaler_if"], X_new_normal, IF_EXTRA_TREES)
+        if_scaler = art["scaler_if"]
+    else:
+        if_model, if_scaler = fit_iforest(X_tr[mask_normal], random_state=RANDOM_STATE)
+    # IF score range is recalibrated on the full train-normal set, as in train.py: the
+    # extended forest changes the scale for old rows too, not only for the recent ones
+    scores_if = iforest_scores(if_model, if_scaler, X_va)
+    scores_if_tr = iforest_scores(if_model, if_scaler, X_tr[mask_normal])
+
+    # 6) Recalibrate (score ranges, thresholds, metrics, cascade bounds) and record lineage
+    calib, operate_score = calibrate_scores(
+        err_tr, err_va, scores_if_tr, scores_if, y_valid_bin, yva_bin_aligned,
+        LOOKBACK, HORIZON_SHIFT
+    )
+    meta.update(calib)
+    meta.update(cascade_from_valid(X_va_sc.values, scores_if, operate_score > calib["operate_thr"], calib))
+    meta.update({
+        "train_end": X_tr.index.max().isoformat(),
+        "data_end": X_full.index.max().isoformat(),
+        "if_n_estimators": int(if_model.n_estimators),
+    })
+    meta.setdefault("lineage", []).append(lineage_entry(
+        "incremental", meta,
+        parent_train_end=prev_train_end.isoformat(),
+        epochs=len(hist["loss"]),
+        new_windows=int(len(new_pos)), replay_windows=int(n_replay),
+        if_trees_added=int(IF_EXTRA_TREES) if if_extended else None,
+    ))
+
+    # 7) Save (scalers, medians, encoder and feature order are unchanged; so is meta ae_arch,
+    # as the saved AE -- LSTM or promoted student -- is fine-tuned in place)
+    ae_model.save(ARTIFACTS_DIR / "ae_lstm.keras")
+    joblib.dump(if_model, ARTIFACTS_DIR / "iforest.pkl")
+    joblib.dump(if_scaler, ARTIFACTS_DIR / "scaler_if.pkl")
+    save_meta(meta)
+    print("\n✅ Incremental artifacts saved to:", ARTIFACTS_DIR)
+    return meta
+
+if __name__ == "__main__":
+    run_incremental()
@@ -8,12 +8,20 @@ import tensorflow as tf
 from paths import ARTIFACTS_DIR
 from config import LOOKBACK
 from ensemble import minmax_transform, smooth_alerts
+from data_load import read_feature_columns
+from explain import top_k_features
+from bundle import BUNDLE_NAME, LoadedBundle, bundle_is_current
+from cascade import prefilter_frame, clear_mask, load_prefilter_iforest
 
 def load_artifacts():
+    # Prefer the memory-mapped bundle (unless older than meta.json); else the individual files
+    if bundle_is_current(ARTIFACTS_DIR):
+        b = LoadedBundle(ARTIFACTS_DIR / BUNDLE_NAME)
+        return b.build_ae(), b.scaler_ae, b.feature_columns, b.meta, b.medians_series()
     medians = joblib.load(ARTIFACTS_DIR / "medians.pkl")
     ae = tf.keras.models.load_model(ARTIFACTS_DIR / "ae_lstm.keras")
     scaler_ae = joblib.load(ARTIFACTS_DIR / "scaler_ae.pkl")
-    feature_cols = pd.read_csv(ARTIFACTS_DIR / "feature_columns.csv", header=None)[0].tolist()
+    feature_cols = read_feature_columns(ARTIFACTS_DIR / "feature_columns.csv")
     with open(ARTIFACTS_DIR / "meta.json", "r", encoding="utf-8") as f:
         meta = json.load(f)
     return ae, scaler_ae, feature_cols, meta, medians
@@ -22,21 +30,41 @@ def make_sequence_from_window(df_window: pd.DataFrame, feature_cols: list[str]):
     X = df_window[feature_cols].astype(float)
     return X.values.astype(np.float32)  # shape (LOOKBACK, F)
 
+def ae_window_errors(ae, seq_batch: np.ndarray):
+    # seq_batch shape: (B, LOOKBACK, F) -> per-window (B,) and per-feature (B, F) MSE, one forward pass
+    rec = ae.predict(seq_batch, verbose=0)
+    per_feat = np.mean((seq_batch - rec)**2, axis=1)
+    return per_feat.mean(axis=1), per_feat
+
 def ae_score_from_window(ae, seq_batch: np.ndarray, ae_min: float, ae_max: float):
     # seq_batch shape: (1, LOOKBACK, F)
-    rec = ae.predict(seq_batch, verbose=0)
-    err = np.mean((seq_batch - rec)**2, axis=(1,2))  # shape (1,)
+    err, _ = ae_window_errors(ae, seq_batch)
     score = minmax_transform(err, ae_min, ae_max)    # normalized [0,1]
     return float(score[0])
 
-def infer_from_last_24h(df_last_24h: pd.DataFrame):
+def infer_from_last_24h(df_last_24h: pd.DataFrame, top_k: int = 0, cascade: bool = False):
+    # cascade=True: the stage-1 prefilter (cascade.py) may clear the window without an AE call
     ae, scaler_ae, feature_cols, meta, medians = load_artifacts()
     # scale with saved scaler
     X = df_last_24h[feature_cols].astype(float)
     X = X.replace([np.inf, -np.inf], np.nan).fillna(medians)  # << add this
     X_sc = scaler_ae.transform(X)
+    if cascade and len(X) >= LOOKBACK:
+        Xw, Xw_sc = X.iloc[-LOOKBACK:], np.asarray(X_sc)[-LOOKBACK:]
+        if_win, z_win = prefilter_frame(Xw, Xw_sc, meta, *load_prefilter_iforest())
+        if clear_mask(if_win, z_win, meta)[-1]:
+            out = {"score": 0.0, "pred": 0, "operate_thr": meta["operate_thr"], "cascade_cleared": True}
+            if top_k > 0:
+                out["top_features"] = []
+            return out
     seq = X_sc[-LOOKBACK:]  # ensure correct length
     seq = np.expand_dims(seq, 0)  # (1, L, F)
-    score = ae_score_from_window(ae, seq, meta["ae_score_min"], meta["ae_score_max"])
+    err, per_feat = ae_window_errors(ae, seq)
+    score = float(minmax_transform(err, meta["ae_score_min"], meta["ae_score_max"])[0])
     pred = int(score > meta["operate_thr"])
-    return {"score": score, "pred": pred, "operate_thr": meta["operate_thr"]}
+    out = {"score": score, "pred": pred, "operate_thr": meta["operate_thr"]}
+    if cascade:
+        out["cascade_cleared"] = False
+    if top_k > 0:
+        out["top_features"] = top_k_features(per_feat, feature_cols, top_k)[0]
+    return out
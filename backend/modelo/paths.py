@@ -16,11 +16,13 @@ RUTA_GOLD_COMPLETE = BASE_DIR / "data" / "capa_gold" / "features_transformador"
 ARTIFACTS_DIR = BASE_DIR / "backend" / "modelo" / "artifacts_anomalia"
 PLOTS_DIR     = ARTIFACTS_DIR / "plots"
 RESULTS_DIR   = BASE_DIR / "backend" / "modelo" / "artifacts_anomalia_results"
+RUNS_DIR      = RESULTS_DIR / "runs"   # per-run JSON logs / profiles
 print("Repo root:", BASE_DIR)
 print("Gold data path:", RUTA_GOLD_COMPLETE)
 print("Artifacts path:", ARTIFACTS_DIR)
 print("  - Plots path:", PLOTS_DIR)
 print("  - Results path:", RESULTS_DIR)
+print("  - Runs path:", RUNS_DIR)
 
-for d in (ARTIFACTS_DIR, PLOTS_DIR, RESULTS_DIR):
+for d in (ARTIFACTS_DIR, PLOTS_DIR, RESULTS_DIR, RUNS_DIR):
     d.mkdir(parents=True, exist_ok=True)
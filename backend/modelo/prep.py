@@ -1,4 +1,5 @@
 from typing import List, Tuple
+from collections import Counter
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler, LabelEncoder
@@ -17,6 +18,45 @@ def select_columns(df: pd.DataFrame) -> List[str]:
     cols = [c for c in cols if c not in high_nan]
     return cols
 
+def prune_redundant(X_train: pd.DataFrame, corr_thr: float = 0.98, rel_std_min: float = 1e-6):
+    """
+    Shrink input width F on TRAIN rows only:
+    1) variance screen: drop columns with std <= rel_std_min * (|mean| + 1) (numerically constant,
+       e.g. a ratio stuck at 0.9 with std 1e-8);
+    2) correlation clustering: |Pearson r| >= corr_thr links two columns; greedy in column order,
+       each unassigned column starts a cluster with every unassigned column linked to it and
+       the member with the highest mean |r| to the cluster is kept.
+    Returns (kept_columns, report).
+    """
+    Xv = X_train.to_numpy(dtype=np.float64)
+    mu, sd = Xv.mean(axis=0), Xv.std(axis=0)
+    low_var = sd <= rel_std_min * (np.abs(mu) + 1.0)
+    cols = [c for c, lv in zip(X_train.columns, low_var) if not lv]
+    Z = (Xv[:, ~low_var] - mu[~low_var]) / sd[~low_var]
+    R = np.abs(Z.T @ Z) / len(Z)          # |corr| matrix in one matmul
+    linked = R >= corr_thr
+
+    assigned = np.zeros(len(cols), dtype=bool)
+    kept, clusters = [], {}
+    for i in range(len(cols)):
+        if assigned[i]:
+            continue
+        cand = linked[i] & ~assigned
+        cand[i] = True
+        members = np.where(cand)[0]
+        assigned[members] = True
+        rep = members[np.argmax(R[np.ix_(members, members)].mean(axis=1))]
+        kept.append(cols[rep])
+        if len(members) > 1:
+            clusters[cols[rep]] = [cols[m] for m in members if m != rep]
+    kept = [c for c in cols if c in set(kept)]   # keep original order
+    report = {
+        "n_in": int(X_train.shape[1]), "n_out": len(kept), "corr_thr": float(corr_thr),
+        "dropped_low_variance": [c for c, lv in zip(X_train.columns, low_var) if lv],
+        "clusters": clusters,
+    }
+    return kept, report
+
 def temporal_split(X: pd.DataFrame, y: pd.Series, split_ratio=0.8):
     n = len(X); cut = int(n * split_ratio)
     return (X.iloc[:cut], X.iloc[cut:], y.iloc[:cut], y.iloc[cut:])
@@ -33,6 +73,12 @@ def build_label_encoder(y: pd.Series) -> LabelEncoder:
     le.fit(y.astype(str))
     return le
 
+def normal_class_id(le: LabelEncoder, y_train_enc) -> int:
+    # "NORMAL" when the encoder has it, else the most common train class
+    if "NORMAL" in le.classes_:
+        return int(np.where(le.classes_ == "NORMAL")[0][0])
+    return int(Counter(y_train_enc).most_common(1)[0][0])
+
 def scale_fit_transform_normal(X_train: pd.DataFrame, y_train_enc, normal_id: int):
     mask_normal = (y_train_enc == normal_id)
     scaler = StandardScaler()
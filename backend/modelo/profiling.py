@@ -0,0 +1,133 @@
+# Per-stage profiling for training runs (wall/CPU time, peak RSS, array sizes)
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource  # POSIX only
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def _rss_mb() -> float | None:
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss / 1024**2
+    return None
+
+def _peak_rss_mb() -> float | None:
+    # High-water mark of the whole process so far (monotonic across stages)
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024**2 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+    if psutil is not None:
+        mi = psutil.Process(os.getpid()).memory_info()
+        return getattr(mi, "peak_wset", mi.rss) / 1024**2  # peak_wset on Windows
+    return None
+
+def _describe(obj) -> dict:
+    if isinstance(obj, np.ndarray):
+        return {"shape": list(obj.shape), "dtype": str(obj.dtype), "mb": obj.nbytes / 1024**2}
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return {"shape": list(obj.shape), "mb": float(obj.memory_usage(deep=False).sum()) / 1024**2}
+    return {"type": type(obj).__name__}
+
+class StageProfiler:
+    """
+    Usage:
+        prof = StageProfiler(dump="cprofile", dump_dir=RUNS_DIR / f"profile_{run_stamp()}")
+        with prof.stage("load") as st:
+            df = load_gold_complete()
+            st.arrays(df=df)
+        meta["profile"] = prof.summary()
+    dump: None | "cprofile" | "pyinstrument" (per-stage profile written to dump_dir).
+    """
+
+    def __init__(self, dump: str | None = None, dump_dir: Path | None = None):
+        self.dump = dump
+        self.dump_dir = Path(dump_dir) if dump_dir else None
+        self.stages: list[dict] = []
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        if self.dump and self.dump_dir:
+            self.dump_dir.mkdir(parents=True, exist_ok=True)
+
+    class _Stage:
+        def __init__(self, rec: dict):
+            self.rec = rec
+
+        def arrays(self, **objs):
+            self.rec.setdefault("arrays", {}).update({k: _describe(v) for k, v in objs.items()})
+
+    def _start_dump(self):
+        if self.dump == "cprofile":
+            import cProfile
+            p = cProfile.Profile(); p.enable()
+            return p
+        if self.dump == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("pyinstrument not installed; stage dumps disabled")
+                self.dump = None
+                return None
+            p = Profiler(); p.start()
+            return p
+        return None
+
+    def _stop_dump(self, prof, name: str):
+        if prof is None or self.dump_dir is None:
+            return None
+        idx = len(self.stages)
+        if self.dump == "cprofile":
+            prof.disable()
+            path = self.dump_dir / f"{idx:02d}_{name}.prof"
+            prof.dump_stats(str(path))
+        else:
+            prof.stop()
+            path = self.dump_dir / f"{idx:02d}_{name}.html"
+            path.write_text(prof.output_html(), encoding="utf-8")
+        return str(path)
+
+    @contextmanager
+    def stage(self, name: str):
+        rec = {"stage": name, "rss_before_mb": _rss_mb()}
+        prof = self._start_dump()
+        w0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield self._Stage(rec)
+        finally:
+            rec["wall_s"] = round(time.perf_counter() - w0, 4)
+            rec["cpu_s"] = round(time.process_time() - c0, 4)
+            rec["rss_after_mb"] = _rss_mb()
+            rec["peak_rss_mb"] = _peak_rss_mb()
+            dump_path = self._stop_dump(prof, name)
+            if dump_path:
+                rec["profile_dump"] = dump_path
+            self.stages.append(rec)
+            print(f"[profile] {name}: wall={rec['wall_s']:.2f}s cpu={rec['cpu_s']:.2f}s peak_rss={rec['peak_rss_mb']} MB")
+
+    def summary(self) -> dict:
+        return {
+            "started_at": self.started_at,
+            "total_wall_s": round(sum(s["wall_s"] for s in self.stages), 4),
+            "total_cpu_s": round(sum(s["cpu_s"] for s in self.stages), 4),
+            "peak_rss_mb": max((s["peak_rss_mb"] or 0) for s in self.stages) if self.stages else None,
+            "stages": self.stages,
+        }
+
+    def write_run_log(self, path: Path, **extra) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**self.summary(), **extra}, f, ensure_ascii=False, indent=2, default=str)
+        return path
@@ -0,0 +1,168 @@
+# Out-of-core training input: Gold partitions -> impute/scale on the fly -> windows -> tf.data
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import joblib
+import tensorflow as tf
+from deltalake import DeltaTable
+
+from config import LOOKBACK, HORIZON_SHIFT, TARGET, EVAL_CHUNK, RANDOM_STATE, STREAM_SHUFFLE_BUFFER
+from paths import RUTA_GOLD_COMPLETE, ARTIFACTS_DIR
+from data_load import load_gold_matrix, read_feature_columns, to_utc
+
+def gold_months(path=RUTA_GOLD_COMPLETE) -> list[tuple[int, int]]:
+    """Sorted (year, month) partitions, read from the Delta log only."""
+    # pa.table() accepts both pyarrow and arro3 tables (newer deltalake releases)
+    acts = pa.table(DeltaTable(str(path)).get_add_actions(flatten=True)).to_pydict()
+    pairs = {(int(y), int(m)) for y, m in zip(acts["partition.year"], acts["partition.month"])}
+    return sorted(pairs)
+
+def iter_partitions(columns, start=None, end=None, path=RUTA_GOLD_COMPLETE):
+    """Yield (X float32, index, y) one monthly partition at a time, clipped to [start, end)."""
+    start, end = to_utc(start), to_utc(end)
+    for y, m in gold_months(path):
+        lo = pd.Timestamp(year=y, month=m, day=1, tz="UTC")
+        hi = lo + pd.offsets.MonthBegin(1)
+        if (end is not None and lo >= end) or (start is not None and hi <= start):
+            continue
+        lo = max(lo, start) if start is not None else lo
+        hi = min(hi, end) if end is not None else hi
+        X, idx, yv, _ = load_gold_matrix(start=lo, end=hi, columns=columns, target=TARGET, path=path)
+        if len(X):
+            yield X, idx, yv
+
+def iter_windows(columns, medians: pd.Series, scaler, start=None, end=None, normal_label: str | None = None,
+                 normal_only: bool = False, lookback: int = LOOKBACK, horizon_shift: int = HORIZON_SHIFT,
+                 batch_size: int = 128):
+    """
+    Yield (x (B, L, F) float32, y_bin (B,), end_ts (B,)) batches with the same windows as
+    prep.make_sequences on the concatenated history, but holding only one partition plus a
+    carry of (lookback-1+horizon_shift) rows in memory. Windows span partition boundaries.
+    normal_only drops non-NORMAL rows before windowing (as the AE train set does).
+    """
+    med = medians.reindex(columns).to_numpy(dtype=np.float64)
+    mu, sd = np.asarray(scaler.mean_, np.float64), np.asarray(scaler.scale_, np.float64)
+    F = len(columns)
+    keep = lookback - 1 + horizon_shift
+    carry_X = np.empty((0, F), dtype=np.float32)
+    carry_y = np.empty(0, dtype=np.int8)
+    carry_t = np.empty(0, dtype="datetime64[ns]")
+
+    for X, idx, yv in iter_partitions(columns, start, end):
+        ybin = (yv != normal_label).astype(np.int8) if normal_label is not None else np.zeros(len(X), np.int8)
+        if normal_only:
+            X, idx, ybin = X[ybin == 0], idx[ybin == 0], ybin[ybin == 0]
+        # Impute (saved medians) + scale (saved scaler). float64 for the arithmetic (some
+        # near-constant columns have scale ~1e-8), float32 once scaled; one partition at a time.
+        X = X.astype(np.float64)
+        nan = np.isnan(X)
+        X[nan] = np.broadcast_to(med, X.shape)[nan]
+        X = ((X - mu) / sd).astype(np.float32)
+
+        buf_X = np.concatenate([carry_X, X])
+        buf_y = np.concatenate([carry_y, ybin])
+        buf_t = np.concatenate([carry_t, idx.tz_convert(None).to_numpy()])
+        # Window ends already emitted from the carry are < len(carry) - horizon_shift
+        s = max(lookback - 1, len(carry_X) - horizon_shift)
+        e = len(buf_X) - horizon_shift
+        if e > s:
+            view = np.lib.stride_tricks.sliding_window_view(buf_X, lookback, axis=0)  # (n, F, L)
+            for b in range(s, e, batch_size):
+                ends = np.arange(b, min(b + batch_size, e))
+                xb = np.ascontiguousarray(view[ends - (lookback - 1)].transpose(0, 2, 1))
+                yield xb, buf_y[ends], buf_t[ends]
+        carry_X, carry_y, carry_t = buf_X[-keep:], buf_y[-keep:], buf_t[-keep:]
+
+def make_dataset(columns, medians, scaler, start=None, end=None, normal_label=None,
+                 normal_only=False, batch_size: int = 128, shuffle_buffer: int = 0) -> tf.data.Dataset:
+    """
+    tf.data source of (x, x) batches for ae.train_ae; re-reads partitions every epoch.
+    shuffle_buffer > 0 reshuffles windows each epoch through a bounded buffer of that many
+    windows (the array path shuffles every epoch too), so batches are not runs of
+    consecutive, highly correlated windows. Memory stays O(shuffle_buffer * L * F).
+    """
+    F = len(columns)
+    def gen():
+        for xb, _, _ in iter_windows(columns, medians, scaler, start, end, normal_label,
+                                     normal_only, batch_size=batch_size):
+            yield xb
+    spec = tf.TensorSpec(shape=(None, LOOKBACK, F), dtype=tf.float32)
+    ds = tf.data.Dataset.from_generator(gen, output_signature=spec)
+    if shuffle_buffer > 0:
+        ds = (ds.unbatch()
+                .shuffle(shuffle_buffer, seed=RANDOM_STATE, reshuffle_each_iteration=True)
+                .batch(batch_size))
+    return ds.map(lambda x: (x, x)).prefetch(2)
+
+def stream_recon_errors(model, columns, medians, scaler, start=None, end=None, normal_label=None,
+                        normal_only=False, zmax: bool = False):
+    """
+    Per-window AE error over a streamed span; only the (N,) outputs are kept. zmax=True also
+    returns the window max |z| (the cascade's stage-1 statistic) from the same pass.
+    """
+    errs, ys, ts, zs = [], [], [], []
+    for xb, yb, tb in iter_windows(columns, medians, scaler, start, end, normal_label,
+                                   normal_only, batch_size=EVAL_CHUNK):
+        rec = model.predict(xb, batch_size=128, verbose=0)
+        errs.append(((xb - rec) ** 2).mean(axis=(1, 2)))
+        ys.append(yb); ts.append(tb)
+        if zmax:
+            zs.append(np.abs(xb).max(axis=(1, 2)).astype(np.float64))
+    if not errs:
+        out = np.empty(0, np.float32), np.empty(0, np.int8), pd.DatetimeIndex([], tz="UTC")
+        return (*out, np.empty(0)) if zmax else out
+    out = np.concatenate(errs), np.concatenate(ys), pd.DatetimeIndex(np.concatenate(ts)).tz_localize("UTC")
+    return (*out, np.concatenate(zs)) if zmax else out
+
+def run_streaming_training(split_ts, start=None, end=None, batch_size: int = 128):
+    """
+    Train the AE from Gold without materializing history: train windows on [start, split_ts)
+    (NORMAL rows only), validation windows on [split_ts, end). Uses the saved medians/scaler
+    and feature order; recalibrates the AE score range, operating threshold and cascade bounds
+    in meta.json. The IForest is not retrained here, so the cascade uses the |z| bound only.
+    """
+    from ae import train_ae
+    from ensemble import metrics_auc, best_thr_fbeta, minmax_transform, operate_threshold
+    from cascade import cascade_from_valid
+    from config import OPERATE_WITH_AE_ONLY
+    from train import lineage_entry, save_meta
+
+    columns = read_feature_columns(ARTIFACTS_DIR / "feature_columns.csv")
+    medians = joblib.load(ARTIFACTS_DIR / "medians.pkl")
+    scaler = joblib.load(ARTIFACTS_DIR / "scaler_ae.pkl")
+    with open(ARTIFACTS_DIR / "meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    normal_label = meta["classes"][int(meta["normal_id"])]
+
+    tr_ds = make_dataset(columns, medians, scaler, start, split_ts, normal_label, True, batch_size,
+                         shuffle_buffer=STREAM_SHUFFLE_BUFFER)
+    va_ds = make_dataset(columns, medians, scaler, split_ts, end, normal_label, False, batch_size)
+    ae_model, hist = train_ae(tr_ds, va_ds, verbose=1)
+
+    err_tr, _, _ = stream_recon_errors(ae_model, columns, medians, scaler, start, split_ts, normal_label, True)
+    err_va, y_va, va_idx, z_va = stream_recon_errors(ae_model, columns, medians, scaler, split_ts, end,
+                                                     normal_label, zmax=True)
+
+    ae_roc, ae_pr = metrics_auc(y_va, err_va)
+    _, thr_ae_f2, _ = best_thr_fbeta(err_va, y_va, beta=2.0)
+    meta.update({
+        "ae_arch": "lstm",   # a fresh LSTM replaces any promoted student (bundle rebuilds this graph)
+        "ae_thr_p95": float(np.quantile(err_tr, 0.95)),
+        "ae_thr_f2": float(thr_ae_f2),
+        "ae_roc_auc": float(ae_roc), "ae_pr_auc": float(ae_pr),
+        "ae_score_min": float(err_tr.min()), "ae_score_max": float(err_tr.max()),
+        "train_end": to_utc(split_ts).isoformat(),
+        "data_end": va_idx.max().isoformat(),
+    })
+    if OPERATE_WITH_AE_ONLY:
+        ae_norm = minmax_transform(err_va, meta["ae_score_min"], meta["ae_score_max"])
+        meta["operate_thr"] = operate_threshold(ae_norm, y_va)
+    ae_pred = minmax_transform(err_va, meta["ae_score_min"], meta["ae_score_max"]) > meta["operate_thr"]
+    meta.update(cascade_from_valid(None, None, ae_pred, meta, z_win=z_va))
+    meta.setdefault("lineage", []).append(lineage_entry("stream", meta, epochs=len(hist["loss"])))
+
+    ae_model.save(ARTIFACTS_DIR / "ae_lstm.keras")
+    save_meta(meta)
+    print("\n✅ Streamed AE saved to:", ARTIFACTS_DIR)
+    return meta
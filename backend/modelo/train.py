@@ -5,33 +5,33 @@ import matplotlib
 matplotlib.use("Agg")
 
 import json
+from datetime import datetime, timezone
 from pathlib import Path
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import joblib
 
-from sklearn.metrics import classification_report, confusion_matrix, ConfusionMatrixDisplay, roc_auc_score, average_precision_score
+from sklearn.metrics import classification_report, confusion_matrix, ConfusionMatrixDisplay
 
 from config import (
     RANDOM_STATE, LOOKBACK, HORIZON_SHIFT,
-    OPERATE_WITH_AE_ONLY, ALPHA,
-    BETA_F, PRECISION_TARGET, SMOOTH_K, SMOOTH_M,
-    TARGET
+    SMOOTH_K, SMOOTH_M, TARGET, PROFILE_DUMP, WRITE_BUNDLE,
+    PRUNE_FEATURES, PRUNE_CORR_THR, PRUNE_REL_STD
 )
-from paths import ARTIFACTS_DIR, PLOTS_DIR, RESULTS_DIR
+from paths import ARTIFACTS_DIR, PLOTS_DIR, RESULTS_DIR, RUNS_DIR
+from profiling import StageProfiler
+from bundle import export_bundle
 from data_load import load_gold_complete
 from prep import (
-    select_columns, temporal_split, fit_impute_train_medians,
-    apply_impute, build_label_encoder, scale_fit_transform_normal,
+    select_columns, prune_redundant, temporal_split, fit_impute_train_medians,
+    apply_impute, build_label_encoder, normal_class_id, scale_fit_transform_normal,
     scale_transform, make_sequences
 )
-from ae import train_ae, recon_error
+from ae import train_ae, recon_errors
 from iforest import fit_iforest, iforest_scores
-from ensemble import (
-    minmax_transform, best_thr_fbeta, threshold_for_min_precision,
-    smooth_alerts, ensemble_scores, metrics_auc
-)
+from ensemble import smooth_alerts, calibrate_scores
+from cascade import cascade_from_valid
 from explain import ae_feature_contribs, surrogate_tree
 
 def save_show(path: Path):
@@ -39,159 +39,181 @@ def save_show(path: Path):
     plt.savefig(path, dpi=160)
     plt.close()
 
-def run_training():
+def lineage_entry(mode: str, meta: dict, **extra) -> dict:
+    """One entry of meta['lineage']: how and on which data span the artifacts were produced."""
+    return {
+        "mode": mode,
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "data_start": meta.get("data_start"),
+        "train_end": meta.get("train_end"),
+        "data_end": meta.get("data_end"),
+        "ae_roc_auc": meta.get("ae_roc_auc"),
+        "operate_thr": meta.get("operate_thr"),
+        **extra,
+    }
+
+def run_stamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+
+def save_meta(meta: dict):
+    with open(ARTIFACTS_DIR / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    # Horizon-tagged copy for comparisons
+    with open(RESULTS_DIR / f"meta_h{HORIZON_SHIFT}.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    # Single-file bundle mirrors the artifacts just written (meta is saved last by every run mode)
+    if WRITE_BUNDLE:
+        print("   Bundle:", export_bundle(ARTIFACTS_DIR))
+
+def run_training(profile_dump: str | None = PROFILE_DUMP):
+    prof = StageProfiler(dump=profile_dump, dump_dir=RUNS_DIR / f"profile_{run_stamp()}")
+
     # 1) Load Gold
-    df = load_gold_complete()
+    with prof.stage("load") as st:
+        df = load_gold_complete()
+        st.arrays(df=df)
 
     # 2) Column selection & full matrices
-    X_cols = select_columns(df)
-    # IMPORTANT: align with notebook — replace inf by NaN before imputing
-    X_full = df[X_cols].replace([np.inf, -np.inf], np.nan)
-    y_full = df[TARGET].astype(str)
+    with prof.stage("select") as st:
+        X_cols = select_columns(df)
+        # IMPORTANT: align with notebook — replace inf by NaN before imputing
+        X_full = df[X_cols].replace([np.inf, -np.inf], np.nan)
+        y_full = df[TARGET].astype(str)
+        st.arrays(X_full=X_full)
 
     # 3) Split (80/20) + impute (train medians only)
-    X_tr, X_va, y_tr, y_va = temporal_split(X_full, y_full, split_ratio=0.80)
-    medians = fit_impute_train_medians(X_tr)
-    X_tr = apply_impute(X_tr, medians)
-    X_va = apply_impute(X_va, medians)
+    with prof.stage("impute") as st:
+        X_tr, X_va, y_tr, y_va = temporal_split(X_full, y_full, split_ratio=0.80)
+        medians = fit_impute_train_medians(X_tr)
+        X_tr = apply_impute(X_tr, medians)
+        X_va = apply_impute(X_va, medians)
+        st.arrays(X_tr=X_tr, X_va=X_va)
+
+    # 3b) Optional redundant-feature pruning (train rows only)
+    prune_report = None
+    if PRUNE_FEATURES:
+        with prof.stage("prune") as st:
+            X_cols, prune_report = prune_redundant(X_tr, PRUNE_CORR_THR, PRUNE_REL_STD)
+            X_full, X_tr, X_va, medians = X_full[X_cols], X_tr[X_cols], X_va[X_cols], medians[X_cols]
+            print(f"Pruned features: {prune_report['n_in']} -> {prune_report['n_out']}")
+            st.arrays(X_tr=X_tr)
 
     # 4) Labels
-    le = build_label_encoder(y_full)
-    y_tr_enc = le.transform(y_tr)
-    y_va_enc = le.transform(y_va)
-    try:
-        normal_id = int(np.where(le.classes_ == "NORMAL")[0][0])
-    except Exception:
-        from collections import Counter
-        normal_id = Counter(y_tr_enc).most_common(1)[0][0]
-    y_valid_bin = (y_va_enc != normal_id).astype(int)
+    with prof.stage("label"):
+        le = build_label_encoder(y_full)
+        y_tr_enc = le.transform(y_tr)
+        y_va_enc = le.transform(y_va)
+        normal_id = normal_class_id(le, y_tr_enc)
+        y_valid_bin = (y_va_enc != normal_id).astype(int)
 
     # 5) AE scaling (fit on NORMAL only)
-    scaler_ae, X_tr_sc, mask_normal = scale_fit_transform_normal(X_tr, y_tr_enc, normal_id)
-    X_va_sc = scale_transform(scaler_ae, X_va)
+    with prof.stage("scale") as st:
+        scaler_ae, X_tr_sc, mask_normal = scale_fit_transform_normal(X_tr, y_tr_enc, normal_id)
+        X_va_sc = scale_transform(scaler_ae, X_va)
+        st.arrays(X_tr_sc=X_tr_sc, X_va_sc=X_va_sc)
 
     # 6) Sequences
-    Xtr_seq, tr_idx = make_sequences(X_tr_sc, LOOKBACK, HORIZON_SHIFT)
-    Xva_seq, va_idx = make_sequences(X_va_sc, LOOKBACK, HORIZON_SHIFT)
-    yva_bin_aligned = y_valid_bin[LOOKBACK-1:len(y_valid_bin)-HORIZON_SHIFT]
+    with prof.stage("sequences") as st:
+        Xtr_seq, tr_idx = make_sequences(X_tr_sc, LOOKBACK, HORIZON_SHIFT)
+        Xva_seq, va_idx = make_sequences(X_va_sc, LOOKBACK, HORIZON_SHIFT)
+        yva_bin_aligned = y_valid_bin[LOOKBACK-1:len(y_valid_bin)-HORIZON_SHIFT]
+        st.arrays(Xtr_seq=Xtr_seq, Xva_seq=Xva_seq)
 
     # 7) AE
-    ae_model, hist = train_ae(Xtr_seq, Xva_seq, verbose=1)
-    plt.figure(); plt.plot(hist["loss"], label="Train"); plt.plot(hist["val_loss"], label="Valid")
-    plt.title("AE-LSTM Training vs Validation Loss"); plt.legend()
-    save_show(PLOTS_DIR / "ae_training_loss.png")
+    with prof.stage("ae") as st:
+        ae_model, hist = train_ae(Xtr_seq, Xva_seq, verbose=1)
+        plt.figure(); plt.plot(hist["loss"], label="Train"); plt.plot(hist["val_loss"], label="Valid")
+        plt.title("AE-LSTM Training vs Validation Loss"); plt.legend()
+        save_show(PLOTS_DIR / "ae_training_loss.png")
 
-    err_tr = recon_error(ae_model, Xtr_seq)
-    err_va = recon_error(ae_model, Xva_seq)
-    ae_roc, ae_pr = roc_auc_score(yva_bin_aligned, err_va), average_precision_score(yva_bin_aligned, err_va)
-    thr_ae_p95 = float(np.quantile(err_tr, 0.95))
-    ae_f2, thr_ae_f2, _ = best_thr_fbeta(err_va, yva_bin_aligned, beta=2.0)
+        # One streamed pass per split; valid per-feature errors feed the explanations below
+        err_tr, _, _ = recon_errors(ae_model, Xtr_seq)
+        err_va, err_va_feat, _ = recon_errors(ae_model, Xva_seq)
+        st.arrays(err_va_feat=err_va_feat)
 
     # 8) Isolation Forest
-    if_model, if_scaler = fit_iforest(X_tr[mask_normal], random_state=RANDOM_STATE)
-    scores_if = iforest_scores(if_model, if_scaler, X_va)           # validation
-    scores_if_tr = iforest_scores(if_model, if_scaler, X_tr[mask_normal])  # train-normal
-
-    if_roc, if_pr = roc_auc_score(y_valid_bin, scores_if), average_precision_score(y_valid_bin, scores_if)
-    thr_if_p95 = float(np.quantile(scores_if_tr, 0.95))
-    if_f2, thr_if_f2, _ = best_thr_fbeta(scores_if, y_valid_bin, beta=2.0)
+    with prof.stage("iforest"):
+        if_model, if_scaler = fit_iforest(X_tr[mask_normal], random_state=RANDOM_STATE)
+        scores_if = iforest_scores(if_model, if_scaler, X_va)           # validation
+        scores_if_tr = iforest_scores(if_model, if_scaler, X_tr[mask_normal])  # train-normal
 
     # 9) Normalization, ensemble & operating policy
-    ae_lo, ae_hi = err_tr.min(), err_tr.max()
-    ae_norm = minmax_transform(err_va, ae_lo, ae_hi)
-
-    idx_start = LOOKBACK - 1
-    idx_end   = len(scores_if) - HORIZON_SHIFT
-    scores_if_aligned = scores_if[idx_start:idx_end]
-    assert len(scores_if_aligned) == len(ae_norm) == len(yva_bin_aligned)
-
-    if_lo, if_hi = scores_if_tr.min(), scores_if_tr.max()
-    if_norm = minmax_transform(scores_if_aligned, if_lo, if_hi)
-
-    ens_score = ensemble_scores(ae_norm, if_norm, ALPHA)
-    ens_roc, ens_pr = metrics_auc(yva_bin_aligned, ens_score)
-    ens_f2, thr_ens_f2, _ = best_thr_fbeta(ens_score, yva_bin_aligned, beta=2.0)
-
-    # --- Operating policy (normalized scores) ---
-    operate_score = ae_norm if OPERATE_WITH_AE_ONLY else ens_score
-    # Threshold = max(F-beta, min-precision)
-    _, thr_fbeta, _ = best_thr_fbeta(operate_score, yva_bin_aligned, beta=BETA_F)
-    thr_prec = threshold_for_min_precision(operate_score, yva_bin_aligned, min_precision=PRECISION_TARGET)
-    operate_thr = max(thr_fbeta, thr_prec)
-
-    yhat_operate = (operate_score > operate_thr).astype(int)
-    alert_operate = smooth_alerts(yhat_operate, k=SMOOTH_K, m=SMOOTH_M)
-
-    print("\n[Operative decision]")
-    print(classification_report(yva_bin_aligned, alert_operate, target_names=["NORMAL","NO-NORMAL"], digits=4, zero_division=0))
-    cm = confusion_matrix(yva_bin_aligned, alert_operate, labels=[0,1])
-    ConfusionMatrixDisplay(cm, display_labels=["NORMAL","NO-NORMAL"]).plot(cmap="PuBu")
-    plt.title("Operative decision + Smoothing")
-    save_show(PLOTS_DIR / "operative_smoothing_cm.png")
+    with prof.stage("ensemble"):
+        calib, operate_score = calibrate_scores(
+            err_tr, err_va, scores_if_tr, scores_if, y_valid_bin, yva_bin_aligned,
+            LOOKBACK, HORIZON_SHIFT
+        )
+        operate_thr = calib["operate_thr"]
+
+        yhat_operate = (operate_score > operate_thr).astype(int)
+        alert_operate = smooth_alerts(yhat_operate, k=SMOOTH_K, m=SMOOTH_M)
+
+        # Cascade prefilter bounds: never clear a window the operating policy flags (validation)
+        cascade_cal = cascade_from_valid(X_va_sc.values, scores_if, yhat_operate, calib)
+
+        print("\n[Operative decision]")
+        print(classification_report(yva_bin_aligned, alert_operate, target_names=["NORMAL","NO-NORMAL"], digits=4, zero_division=0))
+        cm = confusion_matrix(yva_bin_aligned, alert_operate, labels=[0,1])
+        ConfusionMatrixDisplay(cm, display_labels=["NORMAL","NO-NORMAL"]).plot(cmap="PuBu")
+        plt.title("Operative decision + Smoothing")
+        save_show(PLOTS_DIR / "operative_smoothing_cm.png")
 
     # 10) Explainability (optional plots)
-    contrib = ae_feature_contribs(ae_model, Xva_seq, X_cols)
-    # Surrogate tree on aligned validation rows
-    X_valid_aligned = X_va.iloc[LOOKBACK-1:LOOKBACK-1+len(alert_operate)]
-    sur_clf, sur_imp = surrogate_tree(X_valid_aligned, alert_operate)
-    plt.figure(); sur_imp.head(12)[::-1].plot(kind="barh")
-    plt.title("Surrogate – Importances")
-    save_show(PLOTS_DIR / "surrogate_importances.png")
+    with prof.stage("explain"):
+        contrib = ae_feature_contribs(ae_model, Xva_seq, X_cols, per_feat_mse=err_va_feat)
+        # Surrogate tree on aligned validation rows
+        X_valid_aligned = X_va.iloc[LOOKBACK-1:LOOKBACK-1+len(alert_operate)]
+        sur_clf, sur_imp = surrogate_tree(X_valid_aligned, alert_operate)
+        plt.figure(); sur_imp.head(12)[::-1].plot(kind="barh")
+        plt.title("Surrogate – Importances")
+        save_show(PLOTS_DIR / "surrogate_importances.png")
 
     # 11) Save artifacts
-    ae_model.save(ARTIFACTS_DIR / "ae_lstm.keras")
-    joblib.dump(if_model, ARTIFACTS_DIR / "iforest.pkl")
-    pd.Series(X_cols).to_csv(ARTIFACTS_DIR / "feature_columns.csv", index=False)
-    joblib.dump(scaler_ae, ARTIFACTS_DIR / "scaler_ae.pkl")
-    joblib.dump(if_scaler, ARTIFACTS_DIR / "scaler_if.pkl")
-    joblib.dump(le, ARTIFACTS_DIR / "label_encoder.pkl")
-
-    eval_df = pd.DataFrame({
-        "timestamp": va_idx,
-        "y_true": yva_bin_aligned,
-        "operate_score": operate_score,
-        "operate_pred_raw": yhat_operate,
-        "operate_pred_smooth": alert_operate,
-    }).set_index("timestamp")
-    eval_df.to_parquet(ARTIFACTS_DIR / "eval_valid_window.parquet")
-
-    meta = {
-        "lookback": LOOKBACK,
-        "horizon_shift": HORIZON_SHIFT,
-        "classes": le.classes_.tolist(),
-        "normal_id": int(normal_id),
-
-        "ae_thr_p95": float(thr_ae_p95),
-        "ae_thr_f2": float(thr_ae_f2),
-        "ae_roc_auc": float(ae_roc), "ae_pr_auc": float(ae_pr),
-
-        "if_thr_p95": float(thr_if_p95),
-        "if_thr_f2": float(thr_if_f2),
-        "if_roc_auc": float(if_roc), "if_pr_auc": float(if_pr),
-
-        "alpha": float(ALPHA),
-        "ens_thr_f2": float(thr_ens_f2),
-        "ens_roc_auc": float(ens_roc), "ens_pr_auc": float(ens_pr),
-
-        "ae_score_min": float(ae_lo), "ae_score_max": float(ae_hi),
-        "if_score_min": float(if_lo), "if_score_max": float(if_hi),
-
-        # Operating policy actually used
-        "operate_with_ae_only": bool(OPERATE_WITH_AE_ONLY),
-        "operate_thr": float(operate_thr),           # normalized [0,1]
-        "operate_f_beta": float(BETA_F),
-        "operate_precision_target": float(PRECISION_TARGET),
-        "smoothing_k": int(SMOOTH_K), "smoothing_m": int(SMOOTH_M)
-    }
-    with open(ARTIFACTS_DIR / "meta.json", "w", encoding="utf-8") as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
-
-    # Horizon-tagged copy for comparisons
-    with open(RESULTS_DIR / f"meta_h{HORIZON_SHIFT}.json", "w", encoding="utf-8") as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
-
+    with prof.stage("save"):
+        ae_model.save(ARTIFACTS_DIR / "ae_lstm.keras")
+        joblib.dump(if_model, ARTIFACTS_DIR / "iforest.pkl")
+        pd.Series(X_cols).to_csv(ARTIFACTS_DIR / "feature_columns.csv", index=False, header=False)
+        joblib.dump(scaler_ae, ARTIFACTS_DIR / "scaler_ae.pkl")
+        joblib.dump(if_scaler, ARTIFACTS_DIR / "scaler_if.pkl")
+        joblib.dump(le, ARTIFACTS_DIR / "label_encoder.pkl")
+        joblib.dump(medians, ARTIFACTS_DIR / "medians.pkl")
+
+        eval_df = pd.DataFrame({
+            "timestamp": va_idx,
+            "y_true": yva_bin_aligned,
+            "operate_score": operate_score,
+            "operate_pred_raw": yhat_operate,
+            "operate_pred_smooth": alert_operate,
+        }).set_index("timestamp")
+        eval_df.to_parquet(ARTIFACTS_DIR / "eval_valid_window.parquet")
+
+        meta = {
+            "lookback": LOOKBACK,
+            "horizon_shift": HORIZON_SHIFT,
+            "classes": le.classes_.tolist(),
+            "normal_id": int(normal_id),
+            "ae_arch": "lstm",
+            **calib,
+            **cascade_cal,
+            "feature_pruning": prune_report,
+            "smoothing_k": int(SMOOTH_K), "smoothing_m": int(SMOOTH_M),
+
+            # Data span (used by incremental.py to find newly arrived partitions)
+            "data_start": X_full.index.min().isoformat(),
+            "train_end": X_tr.index.max().isoformat(),
+            "data_end": X_full.index.max().isoformat(),
+            "if_n_estimators": int(if_model.n_estimators),
+        }
+        meta["lineage"] = [lineage_entry("full", meta, epochs=len(hist["loss"]))]
+
+    # Profile covers every stage above (including "save"), so meta is written last
+    meta["profile"] = prof.summary()
+    save_meta(meta)
+    log_path = prof.write_run_log(RUNS_DIR / f"train_{run_stamp()}.json", mode="full")
     print("\n✅ Artifacts saved to:", ARTIFACTS_DIR)
-    joblib.dump(medians, ARTIFACTS_DIR / "medians.pkl")
+    print("   Run log:", log_path)
     return meta
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+# etl/bronze/benchmark.py
+"""
+Bronze throughput benchmark against the local PI Web API simulator (mock_pi_server).
+
+Starts the simulator in-process, runs a full `main_bronze.py` in a subprocess pointed at it
+(PI_BASE_URL) and at a scratch Delta table (BRONZE_TABLE), then reports wall time,
+points/second, HTTP requests and bytes per endpoint. No production server or NTLM
+credentials are needed, and the synthetic history is deterministic, so numbers from
+different commits are comparable (append them with --salida to track regressions).
+
+Usage:
+  python benchmark_bronze.py --backend streamset --dias 30 --periodo 60
+  python benchmark_bronze.py --backend stream --workers 8 --tags 20 --latencia-ms 25 --salida bench.jsonl
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from deltalake import DeltaTable
+from config_bronze import (
+    TAGS, START_TIME, TAG_WORKERS, EXTRACT_BACKEND, BRONZE_WRITE_MODE, BRONZE_SCHEMA_V2, BRONZE_STATE_TAGS,
+    BRONZE_RLE_TAGS,
+)
+from mock_pi_server import iniciar_en_hilo
+
+MAIN_BRONZE = Path(__file__).resolve().parent / "main_bronze.py"
+
+
+def ejecutar_benchmark(backend: str = EXTRACT_BACKEND, workers: int = TAG_WORKERS, n_tags: int | None = None,
+                       dias: float = 7, periodo: float = 60.0, latencia_ms: float = 0.0,
+                       frac_bool: float = 0.02, frac_texto: float = 0.02, frac_error: float = 0.01,
+                       max_rps: float = 0, verbose: bool = False) -> dict:
+    """One full main_bronze run over `dias` of synthetic history; returns the report dict."""
+    # BRONZE_STATE_TAGS are simulated as digital states (mock tags are the last part of the path)
+    estados = {TAGS[a] for a in BRONZE_STATE_TAGS}
+    httpd, sim, base_url = iniciar_en_hilo(periodo=periodo, latencia=latencia_ms / 1000.0, frac_bool=frac_bool,
+                                           frac_texto=frac_texto, frac_error=frac_error, estados=estados)
+    tmp = Path(tempfile.mkdtemp(prefix="bronze_bench_"))
+    tags = list(TAGS)[:n_tags] if n_tags else list(TAGS)
+    fin = pd.Timestamp(START_TIME) + pd.Timedelta(days=dias)
+    env = dict(os.environ, PI_BASE_URL=base_url, BRONZE_TABLE=str(tmp / "readings"),
+               BRONZE_START_TIME=START_TIME, BRONZE_END_TIME=fin.strftime("%Y-%m-%dT%H:%M:%SZ"),
+               PI_MAX_RPS=str(max_rps))
+    cmd = [sys.executable, str(MAIN_BRONZE), "--backend", backend, "--workers", str(workers), "--tags", *tags]
+    try:
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, env=env, cwd=MAIN_BRONZE.parent,
+                              stdout=None if verbose else subprocess.DEVNULL,
+                              stderr=None if verbose else subprocess.DEVNULL)
+        pared = time.perf_counter() - t0
+        dt = DeltaTable(str(tmp / "readings"))
+        acts = pa.table(dt.get_add_actions(flatten=True))
+        filas = sum(acts["num_records"].to_pylist())
+        puntos = filas
+        if "rle_n" in [f.name for f in dt.schema().fields]:  # schema v2: a run-length row holds rle_n points
+            puntos = pc.sum(pc.fill_null(dt.to_pyarrow_table(columns=["rle_n"])["rle_n"], 1)).as_py()
+        mb_delta = sum(acts["size_bytes"].to_pylist()) / 1e6
+        with sim.lock:
+            stats = json.loads(json.dumps(sim.stats))
+    finally:
+        httpd.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    peticiones = sum(s["requests"] for s in stats.values())
+    n_bytes = sum(s["bytes"] for s in stats.values())
+    return {
+        "backend": backend, "workers": workers, "tags": len(tags), "dias": dias, "periodo_s": periodo,
+        "latencia_ms": latencia_ms, "modo_escritura": BRONZE_WRITE_MODE, "esquema_v2": BRONZE_SCHEMA_V2,
+        "rle_tags": len(BRONZE_RLE_TAGS),
+        "codigo_salida": proc.returncode,
+        "segundos": round(pared, 2),
+        "puntos": puntos,
+        "puntos_por_s": round(puntos / pared, 1),
+        "peticiones": peticiones,
+        "mb_recibidos": round(n_bytes / 1e6, 2),
+        "bytes_por_punto": round(n_bytes / max(puntos, 1), 1),
+        "filas_delta": filas,
+        "mb_delta": round(mb_delta, 2),
+        "archivos_delta": acts.num_rows,
+        "commits_delta": dt.version() + 1,
+        "por_endpoint": stats,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de Bronze contra el simulador PI local")
+    parser.add_argument("--backend", choices=["stream", "streamset", "pipeline"], default=EXTRACT_BACKEND)
+    parser.add_argument("--workers", type=int, default=TAG_WORKERS)
+    parser.add_argument("--tags", type=int, default=None, help="usar solo los primeros N tags de TAGS")
+    parser.add_argument("--dias", type=float, default=7, help="historia extraida desde START_TIME")
+    parser.add_argument("--periodo", type=float, default=60.0, help="segundos entre puntos por tag")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="retardo por peticion HTTP")
+    parser.add_argument("--frac-bool", type=float, default=0.02)
+    parser.add_argument("--frac-texto", type=float, default=0.02)
+    parser.add_argument("--frac-error", type=float, default=0.01)
+    parser.add_argument("--max-rps", type=float, default=0, help="limite de peticiones/s (0 = sin limite)")
+    parser.add_argument("--salida", help="agregar el reporte como linea JSON a este archivo")
+    parser.add_argument("--verbose", action="store_true", help="mostrar la salida de main_bronze")
+    args = parser.parse_args()
+
+    reporte = ejecutar_benchmark(args.backend, args.workers, args.tags, args.dias, args.periodo, args.latencia_ms,
+                                 args.frac_bool, args.frac_texto, args.frac_error, args.max_rps, args.verbose)
+    print(json.dumps(reporte, indent=2, ensure_ascii=False))
+    if args.salida:
+        with open(args.salida, "a", encoding="utf-8") as f:
+            f.write(json.dumps(reporte, ensure_ascii=False) + "\n")
@@ -0,0 +1,142 @@
+# etl/bronze/cache_webid.py
+"""
+Persistent tag path -> WebID cache (JSON next to the Bronze table).
+
+PI WebIDs for TR1.* points practically never change, so incremental runs resolve them
+from disk instead of one /points round trip per tag. Entries expire after
+WEBID_CACHE_TTL_DIAS; an entry is dropped when a request with its WebID returns 404
+(point deleted/renamed) and the tag is resolved again once.
+
+Entries are kept per PI Web API base URL (BASE_URL, which PI_BASE_URL overrides), so a run
+against mock_pi_server never serves its WebIDs to a run against the production server.
+"""
+import os
+import json
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+import requests
+from logger_bronze import logger
+from config_bronze import TAGS, WEBID_CACHE_PATH, WEBID_CACHE_TTL_DIAS
+from extract_bronze import obtener_webid, obtener_webids_batch, BASE_URL
+
+
+class CacheWebID:
+    def __init__(self, ruta, ttl_dias: float, base_url: str = BASE_URL):
+        self.ruta = ruta
+        self.ttl = timedelta(days=ttl_dias)
+        self.base_url = base_url
+        self.lock = threading.Lock()
+        self.entradas = self._leer()
+
+    def _leer_archivo(self) -> dict:
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        # {"servidores": {base_url: {tag_path: entry}}}; older single-server files are dropped,
+        # they were keyed on PI_SERVER even when the requests went to PI_BASE_URL
+        return data.get("servidores", {})
+
+    def _leer(self) -> dict:
+        return self._leer_archivo().get(self.base_url, {})
+
+    def _persistir(self) -> None:
+        # Re-read so entries of other base URLs (e.g. mock vs production) are kept as they are
+        servidores = self._leer_archivo()
+        servidores[self.base_url] = self.entradas
+        tmp = f"{self.ruta}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"servidores": servidores}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.ruta)  # atomic: concurrent readers never see a partial file
+
+    def obtener(self, tag_path: str):
+        """Cached WebID, or None if missing/expired."""
+        with self.lock:
+            e = self.entradas.get(tag_path)
+        if e is None:
+            return None
+        if datetime.now(timezone.utc) - datetime.fromisoformat(e["resuelto"]) > self.ttl:
+            return None
+        return e["webid"]
+
+    def guardar(self, webids: dict) -> None:
+        ahora = datetime.now(timezone.utc).isoformat()
+        with self.lock:
+            for tag_path, webid in webids.items():
+                self.entradas[tag_path] = {"webid": webid, "resuelto": ahora}
+            self._persistir()
+
+    def invalidar(self, tag_paths) -> None:
+        with self.lock:
+            for p in tag_paths:
+                self.entradas.pop(p, None)
+            self._persistir()
+
+
+cache_webid = CacheWebID(WEBID_CACHE_PATH, WEBID_CACHE_TTL_DIAS)
+
+
+def resolver_webid(tag_path: str, forzar: bool = False) -> str:
+    webid = None if forzar else cache_webid.obtener(tag_path)
+    if webid is None:
+        webid = obtener_webid(tag_path)
+        cache_webid.guardar({tag_path: webid})
+    return webid
+
+
+def resolver_webids(tag_paths: list, forzar: bool = False) -> dict:
+    """Many tags at once: cached ones from disk, the rest through a single /batch lookup."""
+    webids = {} if forzar else {p: cache_webid.obtener(p) for p in tag_paths}
+    webids = {p: w for p, w in webids.items() if w is not None}
+    faltan = [p for p in tag_paths if p not in webids]
+    if faltan:
+        nuevos = obtener_webids_batch(faltan)
+        cache_webid.guardar(nuevos)
+        webids.update(nuevos)
+        logger.info(f"WebIDs: {len(tag_paths) - len(faltan)} desde cache, {len(nuevos)}/{len(faltan)} resueltos")
+    return webids
+
+
+def es_404(e: Exception) -> bool:
+    return isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code == 404
+
+
+def con_webid(tag_path: str, fn):
+    """fn(webid); on 404 the cached WebID is dropped, re-resolved and fn retried once."""
+    try:
+        return fn(resolver_webid(tag_path))
+    except Exception as e:
+        if not es_404(e):
+            raise
+        logger.info(f"WebID de {tag_path} devolvio 404; re-resolviendo")
+        cache_webid.invalidar([tag_path])
+        return fn(resolver_webid(tag_path, forzar=True))
+
+
+def con_webid_paginas(tag_path: str, fn):
+    """Generator form of con_webid: the 404 retry only applies before the first page is yielded."""
+    emitidas = False
+    try:
+        for pagina in fn(resolver_webid(tag_path)):
+            emitidas = True
+            yield pagina
+    except Exception as e:
+        if emitidas or not es_404(e):
+            raise
+        logger.info(f"WebID de {tag_path} devolvio 404; re-resolviendo")
+        cache_webid.invalidar([tag_path])
+        yield from fn(resolver_webid(tag_path, forzar=True))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache de WebIDs PI (Bronze)")
+    parser.add_argument("--refrescar", action="store_true", help="re-resolver todos los TAGS en batch")
+    parser.add_argument("--limpiar", action="store_true", help="vaciar la cache")
+    args = parser.parse_args()
+    if args.limpiar:
+        cache_webid.invalidar(list(cache_webid.entradas))
+    if args.refrescar:
+        w = resolver_webids(list(TAGS.values()), forzar=True)
+        print(f"{len(w)}/{len(TAGS)} WebIDs refrescados en {WEBID_CACHE_PATH}")
@@ -0,0 +1,153 @@
+# etl/bronze/colector.py
+"""
+Continuous (near-real-time) Bronze collector.
+
+Every COLLECTOR_POLL_SECONDS all tags are polled for recorded values newer than their
+watermark, up to "now", through the streamset backend (one request per 50 tags) and
+committed as small appends. Each tag starts at max(watermark + 1us (main_bronze.inicio_tag),
+last polled end - COLLECTOR_OVERLAP_SECONDS), so tags that rarely change do not drag the
+whole group back to their old watermark, while values PI records a little late are still
+picked up.
+
+Per-tag lag is published every cycle to COLLECTOR_STATUS_PATH (and GET /status if a port is set):
+  atraso_s          now - newest PI timestamp visible in Bronze (includes the tag's own update rate)
+  visibilidad_s     commit time - newest PI timestamp committed in the last cycle (collector latency)
+Small appends fragment the table: schedule mantenimiento_bronze periodically.
+
+Usage:
+  python colector_bronze.py [--intervalo 15] [--puerto 8766] [--tags ...]
+"""
+import os
+import json
+import time
+import signal
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pandas as pd
+from logger_bronze import logger
+from config_bronze import (
+    TAGS, COLLECTOR_POLL_SECONDS, COLLECTOR_OVERLAP_SECONDS, COLLECTOR_STATUS_PORT, COLLECTOR_STATUS_PATH
+)
+from storage_bronze import leer_ultimo_timestamp
+from main_bronze import extraer_streamset, inicio_tag
+
+
+class Colector:
+    def __init__(self, tags: dict, intervalo: float = COLLECTOR_POLL_SECONDS,
+                 solape: float = COLLECTOR_OVERLAP_SECONDS, ruta_estado=COLLECTOR_STATUS_PATH):
+        self.tags = tags
+        self.intervalo = float(intervalo)
+        self.solape = pd.Timedelta(seconds=solape)
+        self.ruta_estado = ruta_estado
+        self.consultado = {}           # tag -> end of the last successful poll
+        self.estado = {"ciclos": 0, "tags": {}}
+        self.lock = threading.Lock()
+        self.parar = threading.Event()
+
+    def _inicios(self) -> dict:
+        out = {}
+        for a in self.tags:
+            if a in self.consultado:
+                out[a] = max(inicio_tag(a), self.consultado[a] - self.solape)
+        return out
+
+    def ciclo(self) -> dict:
+        t0 = time.perf_counter()
+        ahora = pd.Timestamp.now(tz="UTC")
+        resultados = extraer_streamset(self.tags, fin=ahora.isoformat(), inicios=self._inicios(), resumen=False)
+        commit = pd.Timestamp.now(tz="UTC")
+
+        tags_estado = {}
+        for r in resultados:
+            a = r["tag"]
+            if r["estado"] != "error":
+                self.consultado[a] = ahora
+            marca = leer_ultimo_timestamp(a)
+            previo = self.estado["tags"].get(a, {})
+            tags_estado[a] = {
+                "estado": r["estado"],
+                "filas_ciclo": r["filas"],
+                "marca_agua": marca.isoformat() if marca is not None else None,
+                "atraso_s": round((commit - marca).total_seconds(), 1) if marca is not None else None,
+                "visibilidad_s": (round((commit - r["marca_agua"]).total_seconds(), 1)
+                                  if r.get("marca_agua") is not None else previo.get("visibilidad_s")),
+                "consultado_hasta": self.consultado[a].isoformat() if a in self.consultado else None,
+                "error": r["error"],
+            }
+        dur = time.perf_counter() - t0
+        with self.lock:
+            self.estado = {
+                "ciclos": self.estado["ciclos"] + 1,
+                "ultimo_ciclo": commit.isoformat(),
+                "duracion_ciclo_s": round(dur, 2),
+                "filas_ciclo": sum(r["filas"] for r in resultados),
+                "errores": sum(r["estado"] == "error" for r in resultados),
+                "tags": tags_estado,
+            }
+            self._publicar()
+        vis = [t["visibilidad_s"] for t in tags_estado.values() if t["visibilidad_s"] is not None]
+        logger.info(f"Ciclo {self.estado['ciclos']}: {self.estado['filas_ciclo']} filas en {dur:.1f} s, "
+                    f"errores={self.estado['errores']}, visibilidad max={max(vis) if vis else None} s")
+        return self.estado
+
+    def _publicar(self) -> None:
+        tmp = f"{self.ruta_estado}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.estado, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.ruta_estado)
+
+    def ejecutar(self, max_ciclos: int | None = None) -> None:
+        logger.info(f"Colector continuo: {len(self.tags)} tags cada {self.intervalo:.0f} s")
+        n = 0
+        while not self.parar.is_set():
+            t0 = time.monotonic()
+            try:
+                self.ciclo()
+            except Exception as e:  # keep polling; the next cycle resumes from the watermarks
+                logger.error(f"[ERROR] ciclo del colector: {e}")
+            n += 1
+            if max_ciclos is not None and n >= max_ciclos:
+                break
+            self.parar.wait(max(0.0, self.intervalo - (time.monotonic() - t0)))
+        logger.info("Colector detenido")
+
+    def servir_estado(self, puerto: int) -> ThreadingHTTPServer:
+        colector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/status":
+                    self.send_error(404)
+                    return
+                with colector.lock:
+                    body = json.dumps(colector.estado, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        httpd = ThreadingHTTPServer(("0.0.0.0", puerto), Handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        logger.info(f"Estado del colector en http://0.0.0.0:{puerto}/status")
+        return httpd
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Colector Bronze continuo (PI Web API -> Delta)")
+    parser.add_argument("--tags", nargs="*", help="subconjunto de alias de TAGS")
+    parser.add_argument("--intervalo", type=float, default=COLLECTOR_POLL_SECONDS)
+    parser.add_argument("--puerto", type=int, default=COLLECTOR_STATUS_PORT)
+    args = parser.parse_args()
+
+    tags = {k: v for k, v in TAGS.items() if not args.tags or k in args.tags}
+    colector = Colector(tags, intervalo=args.intervalo)
+    if args.puerto:
+        colector.servir_estado(args.puerto)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: colector.parar.set())
+    colector.ejecutar()
@@ -104,14 +104,90 @@ TAGS = {
 
 
 # Historical window (can be overridden by incremental resume)
-START_TIME = "2024-09-10T00:00:00Z"
-END_TIME = "2025-08-28T00:00:00Z" # or "now" if implement streaming later
+START_TIME = os.getenv("BRONZE_START_TIME", "2024-09-10T00:00:00Z")
+END_TIME = os.getenv("BRONZE_END_TIME", "2025-08-28T00:00:00Z") # or "now" (current UTC time); colector_bronze polls continuously
 
+# Concurrent extraction: tag workers and a global request budget shared by all of them
+TAG_WORKERS = int(os.getenv("BRONZE_TAG_WORKERS", "4"))
+PI_MAX_RPS  = float(os.getenv("PI_MAX_RPS", "10"))  # requests/second to PI Web API (<=0 disables)
+
+# Time windows of one tag: history is split in WINDOW_DAYS ranges, WINDOW_WORKERS fetched at once per tag.
+# 1 (default) streams the ranges in order with one PI page in memory (BufferBronze bound). N > 1 buys
+# throughput on long backfills at the cost of up to N whole ranges per tag held in memory at once.
+WINDOW_DAYS    = 15
+WINDOW_WORKERS = int(os.getenv("BRONZE_WINDOW_WORKERS", "1"))
+
+# Streaming writes: commit a tag's pending rows every N rows (0 = after every PI page)
+BRONZE_FLUSH_ROWS = 250_000
+# "merge" = insert only rows whose (tag, timestamp) is new (idempotent); "append" = blind append
+BRONZE_WRITE_MODE = os.getenv("BRONZE_WRITE_MODE", "merge")
+
+# Bronze schema v2 ("0" keeps writing v1 rows; both can coexist in the table, bronze_silver reads either):
+#   - value_text only for non-numeric values (numbers and bools are rebuilt from value/value_bool)
+#   - opt-in run-length tags (BRONZE_RLE_TAGS, default none) store change-only rows: first point of
+#     each run of equal values at a constant spacing, plus rle_n (points in the run) and rle_hasta
+#     (timestamp of its last point). A run is cut whenever the value OR the gap between points
+#     changes, so every stored timestamp is rebuilt exactly (irregular, by-exception states too).
+BRONZE_SCHEMA_V2 = os.getenv("BRONZE_SCHEMA_V2", "1") == "1"
+# Digital-state tags (candidates for run-length; also simulated as states by benchmark_bronze)
+BRONZE_STATE_TAGS = {
+    "tap_position",
+    "buchholz_desconectado", "cambio_capacitancia", "verificar_conexion_sensor_gas", "verificar_conexion_profibus",
+    "nivel_aceite_tanque_principal_max", "nivel_aceite_tanque_principal_min",
+    "monitores_falla_fuente_alimentacion", "falla_fuente_alimentacion_vdc",
+    "cambio_capacitancia_fase_1", "cambio_capacitancia_fase_2", "cambio_capacitancia_fase_3",
+    "emergencia_enfriamiento_fallido", "emergencia_enfriamiento_sobre_carga",
+    "ruptura_membrana_relay", "flujo_aceite_relay_OLTC", "valvula_alivio_presion", "valvula_alivio_presion_OLTC",
+    "motor_cortacircuito_OLTC_ON", "motor_OLTC_en_operacion", "switch_S21_local", "switch_S22_remote",
+    "system_condition", "nivel_aceite_OLTC_max", "nivel_aceite_OLTC_min",
+    "ventilador_1", "ventilador_2", "ventilador_1_mcb", "ventilador_2_mcb",
+    *(f"ventilador_{i}_mcb" for i in range(3, 15)),
+}
+# BRONZE_RLE_TAGS env: "" (default, no run-length), "estados" (all BRONZE_STATE_TAGS) or alias,alias,...
+_rle_env = os.getenv("BRONZE_RLE_TAGS", "").strip()
+BRONZE_RLE_TAGS = (set(BRONZE_STATE_TAGS) if _rle_env == "estados"
+                   else {a.strip() for a in _rle_env.split(",") if a.strip()})
+
+# Overlapped pipeline (pipeline_bronze): fetch/decode workers and pages buffered between stages
+PIPELINE_FETCH_WORKERS  = TAG_WORKERS
+PIPELINE_DECODE_WORKERS = 2
+PIPELINE_QUEUE_SIZE     = 8
+
+# Continuous collector (colector_bronze): poll cadence, re-read overlap, status file/port
+COLLECTOR_POLL_SECONDS    = 15
+COLLECTOR_OVERLAP_SECONDS = 120   # re-ask this much before the last polled end (late PI writes)
+COLLECTOR_STATUS_PORT     = None  # e.g. 8766 to serve GET /status
+
+# Maintenance (mantenimiento_bronze): compaction target and vacuum retention
+COMPACT_TARGET_MB      = 128
+VACUUM_RETENTION_HOURS = 168   # < 168 disables the Delta safety check; only if no reader needs old versions
+
+# HTTP session: (connect, read) timeouts, retries with exponential backoff, pool size per worker
+PI_TIMEOUT      = (10, 300)
+PI_MAX_RETRIES  = 4
+PI_BACKOFF_BASE = 1.0    # s; attempt n waits ~BASE * 2**n (jittered), capped at PI_BACKOFF_MAX
+PI_BACKOFF_MAX  = 30.0
+PI_POOL_SIZE    = 4
+
+# Multi-tag backend ("stream" = one request per tag/page, "streamset" = /streamsets + /batch)
+EXTRACT_BACKEND    = os.getenv("BRONZE_BACKEND", "stream")
+STREAMSET_MAX_TAGS = 50    # WebIDs per /streamsets/recorded request (URL length)
+BATCH_MAX_REQUESTS = 100   # sub-requests per /batch call
 
 REPO_ROOT   = Path(__file__).resolve().parents[2]
 DATA_DIR    = (REPO_ROOT / "data").resolve()
 LOG_DIR = (REPO_ROOT / "logs").resolve()
-BRONZE_TABLE = DATA_DIR / "capa_bronze_v2" / "readings_v1"
+# BRONZE_TABLE env points a run at another table (e.g. benchmark_bronze uses a scratch dir)
+BRONZE_TABLE = Path(os.getenv("BRONZE_TABLE") or DATA_DIR / "capa_bronze_v2" / "readings_v1").resolve()
+
+# Per-tag watermark snapshot (storage_bronze.MarcasAgua); the Delta commit metadata is the source of truth
+WATERMARK_PATH = BRONZE_TABLE.parent / "bronze_watermarks.json"
+# Per-tag lag published by the continuous collector every cycle
+COLLECTOR_STATUS_PATH = BRONZE_TABLE.parent / "collector_status.json"
+
+# Tag path -> WebID cache (cache_webid_bronze), refreshed after TTL or on 404
+WEBID_CACHE_PATH     = BRONZE_TABLE.parent / "webid_cache.json"
+WEBID_CACHE_TTL_DIAS = 30
 
 # Ensure directories exist (safe to call multiple times).
 DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,172 @@
+# etl/bronze/decode.py
+"""
+Arrow-native decoding of PI recorded `Items` into the Bronze channels, replacing the
+per-row split_pi_value(x) of main_bronze (one Series object per row; since removed).
+
+Reference semantics per raw value x (the former split_pi_value rules, unchanged):
+  - dict / None        : value=NaN, value_text=None, value_bool=None
+  - bool               : value=NaN, value_text="True"/"False", value_bool=bool
+  - int / float        : value=float(x), value_text=str(x), value_bool=None
+  - str                : value=float(x.strip()) or float(x.strip().replace(",", ".")) else NaN,
+                         value_text=x, value_bool=None
+  - anything else      : value=NaN, value_text=str(x), value_bool=None
+Homogeneous payloads (all numeric / all bool / all str, the normal case per tag) are built
+by pyarrow in one call; mixed payloads are split once by type and each group converted in bulk.
+A numeric inferred type is only trusted when no item is a bool (pyarrow turns [2.5, False]
+into [2.5, 0.0]); `python decode_bronze.py` checks such payloads against the rules above.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+_BOOL, _NUM, _STR, _NULO, _OTRO = range(5)
+_CODIGOS = {bool: _BOOL, int: _NUM, float: _NUM, str: _STR, dict: _NULO, type(None): _NULO}
+
+# Plain ASCII decimals Arrow parses exactly like float(); anything else Python float()
+# might still accept (inf/nan, digit underscores, non-ASCII digits/whitespace) goes to Python.
+_DECIMAL = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+_ESPECIAL = r"(?i)^[+-]?(inf|infinity|nan)$|_"
+
+ESQUEMA = pa.schema([
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("value", pa.float64()),
+    ("value_text", pa.string()),
+    ("value_bool", pa.bool_()),
+])
+
+
+def _float_py(x: str) -> float:
+    x_strip = x.strip()
+    try:
+        return float(x_strip)
+    except Exception:
+        try:
+            return float(x_strip.replace(",", "."))
+        except Exception:
+            return np.nan
+
+
+def numeros_desde_texto(textos: pa.Array) -> pa.Array:
+    """float64 per string (NaN where not numeric), comma decimal accepted."""
+    s = pc.replace_substring(pc.utf8_trim_whitespace(textos), ",", ".")
+    es_decimal = pc.fill_null(pc.match_substring_regex(s, _DECIMAL), False)
+    valores = pc.cast(pc.if_else(es_decimal, s, pa.scalar(None, pa.string())), pa.float64())
+    valores = pc.fill_null(valores, np.nan).to_numpy(zero_copy_only=False).copy()
+
+    raro = pc.or_(pc.invert(pc.string_is_ascii(textos)), pc.match_substring_regex(s, _ESPECIAL))
+    raro = pc.and_(pc.fill_null(raro, False), pc.invert(es_decimal))
+    idx = np.flatnonzero(raro.to_numpy(zero_copy_only=False))
+    if len(idx):
+        crudos = textos.take(pa.array(idx)).to_pylist()
+        valores[idx] = [_float_py(x) for x in crudos]
+    return pa.array(valores, pa.float64())
+
+
+def _todo_nulo(n: int) -> tuple:
+    return (pa.array(np.full(n, np.nan)), pa.nulls(n, pa.string()), pa.nulls(n, pa.bool_()))
+
+
+def decodificar_valores(valores: list) -> tuple:
+    """(value float64, value_text string, value_bool bool) Arrow arrays for raw PI values."""
+    n = len(valores)
+    try:
+        arr = pa.array(valores)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        arr = None
+
+    if arr is not None and arr.null_count == 0:
+        t = arr.type
+        # pyarrow infers double for [2.5, False] (False -> 0.0): bools among numbers are mixed
+        if (pa.types.is_floating(t) or pa.types.is_integer(t)) and bool not in set(map(type, valores)):
+            texto = pa.array(list(map(str, valores)), pa.string())
+            return arr.cast(pa.float64(), safe=False), texto, pa.nulls(n, pa.bool_())
+        if pa.types.is_boolean(t):
+            texto = pc.if_else(arr, "True", "False")
+            return pa.array(np.full(n, np.nan)), texto, arr
+        if pa.types.is_string(t):
+            return numeros_desde_texto(arr), arr, pa.nulls(n, pa.bool_())
+        if pa.types.is_struct(t):  # every item a dict (PI error/no data)
+            return _todo_nulo(n)
+    if arr is not None and arr.null_count == n:
+        return _todo_nulo(n)
+
+    # Mixed payload: classify once, convert each type group in bulk
+    codigos = np.fromiter((_CODIGOS.get(type(v), _OTRO) for v in valores), np.int8, n)
+    obj = np.fromiter(valores, dtype=object, count=n)
+    value = np.full(n, np.nan)
+    texto = np.full(n, None, dtype=object)
+    booleano = np.full(n, None, dtype=object)
+
+    m = codigos == _NUM
+    if m.any():
+        value[m] = obj[m].astype(np.float64)
+        texto[m] = list(map(str, obj[m]))
+    m = codigos == _BOOL
+    if m.any():
+        booleano[m] = obj[m]
+        texto[m] = np.where(obj[m].astype(bool), "True", "False")
+    m = codigos == _STR
+    if m.any():
+        s = pa.array(obj[m], pa.string())
+        value[m] = numeros_desde_texto(s).to_numpy()
+        texto[m] = obj[m]
+    m = codigos == _OTRO
+    if m.any():
+        texto[m] = list(map(str, obj[m]))
+
+    return pa.array(value), pa.array(texto, pa.string()), pa.array(booleano, pa.bool_())
+
+
+def decodificar_timestamps(raw: list) -> pa.Array:
+    """UTC timestamps; unparseable/missing -> null (like pd.to_datetime(utc=True, errors='coerce'))."""
+    arr = pa.array(raw, pa.string())
+    try:
+        ts = arr.cast(pa.timestamp("ns", tz="UTC"))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # naive strings, odd formats: let pandas decide (rare). ISO8601 so that mixed
+        # fractional precisions (PI sends 0-7 digits) are not coerced to NaT.
+        ts = pa.array(pd.to_datetime(pd.Series(raw, dtype=object), utc=True, errors="coerce", format="ISO8601"))
+    return ts.cast(pa.timestamp("us", tz="UTC"), safe=False)
+
+
+def decodificar_items(items: list) -> pa.Table:
+    """PI `Items` -> Arrow table [timestamp, value, value_text, value_bool] (ESQUEMA)."""
+    ts = decodificar_timestamps([it.get("Timestamp") for it in items])
+    value, texto, booleano = decodificar_valores([it.get("Value") for it in items])
+    return pa.Table.from_arrays([ts, value, texto, booleano], schema=ESQUEMA)
+
+
+def tabla_bronze(items: list, tag_alias: str) -> pa.Table:
+    tbl = decodificar_items(items)
+    return tbl.append_column("tag", pa.array(np.full(tbl.num_rows, tag_alias, dtype=object), pa.string()))
+
+
+def _referencia(x) -> tuple:
+    """One raw value through the reference rules of the module docstring."""
+    if isinstance(x, dict) or x is None:
+        return np.nan, None, None
+    if isinstance(x, bool):
+        return np.nan, str(x), x
+    if isinstance(x, (int, float)):
+        return float(x), str(x), None
+    if isinstance(x, str):
+        return _float_py(x), x, None
+    return np.nan, str(x), None
+
+
+# Payloads pyarrow infers as one type although they mix channels (regressions of the fast path)
+_CASOS = [
+    [2.5, False], [1.0, False], [float("nan"), True, float("nan"), 0], [0, 1.0, float("nan"), -3, -3, float("nan"), False],
+    [False, 2.5], [1, True], [True, 2.5], [3, None, "4,5", True, {"Name": "Error"}],
+    [1, 2, 3], [True, False], ["1.5", " 2 ", "x"], [{"a": 1}, {"b": 2}], [None, None],
+]
+
+if __name__ == "__main__":
+    for caso in _CASOS:
+        esperado = list(zip(*map(_referencia, caso)))
+        obtenido = [a.to_pylist() for a in decodificar_valores(caso)]
+        ok = (np.array_equal(np.array(obtenido[0], float), np.array(esperado[0], float), equal_nan=True)
+              and obtenido[1:] == [list(c) for c in esperado[1:]])
+        print(("ok   " if ok else "FALLA"), caso)
+        assert ok, (caso, obtenido, esperado)
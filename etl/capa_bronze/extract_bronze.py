@@ -1,12 +1,22 @@
 # etl/bronze/extract.py
 import os
 import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from requests_ntlm import HttpNtlmAuth
 from dotenv import load_dotenv
 import urllib3
 from datetime import timedelta
+from urllib.parse import urlencode
+from config_bronze import (
+    PI_MAX_RPS, STREAMSET_MAX_TAGS, BATCH_MAX_REQUESTS, TAG_WORKERS, WINDOW_WORKERS,
+    PI_TIMEOUT, PI_MAX_RETRIES, PI_BACKOFF_BASE, PI_BACKOFF_MAX, PI_POOL_SIZE,
+)
 
 # Disable SSL warnings for self-signed certificates (only if your PI server needs it)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -17,33 +27,174 @@ load_dotenv()
 PI_USERNAME = os.getenv("PI_USERNAME")
 PI_PASSWORD = os.getenv("PI_PASSWORD")
 PI_SERVER   = os.getenv("PI_SERVER")
-BASE_URL    = f"https://{PI_SERVER}/piwebapi"
+# PI_BASE_URL overrides the server URL (e.g. http://127.0.0.1:8765/piwebapi for mock_pi_server)
+BASE_URL    = os.getenv("PI_BASE_URL") or f"https://{PI_SERVER}/piwebapi"
 HEADERS     = {"Content-Type": "application/json"}
 print(PI_USERNAME)
 
+
+class LimitadorTasa:
+    """
+    Token bucket shared by every worker thread: at most `rps` requests per second
+    (burst of one second) against the PI server, regardless of how many tags run at once.
+    """
+    def __init__(self, rps: float):
+        self.rps = float(rps)
+        self.capacidad = max(1.0, self.rps)
+        self.tokens = self.capacidad
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def esperar(self) -> None:
+        if self.rps <= 0:
+            return
+        while True:
+            with self.lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.rps)
+                self.ultimo = ahora
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                espera = (1.0 - self.tokens) / self.rps
+            time.sleep(espera)
+
+
+limitador = LimitadorTasa(PI_MAX_RPS)
+
+
+# --- HTTP session layer ---
+# One requests.Session per worker thread (Session is not thread-safe). Each keeps a pool of
+# keep-alive connections and a single HttpNtlmAuth: NTLM authenticates the TCP connection,
+# so the handshake is paid once per pooled connection instead of once per request.
+
+_local = threading.local()
+_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class EstadisticasHTTP:
+    """Thread-safe request/retry counters and latency (last 10k requests for percentiles)."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.peticiones = 0
+        self.reintentos = 0
+        self.fallos = 0
+        self.latencias = deque(maxlen=10_000)
+
+    def registrar(self, segundos: float = None, reintento: bool = False, fallo: bool = False) -> None:
+        with self.lock:
+            if segundos is not None:
+                self.peticiones += 1
+                self.latencias.append(segundos)
+            self.reintentos += int(reintento)
+            self.fallos += int(fallo)
+
+    def resumen(self) -> dict:
+        with self.lock:
+            lat = sorted(self.latencias)
+            n = len(lat)
+            pct = lambda q: round(lat[min(n - 1, int(q * n))] * 1000, 1) if n else None
+            return {"peticiones": self.peticiones, "reintentos": self.reintentos, "fallos": self.fallos,
+                    "latencia_ms_p50": pct(0.50), "latencia_ms_p95": pct(0.95),
+                    "latencia_ms_max": round(lat[-1] * 1000, 1) if n else None}
+
+
+estadisticas_http = EstadisticasHTTP()
+
+
+def obtener_sesion() -> requests.Session:
+    ses = getattr(_local, "sesion", None)
+    if ses is None:
+        ses = requests.Session()
+        adapter = HTTPAdapter(pool_connections=PI_POOL_SIZE, pool_maxsize=PI_POOL_SIZE)
+        ses.mount("https://", adapter)
+        ses.mount("http://", adapter)
+        ses.auth = HttpNtlmAuth(PI_USERNAME, PI_PASSWORD)
+        ses.verify = False
+        ses.headers.update(HEADERS)
+        _local.sesion = ses
+    return ses
+
+
+def cerrar_sesion() -> None:
+    """Close this thread's session (returns its pooled sockets) so the next request opens a new one."""
+    ses = getattr(_local, "sesion", None)
+    _local.sesion = None
+    if ses is not None:
+        try:
+            ses.close()
+        except Exception:
+            pass
+
+
+def pi_request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Rate-limited request on the thread's pooled session, with timeout and bounded
+    exponential backoff (+jitter) on connection errors, timeouts, 429 and 5xx.
+    Honors Retry-After. Other 4xx (e.g. 404) raise immediately.
+    """
+    kwargs.setdefault("timeout", PI_TIMEOUT)
+    for intento in range(PI_MAX_RETRIES + 1):
+        limitador.esperar()
+        t0 = time.perf_counter()
+        try:
+            resp = obtener_sesion().request(method, url, **kwargs)
+            estadisticas_http.registrar(time.perf_counter() - t0)
+            if resp.status_code not in _REINTENTABLES:
+                resp.raise_for_status()
+                return resp
+            error = requests.HTTPError(f"{resp.status_code} para {resp.url}", response=resp)
+            espera = resp.headers.get("Retry-After")
+        except (requests.ConnectionError, requests.Timeout) as e:
+            estadisticas_http.registrar(time.perf_counter() - t0)
+            error, espera = e, None
+            cerrar_sesion()  # drop the pool: the connection (and its NTLM context) may be dead
+
+        if intento == PI_MAX_RETRIES:
+            estadisticas_http.registrar(fallo=True)
+            raise error
+        estadisticas_http.registrar(reintento=True)
+        if espera is not None and str(espera).isdigit():
+            espera = float(espera)
+        else:
+            espera = min(PI_BACKOFF_MAX, PI_BACKOFF_BASE * 2 ** intento) * (0.5 + random.random() / 2)
+        time.sleep(espera)
+
+
+def _url_point(tag_name: str) -> str:
+    return f"{BASE_URL}/points?path=\\\\{PI_SERVER}\\{tag_name}"
+
+
 def obtener_webid(tag_name: str) -> str:
     """
     Return the WebID for a given PI tag.
     """
-    url = f"{BASE_URL}/points?path=\\\\{PI_SERVER}\\{tag_name}"
-    resp = requests.get(url, auth=HttpNtlmAuth(PI_USERNAME, PI_PASSWORD), verify=False)
-    resp.raise_for_status()
+    resp = pi_request("GET", _url_point(tag_name))
     return resp.json()["WebId"]
 
 
 def generar_rangos_fechas(start_date_str: str, end_date_str: str, delta_dias: int = 15):
     """
-    Generate half-open time ranges [start, end] split in windows of 'delta_dias'.
+    Generate consecutive time ranges (start, end) split in windows of 'delta_dias'.
+    Each range owns [start, end); only the last one also owns its end, so fetch them with
+    incluir_fin=(range is the last) and no point is lost or read twice at the seams.
+    end_date_str may be "now" / "*" (current UTC time, for continuous collection).
     """
     start_date = pd.to_datetime(start_date_str)
-    end_date   = pd.to_datetime(end_date_str)
+    if str(end_date_str).strip().lower() in ("now", "*"):
+        end_date = pd.Timestamp.now(tz="UTC")
+    else:
+        end_date = pd.to_datetime(end_date_str)
     rangos = []
     current_start = start_date
 
     while current_start < end_date:
         current_end = min(current_start + timedelta(days=delta_dias), end_date)
         rangos.append((current_start.isoformat(), current_end.isoformat()))
-        current_start = current_end + timedelta(seconds=1)
+        current_start = current_end
 
     return rangos
 
@@ -53,32 +204,197 @@ def obtener_datos_hist_pag(webid: str, start: str, end: str, max_per_request: in
     Pull recorded data from PI Web API in pages until no more items are returned.
     Returns a DataFrame with columns: ['timestamp', 'value'].
     """
+    return _items_a_df(obtener_items_hist_pag(webid, start, end, max_per_request))
+
+
+def obtener_items_hist_pag(webid: str, start: str, end: str, max_per_request: int = 800_000) -> list:
+    """Same paging as obtener_datos_hist_pag, returning the raw PI `Items` (for decode_bronze)."""
     all_items = []
-    current_start = start
+    for items in iterar_paginas_hist(webid, start, end, max_per_request):
+        all_items.extend(items)
+    return all_items
+
+
+def iterar_paginas_hist(webid: str, start: str, end: str, max_per_request: int = 800_000,
+                        incluir_fin: bool = True):
+    """
+    Yield the raw `Items` of each recorded page in time order (one page in memory at a time).
+    With incluir_fin=False values stamped exactly at `end` are left to the next range.
+    """
+    url = f"{BASE_URL}/streams/{webid}/recorded"
+    fin = None if incluir_fin else pd.Timestamp(end)
+    current_start, ultimo, vistos = start, None, 0
 
     while True:
-        url = f"{BASE_URL}/streams/{webid}/recorded"
         params = {
             "startTime": current_start,
             "endTime": end,
             "maxCount": max_per_request,
             "boundaryType": "Inside",
         }
-        resp = requests.get(
-            url, params=params, auth=HttpNtlmAuth(PI_USERNAME, PI_PASSWORD), verify=False
-        )
-        resp.raise_for_status()
-        items = resp.json().get("Items", [])
-        if not items:
+        resp = pi_request("GET", url, params=params)
+        items, ultimo, vistos, seguir = _pagina_exacta(resp.json().get("Items", []), max_per_request,
+                                                       ultimo, vistos, fin)
+        if items:
+            yield items
+        if not seguir:
             break
-        all_items.extend(items)
-        # move start to last timestamp + 1s to avoid overlaps
-        last_timestamp = items[-1]["Timestamp"]
-        last_time = pd.to_datetime(last_timestamp) + pd.Timedelta(seconds=1)
-        current_start = last_time.isoformat()
-        time.sleep(0.1)
-
-    df = pd.DataFrame(
-        [{"timestamp": it["Timestamp"], "value": it.get("Value")} for it in all_items]
+        current_start = ultimo.isoformat()
+
+
+def _ts(item: dict) -> pd.Timestamp:
+    return pd.Timestamp(item["Timestamp"])
+
+
+def _pagina_exacta(items: list, max_per_request: int, ultimo, vistos: int, fin) -> tuple:
+    """
+    One paging step without gaps or repeats. The next page starts AT the last timestamp received
+    (not +1s, which skipped sub-second points), so its first `vistos` values stamped `ultimo` were
+    already yielded and are dropped here; values at `fin` (range end, exclusive) are dropped too.
+    Returns (new items, ultimo, vistos, seguir) where seguir = another page is needed.
+    """
+    completa = len(items) >= max_per_request
+    i = 0
+    while ultimo is not None and i < min(vistos, len(items)) and _ts(items[i]) == ultimo:
+        i += 1
+    items = items[i:]
+    if not items:
+        if completa:
+            raise RuntimeError(f"Mas de {max_per_request} valores con timestamp {ultimo}: aumente maxCount")
+        return items, ultimo, vistos, False
+
+    if completa:
+        t = _ts(items[-1])
+        n = 1
+        while n < len(items) and _ts(items[-1 - n]) == t:
+            n += 1
+        vistos = n + (vistos if t == ultimo else 0)
+        ultimo = t
+    if fin is not None:
+        j = len(items)
+        while j and _ts(items[j - 1]) >= fin:
+            j -= 1
+        items = items[:j]
+    seguir = completa and (fin is None or ultimo < fin)
+    return items, ultimo, vistos, seguir
+
+
+# Shared by all tags so worker threads (and their pooled PI sessions) are reused between tags
+_pool_ventanas = ThreadPoolExecutor(max_workers=max(1, WINDOW_WORKERS * TAG_WORKERS),
+                                    thread_name_prefix="ventana")
+
+
+def iterar_paginas_rangos(webid: str, rangos: list, workers: int = WINDOW_WORKERS,
+                          max_per_request: int = 800_000):
+    """
+    Pages of consecutive ranges (generar_rangos_fechas) of one stream, in time order.
+    Up to `workers` ranges are fetched concurrently (each range pages serially); a range is
+    yielded once it and every earlier range are done, so memory holds at most `workers` ranges.
+    workers=1 streams the ranges in order one page at a time.
+    """
+    ultimo = len(rangos) - 1
+    if workers <= 1 or len(rangos) <= 1:
+        for i, (inicio, fin) in enumerate(rangos):
+            yield from iterar_paginas_hist(webid, inicio, fin, max_per_request, incluir_fin=i == ultimo)
+        return
+
+    def rango(i):
+        inicio, fin = rangos[i]
+        return list(iterar_paginas_hist(webid, inicio, fin, max_per_request, incluir_fin=i == ultimo))
+
+    en_vuelo = deque(_pool_ventanas.submit(rango, i) for i in range(min(workers, len(rangos))))
+    siguiente = len(en_vuelo)
+    try:
+        while en_vuelo:
+            paginas = en_vuelo.popleft().result()
+            if siguiente < len(rangos):
+                en_vuelo.append(_pool_ventanas.submit(rango, siguiente))
+                siguiente += 1
+            yield from paginas
+    finally:
+        for f in en_vuelo:  # consumer stopped early (error): do not fetch the remaining ranges
+            f.cancel()
+
+
+def _items_a_df(items: list) -> pd.DataFrame:
+    return pd.DataFrame(
+        [{"timestamp": it["Timestamp"], "value": it.get("Value")} for it in items]
     )
-    return df
+
+
+# --- Multi-tag extraction: /batch and /streamsets ---
+
+def _post_batch(subrequests: dict) -> dict:
+    """
+    POST /batch with {id: {"Method": "GET", "Resource": url}}; returns {id: {"Status", "Content"}}.
+    """
+    return pi_request("POST", f"{BASE_URL}/batch", json=subrequests).json()
+
+
+def obtener_webids_batch(tag_names: list) -> dict:
+    """
+    Resolve many tags in one round trip per BATCH_MAX_REQUESTS tags.
+    Returns {tag_name: WebID}; tags the server could not resolve are left out.
+    """
+    webids = {}
+    for i in range(0, len(tag_names), BATCH_MAX_REQUESTS):
+        bloque = tag_names[i:i + BATCH_MAX_REQUESTS]
+        subreq = {str(j): {"Method": "GET", "Resource": _url_point(t)} for j, t in enumerate(bloque)}
+        respuesta = _post_batch(subreq)
+        for j, t in enumerate(bloque):
+            r = respuesta.get(str(j), {})
+            if r.get("Status") == 200 and "WebId" in (r.get("Content") or {}):
+                webids[t] = r["Content"]["WebId"]
+    return webids
+
+
+def obtener_items_streamset_pag(webids: list, start: str, end: str, max_per_request: int = 800_000,
+                                incluir_fin: bool = True) -> dict:
+    """
+    Recorded data for many streams over the same range. The first page of every stream
+    comes from /streamsets/recorded (STREAMSET_MAX_TAGS WebIDs per request); streams that
+    filled maxCount keep paging individually, all of them batched into one /batch call per round.
+    Paging is exact (_pagina_exacta); incluir_fin=False leaves values at `end` to the next range.
+    Returns {webid: raw PI `Items`}.
+    """
+    fin = None if incluir_fin else pd.Timestamp(end)
+    items_por_stream = {w: [] for w in webids}
+    pendientes = {}  # webid -> (last timestamp received, values already taken at it)
+
+    for i in range(0, len(webids), STREAMSET_MAX_TAGS):
+        bloque = webids[i:i + STREAMSET_MAX_TAGS]
+        params = {
+            "webId": bloque,
+            "startTime": start,
+            "endTime": end,
+            "maxCount": max_per_request,
+            "boundaryType": "Inside",
+        }
+        resp = pi_request("GET", f"{BASE_URL}/streamsets/recorded", params=params)
+        for stream in resp.json().get("Items", []):
+            items, ultimo, vistos, seguir = _pagina_exacta(stream.get("Items", []), max_per_request, None, 0, fin)
+            items_por_stream.setdefault(stream["WebId"], []).extend(items)
+            if seguir:
+                pendientes[stream["WebId"]] = (ultimo, vistos)
+
+    while pendientes:
+        lista = list(pendientes.items())[:BATCH_MAX_REQUESTS]
+        subreq = {}
+        for j, (w, (ultimo, _)) in enumerate(lista):
+            query = urlencode({"startTime": ultimo.isoformat(), "endTime": end,
+                               "maxCount": max_per_request, "boundaryType": "Inside"})
+            subreq[str(j)] = {"Method": "GET", "Resource": f"{BASE_URL}/streams/{w}/recorded?{query}"}
+        respuesta = _post_batch(subreq)
+        for j, (w, (ultimo, vistos)) in enumerate(lista):
+            r = respuesta.get(str(j), {})
+            if r.get("Status") != 200:
+                raise RuntimeError(f"Batch recorded fallo para {w}: status {r.get('Status')}")
+            items, ultimo, vistos, seguir = _pagina_exacta((r.get("Content") or {}).get("Items", []),
+                                                           max_per_request, ultimo, vistos, fin)
+            items_por_stream[w].extend(items)
+            if seguir:
+                pendientes[w] = (ultimo, vistos)
+            else:
+                del pendientes[w]
+
+    return items_por_stream
@@ -1,14 +1,24 @@
 # etl/bronze/main.py
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from logger_bronze import logger
-from config_bronze import TAGS, START_TIME, END_TIME
+from config_bronze import (
+    TAGS, START_TIME, END_TIME, TAG_WORKERS, PI_MAX_RPS, EXTRACT_BACKEND, STREAMSET_MAX_TAGS,
+    WINDOW_DAYS, WINDOW_WORKERS,
+)
 from extract_bronze import (
-    obtener_webid,
     generar_rangos_fechas,
-    obtener_datos_hist_pag,
+    iterar_paginas_rangos,
+    obtener_items_streamset_pag,
+    estadisticas_http,
 )
-from storage_bronze import leer_ultimo_timestamp, guardar_bronze_delta
+from cache_webid_bronze import cache_webid, con_webid_paginas, resolver_webids, es_404
+from storage_bronze import leer_ultimo_timestamp, BufferBronze
+from decode_bronze import tabla_bronze
 import pandas as pd
-import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 
 """
 Bronze collector (RAW, non-destructive):
@@ -19,108 +29,184 @@ Bronze collector (RAW, non-destructive):
     * value_text  : textual representation exactly as received (None if dict/error)
     * value_bool  : boolean if the original value is a bool, else None
 - Keep invalid timestamps (as NaT). They will be partitioned under date="__missing__".
+- Schema v2 (BRONZE_SCHEMA_V2, storage_bronze): value_text stored only for non-numeric values and
+  opt-in change-only runs (rle_n, rle_hasta, BRONZE_RLE_TAGS) cut on any value or spacing change, so
+  bronze_silver expands them back to these columns with the exact original timestamps.
 """
 
-def split_pi_value(x):
-    """
-    Split incoming PI value into numeric/text/bool channels without dropping rows.
-    Rules:
-      - dict (PI error/no data): value=None, value_text=None, value_bool=None
-      - bool: value=NaN, value_text="True"/"False", value_bool=True/False
-      - int/float: value=float(x), value_text=str(x), value_bool=None
-      - str: value=float(x) if convertible (handles dot/comma), value_text=str(x), value_bool=None
-      - None: all None/NaN
-    """
-    # dict => treat as NULL in all channels (your request)
-    if isinstance(x, dict):
-        return np.nan, None, None
+def empaquetar(items: list, tag_alias: str) -> pa.Table:
+    """Raw PI `Items` -> Bronze columns for one tag (Arrow, see decode_bronze)."""
+    return tabla_bronze(items, tag_alias)
 
-    # booleans as state
-    if isinstance(x, bool):
-        return np.nan, str(x), bool(x)
 
-    # numeric types
-    if isinstance(x, (int, float)) and not isinstance(x, bool):
-        try:
-            return float(x), str(x), None
-        except Exception:
-            return np.nan, str(x), None
-
-    # strings and other scalar-like values
-    if isinstance(x, str):
-        # try to be friendly with comma decimal
-        x_strip = x.strip()
-        x_num = np.nan
-        try:
-            # First attempt raw float
-            x_num = float(x_strip)
-        except Exception:
-            # Second attempt replacing comma by dot
-            try:
-                x_num = float(x_strip.replace(",", "."))
-            except Exception:
-                x_num = np.nan
-        return x_num, x, None
-
-    # None or unknown types
-    if x is None:
-        return np.nan, None, None
-
-    # Fallback: record textual repr but keep numeric NaN and bool None
-    try:
-        return np.nan, str(x), None
-    except Exception:
-        return np.nan, None, None
+def inicio_tag(tag_alias: str) -> pd.Timestamp:
+    # Resume right after the last stored timestamp: Bronze keeps microseconds, so +1us neither
+    # re-reads the last point nor skips a later one (+1s used to drop sub-second points)
+    fecha_inicio = leer_ultimo_timestamp(tag_alias)
+    if fecha_inicio is not None:
+        return fecha_inicio + pd.Timedelta(microseconds=1)
+    return pd.to_datetime(START_TIME, utc=True)
 
 
-def extraer_datos_actualizados(tag_alias: str, tag_path: str) -> None:
+def extraer_datos_actualizados(tag_alias: str, tag_path: str) -> dict:
+    """
+    Extract and store new data for one tag. Never raises: failures are logged and
+    reported in the returned status dict {tag, estado, filas, omitidas, segundos, error, marca_agua}
+    (omitidas = rows already in Bronze, skipped by the merge).
+    Pages are decoded and committed as they arrive (BufferBronze), so memory stays bounded
+    and rows committed before a failure are kept; the next run resumes after them.
+    The WINDOW_DAYS ranges of the tag are fetched WINDOW_WORKERS at a time and committed in order
+    (above 1, each in-flight range is held whole in memory until its turn).
+    """
+    t0 = time.perf_counter()
+    resultado = {"tag": tag_alias, "estado": "ok", "filas": 0, "omitidas": 0, "segundos": 0.0, "error": None}
+    buffer = BufferBronze(tag_alias)
     try:
-        webid = obtener_webid(tag_path)
+        fecha_inicio = inicio_tag(tag_alias)
+        logger.info(f"[{tag_alias}] Extrayendo desde {fecha_inicio}")
+
+        rangos = generar_rangos_fechas(str(fecha_inicio), END_TIME, delta_dias=WINDOW_DAYS)
+        logger.info(f"[{tag_alias}] {len(rangos)} rangos hasta {END_TIME}, {WINDOW_WORKERS} en paralelo")
+
+        # raw Items page by page, ranges in time order; WebID from the on-disk cache
+        for items in con_webid_paginas(tag_path, lambda w: iterar_paginas_rangos(w, rangos)):
+            buffer.agregar(empaquetar(items, tag_alias))
+        buffer.confirmar()
 
-        # Resume from last stored timestamp (inclusive), move +1s to avoid duplicates
-        fecha_inicio = leer_ultimo_timestamp(tag_alias)
-        if fecha_inicio is not None:
-            fecha_inicio = fecha_inicio + pd.Timedelta(seconds=1)
-            logger.info(f"Reanudando desde {fecha_inicio} para {tag_alias}")
+        if buffer.filas_escritas:
+            logger.info(f"{tag_alias}: {buffer.filas_escritas} filas nuevas escritas en Bronze Delta "
+                        f"({buffer.commits} commits).")
         else:
-            fecha_inicio = pd.to_datetime(START_TIME, utc=True)
-            logger.info(f"Extrayendo desde cero para {tag_alias}")
-        
+            resultado["estado"] = "sin_datos"
+            logger.info(f"No se encontraron datos nuevos para {tag_alias}.")
 
-        rangos = generar_rangos_fechas(str(fecha_inicio), END_TIME, delta_dias=15)
-        df_total = pd.DataFrame()
+    except Exception as e:
+        resultado.update(estado="error", error=str(e))
+        logger.error(f"[ERROR] {tag_alias}: {e} (filas confirmadas: {buffer.filas_escritas})")
 
-        for inicio, fin in rangos:
-            logger.info(f"[{tag_alias}] Rango: {inicio} -> {fin}")
-            df = obtener_datos_hist_pag(webid, inicio, fin)  # columns: ['timestamp', 'value']
-            if df.empty:
-                continue
+    resultado["filas"] = buffer.filas_escritas
+    resultado["omitidas"] = buffer.filas_omitidas
+    resultado["marca_agua"] = buffer.marca_agua
+    resultado["segundos"] = round(time.perf_counter() - t0, 2)
+    return resultado
 
-            # Normalize timestamp to tz-aware. DO NOT drop NaT.
-            df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
 
-            # Split channels
-            # returns columns: value (float), value_text (str/None), value_bool (bool/None)
-            out = df["value"].apply(split_pi_value).apply(pd.Series)
-            out.columns = ["value", "value_text", "value_bool"]
+def extraer_todos(tags: dict, workers: int = TAG_WORKERS) -> list:
+    """
+    Run extraer_datos_actualizados for every tag with `workers` threads (1 = serial).
+    The PI request rate is capped globally by extract_bronze.limitador; a failing tag
+    does not stop the others. Logs progress per finished tag and a final summary.
+    """
+    t0 = time.perf_counter()
+    total = len(tags)
+    resultados = []
+    logger.info(f"Extrayendo {total} tags con {workers} worker(s), limite {PI_MAX_RPS} req/s")
 
-            # Attach tag and pack
-            df_pack = pd.concat([df[["timestamp"]], out], axis=1)
-            df_pack["tag"] = tag_alias
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bronze") as pool:
+        futuros = {pool.submit(extraer_datos_actualizados, alias, path): alias for alias, path in tags.items()}
+        for fut in as_completed(futuros):
+            r = fut.result()
+            resultados.append(r)
+            logger.info(f"[{len(resultados)}/{total}] {r['tag']}: {r['estado']} "
+                        f"({r['filas']} filas, {r['segundos']} s)")
 
-            df_total = pd.concat([df_total, df_pack], ignore_index=True)
+    resumen_extraccion(resultados, time.perf_counter() - t0)
+    return resultados
 
-        if not df_total.empty:
-            guardar_bronze_delta(df_total, tag_alias)
-            logger.info(f"{tag_alias}: {len(df_total)} filas nuevas escritas en Bronze Delta.")
-        else:
-            logger.info(f"No se encontraron datos nuevos para {tag_alias}.")
 
-    except Exception as e:
-        logger.error(f"[ERROR] {tag_alias}: {e}")
+def extraer_streamset(tags: dict, tamano_grupo: int = STREAMSET_MAX_TAGS, fin: str = END_TIME,
+                      inicios: dict | None = None, resumen: bool = True) -> list:
+    """
+    Multi-tag backend: WebIDs from the cache (misses via one /batch), data pulled for `tamano_grupo` tags
+    per /streamsets/recorded request. A group shares one time range starting at its
+    earliest resume point; rows before each tag's own resume point are dropped.
+    A failing group marks only its own tags as failed.
+    `inicios` overrides the resume point of some tags (used by the continuous collector).
+    """
+    t0 = time.perf_counter()
+    webids = resolver_webids(list(tags.values()))
+    resultados = [
+        {"tag": a, "estado": "error", "filas": 0, "omitidas": 0, "segundos": 0.0, "error": "WebID no resuelto"}
+        for a, p in tags.items() if p not in webids
+    ]
+    alias_ok = [a for a, p in tags.items() if p in webids]
+    logger.info(f"Streamset: {len(alias_ok)}/{len(tags)} WebIDs resueltos")
+
+    for g in range(0, len(alias_ok), tamano_grupo):
+        grupo = alias_ok[g:g + tamano_grupo]
+        tg = time.perf_counter()
+        por_webid = {webids[tags[a]]: a for a in grupo}
+        buffers = {a: BufferBronze(a) for a in grupo}
+        try:
+            inicio_g = {a: (inicios or {}).get(a) or inicio_tag(a) for a in grupo}
+            rangos = generar_rangos_fechas(str(min(inicio_g.values())), fin, delta_dias=WINDOW_DAYS)
+            for i, (inicio, fin_r) in enumerate(rangos):
+                logger.info(f"[streamset {len(grupo)} tags] Rango: {inicio} -> {fin_r}")
+                ultimo = i == len(rangos) - 1
+                try:
+                    datos = obtener_items_streamset_pag(list(por_webid), inicio, fin_r, incluir_fin=ultimo)
+                except Exception as e:
+                    if not es_404(e):
+                        raise
+                    # Some cached WebID went stale: re-resolve the whole group once
+                    paths = [tags[a] for a in grupo]
+                    cache_webid.invalidar(paths)
+                    nuevos = resolver_webids(paths)
+                    por_webid = {nuevos[tags[a]]: a for a in grupo if tags[a] in nuevos}
+                    datos = obtener_items_streamset_pag(list(por_webid), inicio, fin_r, incluir_fin=ultimo)
+                for w, items in datos.items():
+                    if not items or w not in por_webid:
+                        continue
+                    a = por_webid[w]
+                    tbl = empaquetar(items, a)
+                    antes = pc.less(tbl["timestamp"], pa.scalar(inicio_g[a].to_pydatetime(), tbl["timestamp"].type))
+                    buffers[a].agregar(tbl.filter(pc.invert(pc.fill_null(antes, False))))
+            for b in buffers.values():
+                b.confirmar()
+            estado, error = None, None
+        except Exception as e:
+            logger.error(f"[ERROR] grupo streamset {grupo[0]}..{grupo[-1]}: {e}")
+            estado, error = "error", str(e)
+        seg = round(time.perf_counter() - tg, 2)
+        for a, b in buffers.items():
+            resultados.append({"tag": a, "estado": estado or ("ok" if b.filas_escritas else "sin_datos"),
+                               "filas": b.filas_escritas, "omitidas": b.filas_omitidas, "segundos": seg, "error": error,
+                               "marca_agua": b.marca_agua})
+
+    if resumen:
+        resumen_extraccion(resultados, time.perf_counter() - t0)
+    return resultados
+
+
+def resumen_extraccion(resultados: list, segundos: float) -> None:
+    por_estado = {}
+    for r in resultados:
+        por_estado[r["estado"]] = por_estado.get(r["estado"], 0) + 1
+    filas = sum(r["filas"] for r in resultados)
+    omitidas = sum(r.get("omitidas", 0) for r in resultados)
+    logger.info(f"Resumen Bronze: {len(resultados)} tags en {segundos:.1f} s, {filas} filas insertadas, "
+                f"{omitidas} omitidas (ya existentes), "
+                + ", ".join(f"{k}={v}" for k, v in sorted(por_estado.items())))
+    logger.info(f"HTTP PI: {estadisticas_http.resumen()}")
+    for r in resultados:
+        if r["estado"] == "error":
+            logger.error(f"  tag fallido {r['tag']}: {r['error']}")
 
 
 if __name__ == "__main__":
-    for tag_alias, tag_path in TAGS.items():
-        logger.info(f"\nProcesando tag: {tag_alias}")
-        extraer_datos_actualizados(tag_alias, tag_path)
+    parser = argparse.ArgumentParser(description="Bronze collector (PI Web API -> Delta)")
+    parser.add_argument("--workers", type=int, default=TAG_WORKERS, help="tags extraidos en paralelo (1 = serial)")
+    parser.add_argument("--tags", nargs="*", help="subconjunto de alias de TAGS")
+    parser.add_argument("--backend", choices=["stream", "streamset", "pipeline"], default=EXTRACT_BACKEND,
+                        help="stream = una peticion por tag/pagina; streamset = /streamsets + /batch; "
+                             "pipeline = fetch/decode/write solapados (pipeline_bronze)")
+    args = parser.parse_args()
+
+    tags = {k: v for k, v in TAGS.items() if not args.tags or k in args.tags}
+    if args.backend == "streamset":
+        extraer_streamset(tags)
+    elif args.backend == "pipeline":
+        from pipeline_bronze import extraer_pipeline
+        extraer_pipeline(tags, fetch_workers=args.workers)
+    else:
+        extraer_todos(tags, workers=args.workers)
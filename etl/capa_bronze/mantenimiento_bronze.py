@@ -0,0 +1,149 @@
+# etl/bronze/mantenimiento.py
+"""
+Bronze table maintenance: small-file compaction, layout, checkpoint and vacuum.
+
+Appends every run (and per-page commits) leave many small Parquet files per (tag, date)
+partition plus a long _delta_log. This job:
+  1. compacts partitions with >1 file and an average file below the target size, rewriting
+     them sorted by timestamp (z-order on a single column = sort), one commit per tag;
+  2. writes a Delta checkpoint and drops expired log entries (faster table open);
+  3. vacuums files no longer referenced, older than the retention window.
+Before/after file counts, bytes, log size and scan times are reported. Scans are streamed
+(record batches, constant memory): by default only one tag is timed; --scan-completo also
+times a scan of the whole table.
+
+Usage:
+  python mantenimiento_bronze.py                # compact + checkpoint + vacuum
+  python mantenimiento_bronze.py --tags voltaje --sin-vacuum
+  python mantenimiento_bronze.py --solo-reporte --scan-completo
+"""
+import time
+import json
+import argparse
+from collections import defaultdict
+import pyarrow as pa
+import pyarrow.dataset as ds
+from deltalake import DeltaTable
+from logger_bronze import logger
+from config_bronze import BRONZE_TABLE, COMPACT_TARGET_MB, VACUUM_RETENTION_HOURS
+from storage_bronze import _lock_escritura
+
+COLUMNAS_SCAN = ["timestamp", "value", "value_text", "tag"]  # what Silver reads
+
+
+def _scan(dt: DeltaTable, tag: str | None = None) -> tuple[int, float]:
+    """(rows, seconds) of a streamed scan of COLUMNAS_SCAN; batches are counted and dropped."""
+    t = time.perf_counter()
+    filtro = ds.field("tag") == tag if tag is not None else None
+    scanner = dt.to_pyarrow_dataset().scanner(columns=COLUMNAS_SCAN, filter=filtro)
+    n = sum(b.num_rows for b in scanner.to_batches())
+    return n, time.perf_counter() - t
+
+
+def estado_tabla(tag_muestra: str | None = None, scan_completo: bool = False) -> dict:
+    """
+    File/log counts and timings of opening and scanning the table. Row counts come from the
+    Delta log; one tag (tag_muestra, else the first one) is scanned, the whole table only
+    with scan_completo.
+    """
+    t = time.perf_counter()
+    dt = DeltaTable(str(BRONZE_TABLE))
+    t_abrir = time.perf_counter() - t
+    acts = pa.table(dt.get_add_actions(flatten=True))
+    log_dir = BRONZE_TABLE / "_delta_log"
+    n_log = len(list(log_dir.glob("*.json")))
+    tags = acts["partition.tag"].to_pylist()
+
+    out = {
+        "version": dt.version(),
+        "archivos": acts.num_rows,
+        "mb": round(sum(acts["size_bytes"].to_pylist()) / 1e6, 1),
+        "particiones": len(set(zip(tags, acts["partition.date"].to_pylist()))),
+        "commits_json": n_log,
+        "filas": sum(acts["num_records"].to_pylist()),
+        "abrir_s": round(t_abrir, 3),
+    }
+    tag_muestra = tag_muestra or (min(tags) if tags else None)
+    if tag_muestra:
+        _, t_tag = _scan(dt, tag_muestra)
+        out["tag_muestra"] = tag_muestra
+        out["scan_tag_s"] = round(t_tag, 3)
+    if scan_completo:
+        _, t_scan = _scan(dt)
+        out["scan_completo_s"] = round(t_scan, 3)
+    return out
+
+
+def particiones_a_compactar(dt: DeltaTable, target_bytes: int, tags=None) -> dict:
+    """{tag: [dates]} whose partition has several files averaging below the target size."""
+    acts = pa.table(dt.get_add_actions(flatten=True)).select(
+        ["partition.tag", "partition.date", "size_bytes"]).to_pylist()
+    stats = defaultdict(lambda: [0, 0])
+    for a in acts:
+        s = stats[(a["partition.tag"], a["partition.date"])]
+        s[0] += 1
+        s[1] += a["size_bytes"]
+    out = defaultdict(list)
+    for (tag, fecha), (n, size) in stats.items():
+        if n > 1 and size / n < target_bytes and (not tags or tag in tags):
+            out[tag].append(fecha)
+    return dict(out)
+
+
+def compactar(target_mb: int = COMPACT_TARGET_MB, tags=None) -> dict:
+    target = int(target_mb * 1e6)
+    dt = DeltaTable(str(BRONZE_TABLE))
+    pendientes = particiones_a_compactar(dt, target, tags)
+    total = {"tags": len(pendientes), "particiones": sum(map(len, pendientes.values())),
+             "archivos_eliminados": 0, "archivos_nuevos": 0}
+    for i, (tag, fechas) in enumerate(sorted(pendientes.items()), 1):
+        filtros = [("tag", "=", tag), ("date", "in", sorted(fechas))]
+        with _lock_escritura:  # same process may be collecting; one writer at a time
+            m = dt.optimize.z_order(["timestamp"], partition_filters=filtros, target_size=target)
+        total["archivos_eliminados"] += int(m.get("numFilesRemoved", 0))
+        total["archivos_nuevos"] += int(m.get("numFilesAdded", 0))
+        logger.info(f"[compactar {i}/{len(pendientes)}] {tag}: {len(fechas)} particiones, "
+                    f"{m.get('numFilesRemoved')} -> {m.get('numFilesAdded')} archivos")
+    return total
+
+
+def checkpoint() -> None:
+    dt = DeltaTable(str(BRONZE_TABLE))
+    dt.create_checkpoint()
+    dt.cleanup_metadata()  # log entries older than logRetentionDuration (covered by the checkpoint)
+
+
+def vacuum(retencion_horas: int = VACUUM_RETENTION_HOURS) -> int:
+    dt = DeltaTable(str(BRONZE_TABLE))
+    borrados = dt.vacuum(retention_hours=retencion_horas, dry_run=False,
+                         enforce_retention_duration=retencion_horas >= 168)
+    return len(borrados)
+
+
+def mantener(tags=None, target_mb: int = COMPACT_TARGET_MB, retencion_horas: int = VACUUM_RETENTION_HOURS,
+             hacer_vacuum: bool = True, solo_reporte: bool = False, scan_completo: bool = False) -> dict:
+    muestra = (tags or [None])[0]
+    reporte = {"antes": estado_tabla(muestra, scan_completo)}
+    logger.info(f"Bronze antes: {reporte['antes']}")
+    if not solo_reporte:
+        reporte["compactacion"] = compactar(target_mb, tags)
+        checkpoint()
+        if hacer_vacuum:
+            reporte["vacuum_archivos"] = vacuum(retencion_horas)
+        reporte["despues"] = estado_tabla(muestra, scan_completo)
+        logger.info(f"Bronze despues: {reporte['despues']}")
+    print(json.dumps(reporte, indent=2, ensure_ascii=False))
+    return reporte
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de la tabla Bronze (Delta)")
+    parser.add_argument("--tags", nargs="*", help="limitar la compactacion a estos tags")
+    parser.add_argument("--target-mb", type=int, default=COMPACT_TARGET_MB)
+    parser.add_argument("--retencion-horas", type=int, default=VACUUM_RETENTION_HOURS)
+    parser.add_argument("--sin-vacuum", action="store_true")
+    parser.add_argument("--solo-reporte", action="store_true")
+    parser.add_argument("--scan-completo", action="store_true", help="medir tambien un scan de toda la tabla")
+    args = parser.parse_args()
+    mantener(args.tags, args.target_mb, args.retencion_horas, not args.sin_vacuum, args.solo_reporte,
+             args.scan_completo)
@@ -0,0 +1,234 @@
+# etl/bronze/mock_pi_server.py
+"""
+Local stand-in for the PI Web API endpoints used by the Bronze collector (no NTLM, plain HTTP):
+  GET  /piwebapi/points?path=\\\\SERVER\\TAG
+  GET  /piwebapi/streams/{webid}/recorded?startTime&endTime&maxCount
+  GET  /piwebapi/streamsets/recorded?webId=..&webId=..&startTime&endTime&maxCount
+  POST /piwebapi/batch            {id: {"Method": "GET", "Resource": url}}
+  GET  /mock/stats                request and byte counters per endpoint
+
+Data is synthetic and deterministic: every tag has one point each `periodo` seconds
+(phase-shifted per tag) from ORIGEN up to "now", so repeated runs see the same history.
+Values are mostly numeric; a deterministic fraction of points comes back as bool,
+text ("51,25" comma decimal or a state word) or a PI error dict (Good=False), like the
+real server. Tags listed in `estados` are digital states instead: a bool that holds for
+hundreds of points between changes. `latencia` adds a fixed delay per HTTP request (one per /batch call).
+
+Usage:
+  python mock_pi_server.py --port 8765 --periodo 60 --latencia-ms 20
+  PI_BASE_URL=http://127.0.0.1:8765/piwebapi python main_bronze.py --backend streamset
+"""
+import argparse
+import base64
+import json
+import math
+import threading
+import time
+import zlib
+from datetime import datetime, timezone, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+ORIGEN = datetime(2024, 1, 1, tzinfo=timezone.utc)
+PREFIJO = "/piwebapi"
+ESTADOS = ["Auto", "Manual", "Remote", "Local"]
+ERROR_PI = {"Name": "I/O Timeout", "Value": 246, "IsSystem": True}
+
+
+def webid_de_tag(tag: str) -> str:
+    return "P1" + base64.urlsafe_b64encode(tag.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def tag_de_webid(webid: str) -> str | None:
+    if not webid.startswith("P1"):
+        return None
+    raw = webid[2:]
+    try:
+        return base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)).decode("utf-8")
+    except Exception:
+        return None
+
+
+def parse_tiempo(s: str | None, ahora: datetime) -> datetime | None:
+    if not s:
+        return None
+    s = s.strip()
+    if s == "*":
+        return ahora
+    dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def fmt_tiempo(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ" if dt.microsecond else "%Y-%m-%dT%H:%M:%SZ")
+
+
+class SimuladorPI:
+    """Deterministic recorded values per tag; thread-safe request counters."""
+
+    def __init__(self, periodo: float = 60.0, server: str = "MOCKPI", latencia: float = 0.0,
+                 frac_bool: float = 0.0, frac_texto: float = 0.0, frac_error: float = 0.0, estados=()):
+        self.periodo = float(periodo)
+        self.server = server
+        self.latencia = float(latencia)
+        self.estados = set(estados)
+        # cumulative thresholds over a per-point uniform draw: error < texto < bool < numeric
+        self.cortes = (frac_error, frac_error + frac_texto, frac_error + frac_texto + frac_bool)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def contar(self, clave: str, n_bytes: int = 0) -> None:
+        with self.lock:
+            c = self.stats.setdefault(clave, {"requests": 0, "bytes": 0})
+            c["requests"] += 1
+            c["bytes"] += n_bytes
+
+    def _offset(self, tag: str) -> float:
+        return (zlib.crc32(tag.encode("utf-8")) % 1000) / 1000.0 * self.periodo
+
+    def valor(self, tag: str, k: int):
+        fase = zlib.crc32(tag.encode("utf-8")) % 360
+        if tag in self.estados:
+            return math.sin(k / 500.0 + math.radians(fase)) > 0.5
+        x = round(50.0 + 10.0 * math.sin(k / 96.0 + math.radians(fase)), 4)
+        u = zlib.crc32(f"{tag}|{k}".encode("utf-8")) / 2**32
+        if u < self.cortes[0]:
+            return ERROR_PI
+        if u < self.cortes[1]:
+            return f"{x:.2f}".replace(".", ",") if k % 2 else ESTADOS[k % len(ESTADOS)]
+        if u < self.cortes[2]:
+            return x >= 50.0
+        return x
+
+    def recorded(self, tag: str, start: datetime, end: datetime, max_count: int) -> list:
+        end = min(end, datetime.now(timezone.utc))
+        if end < start:
+            return []
+        off = self._offset(tag)
+        t0 = (start - ORIGEN).total_seconds() - off
+        t1 = (end - ORIGEN).total_seconds() - off
+        k0 = max(0, math.ceil(t0 / self.periodo))
+        k1 = math.floor(t1 / self.periodo)
+        items = []
+        for k in range(k0, min(k1, k0 + max_count - 1) + 1):
+            ts = ORIGEN + timedelta(seconds=off + k * self.periodo)
+            v = self.valor(tag, k)
+            items.append({"Timestamp": fmt_tiempo(ts), "Value": v,
+                          "Good": v is not ERROR_PI, "Questionable": False, "Substituted": False})
+        return items
+
+    # --- routing: (method, path, query, body) -> (status, payload) ---
+
+    def despachar(self, metodo: str, ruta: str, query: dict, cuerpo: bytes | None = None):
+        ahora = datetime.now(timezone.utc)
+        if metodo == "POST" and ruta == f"{PREFIJO}/batch":
+            return 200, self._batch(json.loads(cuerpo or b"{}"))
+        if metodo != "GET":
+            return 405, {"Errors": [f"Metodo no soportado: {metodo}"]}
+
+        def q(nombre, defecto=None):
+            return query.get(nombre, [defecto])[0]
+
+        if ruta == f"{PREFIJO}/points":
+            path = q("path", "")
+            tag = path.rsplit("\\", 1)[-1]
+            if not tag:
+                return 404, {"Errors": [f"PI Point not found '{path}'."]}
+            return 200, {"WebId": webid_de_tag(tag), "Name": tag, "Path": path, "PointClass": "classic"}
+
+        max_count = int(q("maxCount", 1000))
+        start = parse_tiempo(q("startTime"), ahora) or ahora - timedelta(days=1)
+        end = parse_tiempo(q("endTime"), ahora) or ahora
+
+        if ruta.startswith(f"{PREFIJO}/streams/") and ruta.endswith("/recorded"):
+            tag = tag_de_webid(ruta[len(f"{PREFIJO}/streams/"):-len("/recorded")])
+            if tag is None:
+                return 404, {"Errors": ["Unknown WebId"]}
+            return 200, {"Items": self.recorded(tag, start, end, max_count)}
+
+        if ruta == f"{PREFIJO}/streamsets/recorded":
+            out = []
+            for w in query.get("webId", []):
+                tag = tag_de_webid(w)
+                if tag is None:
+                    return 404, {"Errors": [f"Unknown WebId {w}"]}
+                out.append({"WebId": w, "Name": tag, "Items": self.recorded(tag, start, end, max_count)})
+            return 200, {"Items": out}
+
+        return 404, {"Errors": [f"Ruta desconocida: {ruta}"]}
+
+    def _batch(self, subrequests: dict) -> dict:
+        out = {}
+        for rid, req in subrequests.items():
+            partes = urlsplit(req.get("Resource", ""))
+            status, content = self.despachar(req.get("Method", "GET").upper(), partes.path,
+                                             parse_qs(partes.query))
+            out[rid] = {"Status": status, "Headers": {}, "Content": content}
+        return out
+
+
+def _handler(sim: SimuladorPI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def _responder(self, status: int, payload, clave: str):
+            body = json.dumps(payload).encode("utf-8")
+            sim.contar(clave, len(body))
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _atender(self, metodo: str):
+            partes = urlsplit(self.path)
+            if partes.path == "/mock/stats":
+                with sim.lock:
+                    payload = json.loads(json.dumps(sim.stats))
+                return self._responder(200, payload, "stats")
+            n = int(self.headers.get("Content-Length") or 0)
+            cuerpo = self.rfile.read(n) if n else None
+            if sim.latencia:
+                time.sleep(sim.latencia)
+            try:
+                status, payload = sim.despachar(metodo, partes.path, parse_qs(partes.query), cuerpo)
+            except Exception as e:  # bad time strings etc. -> 400 like the real API
+                status, payload = 400, {"Errors": [str(e)]}
+            clave = partes.path[len(PREFIJO):].split("/")[1] if partes.path.startswith(PREFIJO) else partes.path
+            self._responder(status, payload, clave)
+
+        def do_GET(self):
+            self._atender("GET")
+
+        def do_POST(self):
+            self._atender("POST")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def iniciar_en_hilo(port: int = 0, **kwargs):
+    """Start the simulator on a daemon thread; returns (httpd, simulador, base_url)."""
+    sim = SimuladorPI(**kwargs)
+    httpd = ThreadingHTTPServer(("127.0.0.1", port), _handler(sim))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, sim, f"http://127.0.0.1:{httpd.server_address[1]}{PREFIJO}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock PI Web API para pruebas de Bronze")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--periodo", type=float, default=60.0, help="segundos entre puntos por tag")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="retardo fijo por peticion HTTP")
+    parser.add_argument("--frac-bool", type=float, default=0.0)
+    parser.add_argument("--frac-texto", type=float, default=0.0)
+    parser.add_argument("--frac-error", type=float, default=0.0)
+    args = parser.parse_args()
+    sim = SimuladorPI(periodo=args.periodo, latencia=args.latencia_ms / 1000.0, frac_bool=args.frac_bool,
+                      frac_texto=args.frac_texto, frac_error=args.frac_error)
+    httpd = ThreadingHTTPServer(("127.0.0.1", args.port), _handler(sim))
+    print(f"Mock PI Web API en http://127.0.0.1:{args.port}{PREFIJO}")
+    httpd.serve_forever()
@@ -0,0 +1,208 @@
+# etl/bronze/pipeline.py
+"""
+Overlapped Bronze ingestion: fetch -> decode -> write stages connected by bounded queues.
+
+  fetch  (PIPELINE_FETCH_WORKERS threads): one tag at a time, PI pages in time order
+         (WINDOW_WORKERS ranges of the tag in flight, extract_bronze.iterar_paginas_rangos)
+  decode (PIPELINE_DECODE_WORKERS threads): raw Items -> Arrow (decode_bronze)
+  write  (1 thread, Delta appends are serialized anyway): BufferBronze per tag
+
+Queues hold at most PIPELINE_QUEUE_SIZE pages, so a slow stage back-pressures the others
+instead of growing memory. Pages carry a per-tag sequence number; the writer applies them
+strictly in order, so commits stay in time order and the resume watermark stays valid.
+If a page of a tag fails, what was committed before it is kept and the rest of that tag is
+dropped (the next run resumes from there).
+
+Per-stage utilization = busy time / (wall time x workers); waiting on the input queue means
+the stage is starved (upstream is the bottleneck), waiting on the output queue means it is
+blocked (downstream is the bottleneck).
+"""
+import time
+import queue
+import threading
+import argparse
+from logger_bronze import logger
+from config_bronze import (
+    TAGS, END_TIME, WINDOW_DAYS, PIPELINE_FETCH_WORKERS, PIPELINE_DECODE_WORKERS, PIPELINE_QUEUE_SIZE
+)
+from extract_bronze import generar_rangos_fechas, iterar_paginas_rangos
+from cache_webid_bronze import con_webid_paginas
+from storage_bronze import BufferBronze
+from main_bronze import empaquetar, inicio_tag, resumen_extraccion
+
+_FIN = object()  # end-of-stream sentinel between stages
+
+
+class MedidorEtapa:
+    """Busy / starved / blocked seconds accumulated by all workers of one stage."""
+    def __init__(self, nombre: str, workers: int):
+        self.nombre, self.workers = nombre, workers
+        self.ocupado = self.espera_entrada = self.espera_salida = 0.0
+        self.unidades = 0
+        self.lock = threading.Lock()
+
+    def sumar(self, ocupado: float = 0.0, entrada: float = 0.0, salida: float = 0.0, unidades: int = 0):
+        with self.lock:
+            self.ocupado += ocupado
+            self.espera_entrada += entrada
+            self.espera_salida += salida
+            self.unidades += unidades
+
+    def resumen(self, pared: float) -> dict:
+        total = max(pared * self.workers, 1e-9)
+        return {"workers": self.workers, "unidades": self.unidades,
+                "utilizacion": round(self.ocupado / total, 3),
+                "espera_entrada": round(self.espera_entrada / total, 3),
+                "espera_salida": round(self.espera_salida / total, 3)}
+
+
+def _put(q: queue.Queue, msg, medidor: MedidorEtapa) -> None:
+    t = time.perf_counter()
+    q.put(msg)
+    medidor.sumar(salida=time.perf_counter() - t)
+
+
+def _get(q: queue.Queue, medidor: MedidorEtapa):
+    t = time.perf_counter()
+    msg = q.get()
+    medidor.sumar(entrada=time.perf_counter() - t)
+    return msg
+
+
+def _fetch(tareas: queue.Queue, salida: queue.Queue, med: MedidorEtapa) -> None:
+    while True:
+        try:
+            tag_alias, tag_path = tareas.get_nowait()
+        except queue.Empty:
+            return
+        seq = 0
+        try:
+            t = time.perf_counter()
+            rangos = generar_rangos_fechas(str(inicio_tag(tag_alias)), END_TIME, delta_dias=WINDOW_DAYS)
+            for items in con_webid_paginas(tag_path, lambda w: iterar_paginas_rangos(w, rangos)):
+                med.sumar(ocupado=time.perf_counter() - t, unidades=1)
+                _put(salida, (tag_alias, seq, "pagina", items), med)
+                seq += 1
+                t = time.perf_counter()
+            med.sumar(ocupado=time.perf_counter() - t)
+            _put(salida, (tag_alias, seq, "fin", None), med)
+        except Exception as e:
+            _put(salida, (tag_alias, seq, "error", str(e)), med)
+
+
+def _decode(entrada: queue.Queue, salida: queue.Queue, med: MedidorEtapa) -> None:
+    while True:
+        msg = _get(entrada, med)
+        if msg is _FIN:
+            return
+        tag_alias, seq, tipo, carga = msg
+        if tipo == "pagina":
+            t = time.perf_counter()
+            try:
+                msg = (tag_alias, seq, "tabla", empaquetar(carga, tag_alias))
+            except Exception as e:
+                msg = (tag_alias, seq, "error", f"decode: {e}")
+            med.sumar(ocupado=time.perf_counter() - t, unidades=1)
+        _put(salida, msg, med)
+
+
+class _EstadoTag:
+    def __init__(self, tag_alias: str):
+        self.buffer = BufferBronze(tag_alias)
+        self.siguiente = 0
+        self.fuera_de_orden = {}
+        self.error = None
+        self.terminado = False
+        self.t0 = time.perf_counter()
+
+
+def _write(entrada: queue.Queue, n_productores: int, med: MedidorEtapa, resultados: list) -> None:
+    estados = {}
+    vivos = n_productores
+    while vivos:
+        msg = _get(entrada, med)
+        if msg is _FIN:
+            vivos -= 1
+            continue
+        tag_alias = msg[0]
+        st = estados.setdefault(tag_alias, _EstadoTag(tag_alias))
+        st.fuera_de_orden[msg[1]] = msg
+        # Apply this tag's messages strictly in sequence order
+        while st.siguiente in st.fuera_de_orden:
+            _, _, tipo, carga = st.fuera_de_orden.pop(st.siguiente)
+            st.siguiente += 1
+            if st.terminado:
+                continue
+            t = time.perf_counter()
+            try:
+                if tipo == "tabla":
+                    st.buffer.agregar(carga)
+                else:
+                    st.buffer.confirmar()
+                    st.error = carga if tipo == "error" else None
+                    st.terminado = True
+            except Exception as e:
+                st.error, st.terminado = f"write: {e}", True
+            med.sumar(ocupado=time.perf_counter() - t, unidades=int(tipo == "tabla"))
+            if st.terminado:
+                resultados.append(_resultado(tag_alias, st))
+
+
+def _resultado(tag_alias: str, st: _EstadoTag) -> dict:
+    b = st.buffer
+    if st.error:
+        logger.error(f"[ERROR] {tag_alias}: {st.error} (filas confirmadas: {b.filas_escritas})")
+    estado = "error" if st.error else ("ok" if b.filas_escritas else "sin_datos")
+    return {"tag": tag_alias, "estado": estado, "filas": b.filas_escritas, "omitidas": b.filas_omitidas,
+            "error": st.error, "segundos": round(time.perf_counter() - st.t0, 2), "marca_agua": b.marca_agua}
+
+
+def extraer_pipeline(tags: dict, fetch_workers: int = PIPELINE_FETCH_WORKERS,
+                     decode_workers: int = PIPELINE_DECODE_WORKERS,
+                     tam_cola: int = PIPELINE_QUEUE_SIZE) -> tuple:
+    """Run the three stages over `tags`; returns (per-tag results, per-stage utilization)."""
+    t0 = time.perf_counter()
+    tareas = queue.Queue()
+    for item in tags.items():
+        tareas.put(item)
+    q_crudo, q_tablas = queue.Queue(maxsize=tam_cola), queue.Queue(maxsize=tam_cola)
+    med = {"fetch": MedidorEtapa("fetch", fetch_workers),
+           "decode": MedidorEtapa("decode", decode_workers),
+           "write": MedidorEtapa("write", 1)}
+    resultados = []
+
+    fetchers = [threading.Thread(target=_fetch, args=(tareas, q_crudo, med["fetch"]), name=f"fetch-{i}")
+                for i in range(fetch_workers)]
+    decoders = [threading.Thread(target=_decode, args=(q_crudo, q_tablas, med["decode"]), name=f"decode-{i}")
+                for i in range(decode_workers)]
+    writer = threading.Thread(target=_write, args=(q_tablas, decode_workers, med["write"], resultados),
+                              name="write")
+    for th in fetchers + decoders + [writer]:
+        th.start()
+    for th in fetchers:
+        th.join()
+    for _ in decoders:
+        q_crudo.put(_FIN)
+    for th in decoders:
+        th.join()
+        q_tablas.put(_FIN)
+    writer.join()
+
+    pared = time.perf_counter() - t0
+    utilizacion = {k: m.resumen(pared) for k, m in med.items()}
+    resumen_extraccion(resultados, pared)
+    for k, u in utilizacion.items():
+        logger.info(f"Etapa {k}: {u}")
+    cuello = max(utilizacion, key=lambda k: utilizacion[k]["utilizacion"])
+    logger.info(f"Etapa mas ocupada (probable cuello de botella): {cuello}")
+    return resultados, utilizacion
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bronze: pipeline fetch/decode/write solapado")
+    parser.add_argument("--tags", nargs="*", help="subconjunto de alias de TAGS")
+    parser.add_argument("--fetch-workers", type=int, default=PIPELINE_FETCH_WORKERS)
+    parser.add_argument("--decode-workers", type=int, default=PIPELINE_DECODE_WORKERS)
+    args = parser.parse_args()
+    tags = {k: v for k, v in TAGS.items() if not args.tags or k in args.tags}
+    extraer_pipeline(tags, args.fetch_workers, args.decode_workers)
@@ -1,42 +1,136 @@
 # etl/bronze/storage.py
 from logger_bronze import logger
+import os
+import json
+import threading
 import pandas as pd
 import polars as pl
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from typing import Optional
-from deltalake import DeltaTable
+from deltalake import DeltaTable, CommitProperties
 from deltalake.writer import write_deltalake
-from config_bronze import BRONZE_TABLE  # Path to the Delta table directory
+from config_bronze import (  # BRONZE_TABLE: path to the Delta table directory
+    BRONZE_TABLE, BRONZE_FLUSH_ROWS, BRONZE_WRITE_MODE, BRONZE_SCHEMA_V2, BRONZE_RLE_TAGS, WATERMARK_PATH
+)
 
-def leer_ultimo_timestamp(tag_alias: str) -> Optional[pd.Timestamp]:
+# One writer at a time: concurrent tag workers would otherwise race on the same _delta_log
+# version (and on the first commit that creates the table).
+_lock_escritura = threading.Lock()
+
+# Key of the commit metadata carrying {tag: max timestamp} of every Bronze append
+CLAVE_MARCAS = "bronze.marcas_agua"
+# Operations that never change per-tag maxima (compaction/maintenance)
+_OPS_SIN_DATOS = {"OPTIMIZE", "VACUUM START", "VACUUM END", "SET TBLPROPERTIES", "CREATE CHECKPOINT"}
+
+
+def max_timestamp_por_tag(dt: DeltaTable) -> dict:
     """
-    Read MAX(timestamp) for a given tag directly from Delta Lake.
-    Returns None if table does not exist or tag has no rows with valid timestamp.
+    {tag: max timestamp} from the Delta log file statistics only (no data file is read).
+    Stats are millisecond-truncated: the few points re-read after a rebuild are skipped by the merge.
     """
-    try:
-        dt = DeltaTable(str(BRONZE_TABLE))
-    except Exception:
-        return None
+    acts = pa.table(dt.get_add_actions(flatten=True))
+    if acts.num_rows == 0 or "max.timestamp" not in acts.column_names:
+        return {}
+    pdf = acts.select(["partition.tag", "max.timestamp"]).to_pandas()
+    maximos = pdf.dropna().groupby("partition.tag")["max.timestamp"].max()
+    return {tag: pd.Timestamp(ts).tz_convert("UTC") for tag, ts in maximos.items()}
 
-    try:
-        pa_tbl = dt.to_pyarrow_table(filters=[("tag", "=", tag_alias)], columns=["timestamp", "tag"])
-    except TypeError:
-        pa_tbl = dt.to_pyarrow_table(columns=["timestamp", "tag"])
 
-    if pa_tbl.num_rows == 0:
-        return None
+class MarcasAgua:
+    """
+    Per-tag resume watermark without scanning Bronze.
+
+    Every append carries {tag: max timestamp} in its Delta commit metadata (CLAVE_MARCAS),
+    so the watermark commits atomically with the data. WATERMARK_PATH holds a snapshot
+    {version, marcas}; on first use the commits after that version are replayed from the log
+    history. Without a snapshot, or after a commit that changed data without metadata
+    (legacy/external writes), maxima are rebuilt from file statistics. Afterwards reads are
+    dictionary lookups and this process's own commits update the dictionary directly.
+    """
+    def __init__(self, ruta=WATERMARK_PATH):
+        self.ruta = ruta
+        self.lock = threading.Lock()
+        self.version = -1
+        self.marcas = {}
+        self.sincronizado = False
+
+    def _leer_snapshot(self) -> None:
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.version = int(data.get("version", -1))
+            self.marcas = {k: pd.Timestamp(v) for k, v in data.get("marcas", {}).items()}
+        except (FileNotFoundError, json.JSONDecodeError, ValueError):
+            self.version, self.marcas = -1, {}
+
+    def _persistir(self) -> None:
+        tmp = f"{self.ruta}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version,
+                       "marcas": {k: v.isoformat() for k, v in sorted(self.marcas.items())}}, f, indent=1)
+        os.replace(tmp, self.ruta)
+
+    def _sincronizar(self) -> None:
+        self.sincronizado = True
+        self._leer_snapshot()
+        try:
+            dt = DeltaTable(str(BRONZE_TABLE))
+        except Exception:
+            self.version, self.marcas = -1, {}
+            return
+        ultima = dt.version()
+        if ultima == self.version:
+            return
+        reconstruir = self.version < 0 or ultima < self.version
+        if not reconstruir:
+            historia = dt.history(ultima - self.version)
+            # Log entries already cleaned up by log retention -> cannot replay, rebuild
+            reconstruir = len(historia) < ultima - self.version
+        if not reconstruir:
+            for commit in sorted(historia, key=lambda c: c["version"]):
+                if CLAVE_MARCAS in commit:
+                    self._fusionar({k: pd.Timestamp(v) for k, v in json.loads(commit[CLAVE_MARCAS]).items()})
+                elif commit.get("operation") not in _OPS_SIN_DATOS:
+                    reconstruir = True
+                    break
+        if reconstruir:
+            logger.info("Marcas de agua: reconstruyendo desde estadisticas del Delta log")
+            self.marcas = max_timestamp_por_tag(dt)
+        self.version = ultima
+        self._persistir()
+
+    def _fusionar(self, nuevas: dict) -> None:
+        for tag, ts in nuevas.items():
+            if ts is not None and not pd.isna(ts):
+                self.marcas[tag] = max(self.marcas.get(tag, ts), ts)
+
+    def obtener(self, tag_alias: str) -> Optional[pd.Timestamp]:
+        with self.lock:
+            if not self.sincronizado:
+                self._sincronizar()
+            return self.marcas.get(tag_alias)
 
-    pdf = pa_tbl.to_pandas()
-    if "tag" in pdf.columns:
-        pdf = pdf[pdf["tag"] == tag_alias]
+    def registrar(self, nuevas: dict) -> None:
+        """Called after a successful commit carrying `nuevas` in its metadata."""
+        with self.lock:
+            if not self.sincronizado:
+                self._sincronizar()
+            self._fusionar(nuevas)
+            self._persistir()
 
-    if pdf.empty:
-        return None
 
-    ts = pd.to_datetime(pdf["timestamp"], utc=True, errors="coerce")
-    if ts.notna().any():
-        return ts.max().floor("s")
-    return None
+marcas_agua = MarcasAgua()
+
+
+def leer_ultimo_timestamp(tag_alias: str) -> Optional[pd.Timestamp]:
+    """
+    MAX(timestamp) committed for a tag, from the watermark state (no data scan), exact to the
+    microsecond stored in Bronze. Returns None if the table does not exist or the tag has no
+    rows with valid timestamp.
+    """
+    return marcas_agua.obtener(tag_alias)
 
 
 def _prepare_partitions(df: pd.DataFrame) -> pd.DataFrame:
@@ -56,9 +150,146 @@ def _prepare_partitions(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def guardar_bronze_delta(df_nuevo: pd.DataFrame, tag_alias: str) -> None:
+def _prepare_partitions_arrow(tbl: pa.Table) -> pa.Table:
+    """Arrow version of _prepare_partitions (timestamp must already be timestamp[tz=UTC])."""
+    fecha = pc.fill_null(pc.strftime(tbl["timestamp"], format="%Y-%m-%d"), "__missing__")
+    cols = ["timestamp", "value", "value_text", "value_bool", "tag"]
+    return tbl.select(cols).append_column("date", fecha)
+
+
+def _codificar_v2(pl_df: pl.DataFrame, rle: bool) -> pl.DataFrame:
+    """
+    Schema v2 rows: value_text kept only where the value is neither numeric nor bool, plus
+    rle_n / rle_hasta. With rle=True each run of consecutive equal values at a constant spacing
+    (within one day) becomes its first row, rle_n = points in the run and rle_hasta = timestamp
+    of the last one. A run is cut when the value or the gap to the previous point changes, so
+    timestamp + k * (rle_hasta - timestamp) / (rle_n - 1) gives back every stored timestamp.
+    """
+    numerico = pl.col("value").is_not_nan().fill_null(False) | pl.col("value_bool").is_not_null()
+    pl_df = pl_df.with_columns(pl.when(numerico).then(None).otherwise(pl.col("value_text")).alias("value_text"))
+    if not rle:
+        return pl_df.with_columns(pl.lit(None, pl.Int32).alias("rle_n"),
+                                  pl.lit(None, pl.Datetime("us", "UTC")).alias("rle_hasta"))
+
+    claves = [pl.col("value").fill_nan(None), pl.col("value_text"), pl.col("value_bool"), pl.col("date")]
+    cambio_valor = pl.any_horizontal([c.ne_missing(c.shift(1)) for c in claves])
+    gap = pl.col("timestamp").diff()
+    # The gap into a run's second point is free; from the third point on it must repeat. A point
+    # right after a value change is a run start, so the gap into it never cuts the next point.
+    cambio_gap = gap.ne_missing(gap.shift(1)) & ~cambio_valor.shift(1).fill_null(True)
+    return (
+        pl_df.sort("timestamp", nulls_last=True, maintain_order=True)
+        .with_columns((cambio_valor | cambio_gap).cast(pl.Int64).cum_sum().alias("_run"))
+        .group_by("_run", maintain_order=True)
+        .agg(pl.col("timestamp", "value", "value_text", "value_bool", "tag", "date").first(),
+             pl.len().cast(pl.Int32).alias("rle_n"),
+             pl.col("timestamp").last().alias("rle_hasta"))
+        .drop("_run")
+    )
+
+
+def _puntos_guardados(dt: DeltaTable, tag_alias: str, fechas: list) -> pl.DataFrame:
+    """Stored points of the tag in these date partitions, run-length rows expanded back to points."""
+    nombres = [f.name for f in dt.schema().fields]
+    cols = ["timestamp", "value", "value_text", "value_bool"] + [c for c in ("rle_n", "rle_hasta") if c in nombres]
+    previos = pl.from_arrow(dt.to_pyarrow_table(columns=cols, partitions=[("tag", "=", tag_alias),
+                                                                          ("date", "in", fechas)]))
+    if "rle_n" not in previos.columns:
+        return previos
+    n = pl.col("rle_n").fill_null(1).cast(pl.Int64)
+    paso = ((pl.col("rle_hasta") - pl.col("timestamp")).dt.total_microseconds()
+            // pl.max_horizontal(n - 1, pl.lit(1)))
+    return (
+        previos.filter(pl.col("timestamp").is_not_null())
+        .with_columns(paso.fill_null(0).alias("_paso"), pl.int_ranges(0, n).alias("_k"))
+        .explode("_k")
+        .with_columns((pl.col("timestamp") + pl.duration(microseconds=pl.col("_k") * pl.col("_paso")))
+                      .alias("timestamp"))
+        .drop(["_k", "_paso", "rle_n", "rle_hasta"])
+    )
+
+
+def _clave_valor() -> list:
+    """Value channels normalized as schema v2 stores them (stored v1 rows also carry value_text for numbers)."""
+    numerico = pl.col("value").is_not_nan().fill_null(False) | pl.col("value_bool").is_not_null()
+    return [pl.col("value").fill_nan(None).alias("_v"), pl.col("value_bool").alias("_b"),
+            pl.when(numerico).then(None).otherwise(pl.col("value_text")).alias("_t")]
+
+
+def _sin_nulos_guardados(pl_df: pl.DataFrame, tag_alias: str) -> pl.DataFrame:
+    """
+    Drop rows without timestamp whose value is already stored for the tag (date='__missing__').
+    (tag, timestamp) cannot identify them: a null timestamp never matches in the merge or the
+    timestamp anti-join, so a retried or overlapping run would insert them again.
+    """
+    if not pl_df["timestamp"].is_null().any() or not DeltaTable.is_deltatable(str(BRONZE_TABLE)):
+        return pl_df
+    previos = pl.from_arrow(DeltaTable(str(BRONZE_TABLE)).to_pyarrow_table(
+        columns=["value", "value_text", "value_bool"],
+        partitions=[("tag", "=", tag_alias), ("date", "=", "__missing__")]))
+    if previos.height == 0:
+        return pl_df
+    guardados = previos.select(_clave_valor()).unique().with_columns(pl.lit(True).alias("_guardado"))
+    return (
+        pl_df.with_columns(_clave_valor())
+        .join(guardados, on=["_v", "_b", "_t"], how="left", nulls_equal=True, maintain_order="left")
+        .filter(~(pl.col("timestamp").is_null() & pl.col("_guardado").fill_null(False)))
+        .drop(["_v", "_b", "_t", "_guardado"])
+    )
+
+
+def _sin_puntos_guardados(pl_df: pl.DataFrame, tag_alias: str) -> tuple[pl.DataFrame, int]:
+    """
+    Drop points whose timestamp is already stored for the tag (the merge's rule, applied to
+    the expanded run-length rows, which do not line up with (tag, timestamp)). Points inside a
+    stored run's span but off its timestamps are new and kept. Returns (new points, number of
+    dropped points whose stored value differs); only the touched date partitions are read.
+    """
+    if not DeltaTable.is_deltatable(str(BRONZE_TABLE)):
+        return pl_df, 0
+    fechas = pl_df["date"].unique().to_list()
+    previos = _puntos_guardados(DeltaTable(str(BRONZE_TABLE)), tag_alias, fechas)
+    if previos.height == 0:
+        return pl_df, 0
+    clave = _clave_valor()
+    guardados = previos.select(pl.col("timestamp"), *clave).unique("timestamp", keep="first")
+    nuevos = pl_df.join(guardados.select("timestamp"), on="timestamp", how="anti", nulls_equal=False)
+    repetidos = pl_df.select("timestamp", *clave).join(guardados, on="timestamp", how="inner", suffix="_g")
+    distintos = repetidos.filter(pl.any_horizontal([pl.col(c).ne_missing(pl.col(f"{c}_g"))
+                                                    for c in ("_v", "_b", "_t")])).height
+    return nuevos, distintos
+
+
+def _merge_bronze(tabla: pa.Table, meta: dict) -> dict:
+    """
+    Insert only the rows whose (tag, timestamp) is not in Bronze yet (idempotent retries and
+    overlapping runs). The literal tag/date lists prune the join to the partitions this batch
+    touches; an insert-only merge adds new files and never rewrites the matched ones.
+    """
+    def lista(xs):
+        return ", ".join("'" + str(x).replace("'", "''") + "'" for x in xs)
+
+    predicado = (f"t.tag IN ({lista(pc.unique(tabla['tag']).to_pylist())}) "
+                 f"AND t.date IN ({lista(pc.unique(tabla['date']).to_pylist())}) "
+                 "AND t.tag = s.tag AND t.date = s.date AND t.timestamp = s.timestamp")
+    return (
+        DeltaTable(str(BRONZE_TABLE))
+        .merge(tabla, predicado, source_alias="s", target_alias="t", merge_schema=True,
+               commit_properties=CommitProperties(custom_metadata=meta))
+        .when_not_matched_insert_all()
+        .execute()
+    )
+
+
+def guardar_bronze_delta(df_nuevo, tag_alias: str) -> int:
     """
-    Append rows to Bronze Delta without dropping anything.
+    Write rows to Bronze Delta without dropping anything; returns the points actually inserted.
+    BRONZE_WRITE_MODE="merge" skips rows whose (tag, timestamp) is already stored, and rows
+    without timestamp whose value is (_sin_nulos_guardados), so a retried or overlapping run
+    never duplicates; "append" writes blindly (faster backfills).
+    With BRONZE_SCHEMA_V2 rows are stored compactly (_codificar_v2); run-length tags skip points
+    whose timestamp is already stored (expanded runs) instead of merging (_sin_puntos_guardados).
+    df_nuevo: pandas DataFrame or Arrow table (decode_bronze.tabla_bronze).
     Expected columns: ['timestamp','value','value_text','value_bool','tag'] (+ derived 'date')
     - 'value'      : float (NaN allowed)
     - 'value_text' : string as-received (None allowed; dict/error -> None)
@@ -66,26 +297,30 @@ def guardar_bronze_delta(df_nuevo: pd.DataFrame, tag_alias: str) -> None:
     - 'timestamp'  : tz-aware datetime or NaT
     - partition_by : ['tag','date'] (date='__missing__' for NaT)
     """
-    if df_nuevo is None or df_nuevo.empty:
+    if df_nuevo is None or len(df_nuevo) == 0:
         logger.info(f"Sin datos para guardar en {tag_alias}")
-        return
+        return 0
 
-    df = df_nuevo.copy()
+    if isinstance(df_nuevo, pa.Table):
+        # Arrow batches from decode_bronze are already typed: only add the partition column
+        pl_df = pl.from_arrow(_prepare_partitions_arrow(df_nuevo))
+    else:
+        df = df_nuevo.copy()
 
-    # Enforce dtypes (without dropping)
-    df["timestamp"]  = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
-    df["value"]      = pd.to_numeric(df["value"], errors="coerce")           # float (NaN ok)
-    # value_text: keep as object/string, but cast to string where not-null
-    df["value_text"] = df["value_text"].where(df["value_text"].isna(), df["value_text"].astype(str))
-    # value_bool: keep None/True/False; pandas may store as object; polars will cast to Boolean
-    # tag always string
-    df["tag"]        = df["tag"].astype(str)
+        # Enforce dtypes (without dropping)
+        df["timestamp"]  = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
+        df["value"]      = pd.to_numeric(df["value"], errors="coerce")           # float (NaN ok)
+        # value_text: keep as object/string, but cast to string where not-null
+        df["value_text"] = df["value_text"].where(df["value_text"].isna(), df["value_text"].astype(str))
+        # value_bool: keep None/True/False; pandas may store as object; polars will cast to Boolean
+        # tag always string
+        df["tag"]        = df["tag"].astype(str)
 
-    # Safe partitions
-    df = _prepare_partitions(df)  # adds 'date'
+        # Safe partitions
+        df = _prepare_partitions(df)  # adds 'date'
 
-    # Convert to Polars for delta-rs writer with proper types
-    pl_df = pl.from_pandas(df[["timestamp", "value", "value_text", "value_bool", "tag", "date"]])
+        # Convert to Polars for delta-rs writer with proper types
+        pl_df = pl.from_pandas(df[["timestamp", "value", "value_text", "value_bool", "tag", "date"]])
 
     # Ensure expected dtypes
     # timestamp
@@ -108,15 +343,91 @@ def guardar_bronze_delta(df_nuevo: pd.DataFrame, tag_alias: str) -> None:
     if pl_df.schema.get("date") != pl.Utf8:
         pl_df = pl_df.with_columns(pl.col("date").cast(pl.Utf8))
 
+    # Watermark travels in the same commit as the rows (atomic with the append)
+    marcas = {t: ts for t, ts in pl_df.group_by("tag").agg(pl.col("timestamp").max()).iter_rows()
+              if ts is not None}
+    meta = {CLAVE_MARCAS: json.dumps({t: pd.Timestamp(ts).isoformat() for t, ts in marcas.items()})}
+
+    recibidas = pl_df.height
+    rle = BRONZE_SCHEMA_V2 and tag_alias in BRONZE_RLE_TAGS
+
     try:
-        write_deltalake(
-            str(BRONZE_TABLE),
-            pl_df,
-            mode="append",
-            partition_by=["tag", "date"],
-            schema_mode="merge",  # allow adding value_text/value_bool safely
-        )
-        logger.info(f"Datos guardados en Delta Lake (tag={tag_alias}).")
+        with _lock_escritura:
+            distintos = 0
+            if BRONZE_WRITE_MODE == "merge":
+                pl_df = _sin_nulos_guardados(pl_df, tag_alias)
+            if rle and BRONZE_WRITE_MODE == "merge":
+                pl_df, distintos = _sin_puntos_guardados(pl_df, tag_alias)
+            puntos = pl_df.height
+            if BRONZE_SCHEMA_V2:
+                pl_df = _codificar_v2(pl_df, rle)
+            if puntos == 0:
+                insertadas = 0
+            elif BRONZE_WRITE_MODE == "merge" and not rle and DeltaTable.is_deltatable(str(BRONZE_TABLE)):
+                m = _merge_bronze(pl_df.to_arrow(), meta)
+                insertadas = int(m.get("num_target_rows_inserted", 0))
+            else:
+                write_deltalake(
+                    str(BRONZE_TABLE),
+                    pl_df,
+                    mode="append",
+                    partition_by=["tag", "date"],
+                    schema_mode="merge",  # allow adding value_text/value_bool safely
+                    commit_properties=CommitProperties(custom_metadata=meta),
+                )
+                insertadas = puntos
+            # Skipped rows are already stored, so the batch maxima are valid either way
+            marcas_agua.registrar({t: pd.Timestamp(ts) for t, ts in marcas.items()})
+        logger.info(f"Datos guardados en Delta Lake (tag={tag_alias}): {insertadas} insertadas"
+                    + (f" en {pl_df.height} filas run-length" if rle else "")
+                    + f", {recibidas - insertadas} omitidas (ya existentes).")
+        if distintos:
+            logger.warning(f"{tag_alias}: {distintos} puntos omitidos por timestamp ya guardado con otro valor "
+                           "(Bronze conserva el primero, como el merge)")
+        return insertadas
     except Exception as e:
         logger.error(f"Error escribiendo Delta Lake para {tag_alias}: {e}")
         raise
+
+
+class BufferBronze:
+    """
+    Bounded per-tag write buffer: Arrow batches are appended in time order and committed
+    as one Delta append whenever `filas_flush` rows are pending (0 = every batch).
+    After each commit the tag's watermark (max committed timestamp) advances, so an
+    interrupted run resumes right after the last committed batch instead of from scratch.
+    filas_escritas counts inserted rows; filas_omitidas those the merge found already stored.
+    """
+    def __init__(self, tag_alias: str, filas_flush: int = BRONZE_FLUSH_ROWS):
+        self.tag_alias = tag_alias
+        self.filas_flush = filas_flush
+        self.pendientes = []
+        self.filas_pendientes = 0
+        self.filas_escritas = 0
+        self.filas_omitidas = 0
+        self.commits = 0
+        self.marca_agua = None
+
+    def agregar(self, tabla: pa.Table) -> None:
+        if tabla is None or tabla.num_rows == 0:
+            return
+        self.pendientes.append(tabla)
+        self.filas_pendientes += tabla.num_rows
+        if self.filas_pendientes >= self.filas_flush:
+            self.confirmar()
+
+    def confirmar(self) -> None:
+        if not self.pendientes:
+            return
+        tabla = pa.concat_tables(self.pendientes)
+        insertadas = guardar_bronze_delta(tabla, self.tag_alias)
+        self.pendientes, self.filas_pendientes = [], 0
+        self.filas_escritas += insertadas
+        self.filas_omitidas += tabla.num_rows - insertadas
+        self.commits += 1
+        ts_max = pc.max(tabla["timestamp"]).as_py()
+        if ts_max is not None:
+            ts_max = pd.Timestamp(ts_max)
+            self.marca_agua = ts_max if self.marca_agua is None else max(self.marca_agua, ts_max)
+        logger.info(f"[{self.tag_alias}] commit {self.commits}: {tabla.num_rows} filas, "
+                    f"marca de agua {self.marca_agua}")
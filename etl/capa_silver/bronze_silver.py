@@ -1,6 +1,7 @@
 from pathlib import Path
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 from deltalake import DeltaTable
 from typing import Dict, List, Tuple
 from logger_silver import get_logger
@@ -20,46 +21,101 @@ def _schema_names(dt: DeltaTable) -> set:
         return set()
     
 
+def _expandir_bronze_v2(pdf: pd.DataFrame) -> pd.DataFrame:
+    """
+    Devuelve filas Bronze v2 a la forma v1 (filas v1 pasan sin cambios):
+      - value_text vacío se reconstruye desde value / value_bool (v2 solo guarda texto no numérico)
+      - filas run-length (rle_n > 1) se expanden a rle_n puntos con el mismo valor en
+        timestamp + k * (rle_hasta - timestamp) / (rle_n - 1): Bronze corta cada run cuando cambia
+        el valor o el intervalo entre puntos, así que los timestamps originales salen exactos
+    """
+    if "value_text" in pdf.columns:
+        falta = pdf["value_text"].isna()
+        if "value" in pdf.columns:
+            num = falta & pdf["value"].notna()
+            pdf.loc[num, "value_text"] = pdf.loc[num, "value"].astype(str)
+        if "value_bool" in pdf.columns:
+            bol = falta & pdf["value_bool"].notna()
+            pdf.loc[bol, "value_text"] = pdf.loc[bol, "value_bool"].astype(str)
+
+    if "rle_n" not in pdf.columns:
+        return pdf
+    n = pd.to_numeric(pdf["rle_n"], errors="coerce").fillna(1).clip(lower=1).astype("int64").to_numpy()
+    hasta = pd.to_datetime(pdf["rle_hasta"] if "rle_hasta" in pdf.columns else pdf["timestamp"],
+                           utc=True, errors="coerce")
+    pdf = pdf.drop(columns=["rle_n", "rle_hasta"], errors="ignore").reset_index(drop=True)
+    if (n == 1).all():
+        return pdf
+
+    # Aritmética entera en ns: el paso de un run es exacto (rle_hasta - timestamp = (n-1) * paso)
+    ini = pdf["timestamp"]
+    span = (hasta.reset_index(drop=True) - ini).to_numpy(dtype="timedelta64[ns]").astype("int64")
+    valido = ini.notna().to_numpy() & hasta.reset_index(drop=True).notna().to_numpy()
+    paso = np.where(valido, span // np.maximum(n - 1, 1), 0)
+    idx = np.repeat(np.arange(len(pdf)), n)
+    k = np.arange(len(idx)) - np.repeat(np.cumsum(n) - n, n)  # posición dentro de cada run
+    out = pdf.iloc[idx].reset_index(drop=True)
+    out["timestamp"] = (out["timestamp"] + pd.to_timedelta(paso[idx] * k, unit="ns")).astype(ini.dtype)
+    print(f"   Expandidas {len(pdf):,} filas run-length a {len(out):,} puntos")
+    return out
+
+
+def resumen_tags_bronze(bronze_path: Path) -> pd.DataFrame:
+    """
+    Inventario por tag leído solo del Delta log (valores de partición y estadísticas de
+    archivo, sin abrir ningún Parquet): tag, archivos, filas, mb, fecha_inicio, fecha_fin.
+    En esquema v2 'filas' cuenta filas guardadas (un run de estados = 1 fila) y fecha_fin
+    considera rle_hasta. Las estadísticas de timestamp vienen truncadas a milisegundos.
+    """
+    dt = DeltaTable(str(bronze_path))
+    acts = pa.table(dt.get_add_actions(flatten=True)).to_pandas()
+    if "partition.tag" not in acts.columns:
+        raise ValueError("La tabla Bronze no está particionada por 'tag'")
+    for col in ("min.timestamp", "max.timestamp"):
+        if col not in acts.columns:
+            acts[col] = pd.NaT
+    fin = acts[["max.timestamp", "max.rle_hasta"]].max(axis=1) if "max.rle_hasta" in acts.columns \
+        else acts["max.timestamp"]
+    g = acts.assign(_fin=fin).groupby("partition.tag")
+    return (
+        pd.DataFrame({
+            "archivos": g.size(),
+            "filas": g["num_records"].sum(),
+            "mb": (g["size_bytes"].sum() / 1e6).round(2),
+            "fecha_inicio": g["min.timestamp"].min(),
+            "fecha_fin": g["_fin"].max(),
+        })
+        .rename_axis("tag").reset_index()
+        .sort_values("tag").reset_index(drop=True)
+    )
+
+
 def get_available_tags(bronze_path: Path) -> list[str]:
     """
-    Devuelve la lista de tags disponibles en la tabla Bronze, evitando depender
-    únicamente de dt.schema().names (que puede no reflejar bien las columnas).
+    Devuelve la lista de tags disponibles en la tabla Bronze. 'tag' es columna de partición,
+    así que se responde desde el Delta log (resumen_tags_bronze) sin leer datos; solo si la
+    tabla no está particionada por tag se lee la columna.
     """
     if not bronze_path.exists():
         log.warning("Bronze path no existe: %s", bronze_path)
         return []
 
     try:
-        dt = DeltaTable(str(bronze_path))
+        inventario = resumen_tags_bronze(bronze_path)
+        log.info("Tags disponibles en Bronze: %d (%d archivos, %d filas)",
+                 len(inventario), inventario["archivos"].sum(), inventario["filas"].sum())
+        return inventario["tag"].astype(str).tolist()
+    except ValueError as e:
+        log.warning("%s; leyendo la columna 'tag'.", e)
+    except Exception as e:
+        log.exception("Error al listar tags en Bronze: %s", e)
+        return []
 
-        # 1) Intento directo: pedir solo 'tag'
-        try:
-            pa = dt.to_pyarrow_table(columns=["tag"])
-            tags = (
-                pa.to_pandas()["tag"]
-                .astype(str).dropna().unique().tolist()
-            )
-            if tags:
-                log.info("Tags disponibles en Bronze: %d", len(tags))
-                return tags
-        except Exception as e:
-            log.debug("No se pudo pedir solo 'tag' (%s). Intento leyendo todo.", e)
-
-        # 2) Fallback: leer todo y buscar la columna 'tag'
-        pdf = dt.to_pyarrow_table().to_pandas()
-        cols = list(pdf.columns.astype(str))
-        log.info("Columnas detectadas en Bronze: %s", cols)
-        if "tag" not in cols:
-            log.warning("La tabla Bronze no tiene columna 'tag' (según DataFrame).")
-            return []
-
-        tags = (
-            pdf["tag"].astype(str)
-            .dropna().unique().tolist()
-        )
+    try:
+        tbl = DeltaTable(str(bronze_path)).to_pyarrow_table(columns=["tag"])
+        tags = tbl.to_pandas()["tag"].dropna().astype(str).unique().tolist()
         log.info("Tags disponibles en Bronze: %d", len(tags))
         return tags
-
     except Exception as e:
         log.exception("Error al listar tags en Bronze: %s", e)
         return []
@@ -79,7 +135,7 @@ def cargar_tag_desde_bronze(tag: str, bronze_path: Path) -> pd.DataFrame | None:
         names = _schema_names(dt)
 
         # Solo pedimos columnas que EXISTEN en el Delta
-        candidates = ["timestamp", "ts", "tag", "value", "value_text", "value_bool"]
+        candidates = ["timestamp", "ts", "tag", "value", "value_text", "value_bool", "rle_n", "rle_hasta"]
         request_cols = [c for c in candidates if c in names]
 
         print(f"   Intentando cargar desde Delta: {bronze_path.resolve()}")
@@ -117,6 +173,9 @@ def cargar_tag_desde_bronze(tag: str, bronze_path: Path) -> pd.DataFrame | None:
             print("    No existe columna temporal ('timestamp' o 'ts') en la tabla.")
             return None
 
+        # Esquema v2 (texto solo no numérico, runs de estados) -> filas v1
+        pdf = _expandir_bronze_v2(pdf)
+
         # Limpiar timestamps inválidos
         registros_originales = len(pdf)
         pdf = pdf.dropna(subset=["timestamp"]).copy()
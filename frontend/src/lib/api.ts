@@ -4,10 +4,17 @@ export type FeaturesResponse = {
   model_version: string;
 };
 
+export type FeatureContribution = {
+  feature: string;
+  error: number;
+  share: number;
+};
+
 export type PredictItem = {
   index: number;
   score: number;
   label: string;
+  top_features?: FeatureContribution[];
 };
 
 export type PredictResponse = {
@@ -25,21 +32,22 @@ export async function fetchFeatures(): Promise<FeaturesResponse> {
 }
 
 export async function predictFromRecords(
-  records: Array<Record<string, number>>
+  records: Array<Record<string, number>>,
+  topK = 0
 ): Promise<PredictResponse> {
   const res = await fetch(`${BASE}/predict`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     // El backend acepta `records` o `gold_parquet_path`. Aquí usamos records.
-    body: JSON.stringify({ records }),
+    body: JSON.stringify({ records, top_k: topK }),
   });
   if (!res.ok) throw new Error(await res.text());
   return res.json();
 }
 
 // Nueva función para obtener resultados del ETL
-export async function getMaintenanceResults(): Promise<PredictResponse> {
-  const res = await fetch(`${BASE}/maintenance/results`, {
+export async function getMaintenanceResults(topK = 0): Promise<PredictResponse> {
+  const res = await fetch(`${BASE}/maintenance/results?top_k=${topK}`, {
     cache: "no-store",
   });
   if (!res.ok) throw new Error(await res.text());